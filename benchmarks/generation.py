@@ -0,0 +1,150 @@
+"""
+Measures generation time and memory of the transducer on synthetic schemas.
+
+For every schema size an input directory is synthesized and each phase of
+the pipeline is run twice: once under tracemalloc for the peak memory it
+allocates and once for wall clock time. Results are printed, or
+written with --output, as JSON so runs can be compared across commits.
+
+    PYTHONPATH=src python -m benchmarks.generation --sizes 50 100 200
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from ssqlt_prototype import Context
+from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.TransducerContext.context_file_paths import ContextFilePaths
+from ssqlt_prototype.TransducerContext.Dataclasses.constraint import Constraint
+from ssqlt_prototype.TransducerContext.Dataclasses.db_context import Graph, topological_sort
+from ssqlt_prototype.TransducerContext.Dataclasses.table import Table
+
+from .synthetic import write_schema
+
+
+def _filename(path: str) -> str:
+    return os.path.basename(path).split(".")[0]
+
+
+def _parse_tables(create_paths: list[str], mapping_paths: list[str]) -> list[Table]:
+    mappings = {_filename(path): path for path in mapping_paths}
+    return [Table.from_create_path(path, mapping_path=mappings[_filename(path)]) for path in create_paths]
+
+
+def _ordering(tables: list[Table]) -> list[str]:
+    graph = Graph()
+    for table in tables:
+        graph.add_node(table.name)
+        for fkey in table.fkey:
+            graph.add_edge(fkey.ref_tablename, table.name)
+    return topological_sort(graph)
+
+
+def _measure(fn: Callable[[], Any]) -> tuple[Any, float, int]:
+    """
+    Runs `fn` under tracemalloc, then again timed, returning its result,
+    seconds and peak bytes. The traced run doubles as a warm up.
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+
+    return result, seconds, peak
+
+
+def run(path: str, workers: int = 1) -> dict:
+    """Benchmarks the phases of generating the transducer of the input directory `path`."""
+    phases: dict[str, dict] = {}
+
+    def phase(name: str, fn: Callable[[], Any]) -> Any:
+        result, seconds, peak = _measure(fn)
+        phases[name] = {"seconds": seconds, "peak_bytes": peak}
+        return result
+
+    paths = phase("discover", lambda: ContextFilePaths.from_dir(path))
+    create_paths = paths.source_creates + paths.target_creates
+
+    tables = phase(
+        "parse_tables",
+        lambda: _parse_tables(paths.source_creates, paths.source_mappings)
+        + _parse_tables(paths.target_creates, paths.target_mappings),
+    )
+    phases["parse_tables"]["seconds_per_table"] = phases["parse_tables"]["seconds"] / len(tables)
+
+    phase(
+        "parse_constraints",
+        lambda: [Constraint.from_file(p) for p in paths.source_constraints + paths.target_constraints],
+    )
+    phase(
+        "ordering",
+        lambda: (
+            _ordering(tables[: len(paths.source_creates)]),
+            _ordering(tables[len(paths.source_creates) :]),
+        ),
+    )
+
+    context = phase("context", lambda: Context.from_dir(path, workers=workers))
+    generator = Generator(context)
+    sql = phase("generate", generator.generate)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_path = os.path.join(output_dir, "output.sql")
+        phase("write", lambda: generator.generate_to_path(output_path))
+
+    return {
+        "source_tables": len(context.source.tables),
+        "target_tables": len(context.target.tables),
+        "input_files": len(create_paths) * 2 + len(paths.source_constraints) + len(paths.target_constraints),
+        "output_bytes": len(sql.encode()),
+        "output_lines": sql.count("\n"),
+        "phases": phases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 50, 100, 200], help="Numbers of source tables")
+    parser.add_argument("--targets-per-source", type=int, default=3)
+    parser.add_argument("--chain-length", type=int, default=10, help="Length of the foreign key chains")
+    parser.add_argument("--workers", type=int, default=1, help="Processes parsing the input files")
+    parser.add_argument("--output", help="File to write the JSON results to")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as path:
+            write_schema(path, size, args.targets_per_source, args.chain_length)
+            results.append(run(path, args.workers))
+
+    report = json.dumps(
+        {
+            "python": platform.python_version(),
+            "targets_per_source": args.targets_per_source,
+            "chain_length": args.chain_length,
+            "workers": args.workers,
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
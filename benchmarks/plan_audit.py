@@ -0,0 +1,279 @@
+"""
+Audits the query plans of the propagation queries of a generated transducer.
+
+The script is loaded into an ephemeral PostgreSQL cluster (see
+`benchmarks/postgres.py`), both sides are seeded with `--cardinality`
+universal tuples through the bulk load procedures and the _INSERT,
+_INSERT_JOIN, _DELETE and _BULK tables with `--delta` tuples, as during a
+propagation. Every query over the staged rows of the insert, update and
+delete propagation functions and the join queries of the bulk load
+procedures, including the support anti-joins of the deletes, is then
+built by the generator's own code, executed under EXPLAIN (ANALYZE,
+BUFFERS) and the plans are checked for:
+
+- sequential scans reading more than --large-rows rows,
+- nested loops whose inner side is a sequential scan, i.e. unindexed joins,
+- row estimates off by more than --estimate-factor.
+
+    PYTHONPATH=src python -m benchmarks.plan_audit test/resources/input --cardinality 10000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+from typing import Iterator
+
+from ssqlt_prototype import Context, TriggerLevel
+from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.TransducerContext.Dataclasses.constraint import Constraint
+from ssqlt_prototype.TransducerContext.Dataclasses.db_context import DbContext
+
+from .postgres import EphemeralPostgres
+from .runtime import insert_sql, preload_sql
+
+
+@dataclass
+class Finding:
+    kind: str
+    node: str
+    detail: str
+
+
+@dataclass
+class QueryAudit:
+    name: str
+    sql: str
+    execution_ms: float = 0.0
+    shared_hit_blocks: int = 0
+    shared_read_blocks: int = 0
+    findings: list[Finding] = field(default_factory=list)
+
+
+def propagation_queries(generator: Generator) -> Iterator[tuple[str, str]]:
+    """
+    Yields the name and SQL of every query over the staged rows the insert,
+    update and delete propagation functions run, and of the join queries
+    of the bulk load procedures, built by the code generating them.
+    The deletes of the delete functions and the sibling updates of the
+    update functions are audited as the SELECT of the rows they change.
+    The updated rows are those staged in the _DELETE tables. The in place
+    updates of `UpdateTable` are single key lookups and left out.
+    """
+    context = generator.context
+    semi_join, plan_joins = generator.semi_join, generator.plan_joins
+    for side, db in (("source", context.source), ("target", context.target)):
+        for tablename in db.ordering:
+            yield (
+                f"{side} {tablename}_INSERT",
+                generator.join_tables[tablename].join_sql(
+                    Constraint.InsertDelete.INSERT, semi_join=semi_join, plan_joins=plan_joins
+                ),
+            )
+
+    yield "target_insert_fn", context.target_insert_sql(semi_join=semi_join, plan_joins=plan_joins)
+    for tablename in context.target.ordering:
+        yield (
+            f"source_insert_fn {tablename}",
+            context.source_insert_sql(tablename, semi_join=semi_join, plan_joins=plan_joins),
+        )
+
+    for side, deleted, counterpart, staging in _delete_sides(context):
+        for tablename in deleted.ordering:
+            yield (
+                f"{side}_delete_fn {tablename}_DELETE",
+                context.delete_join_sql(deleted, tablename, semi_join=semi_join, plan_joins=plan_joins),
+            )
+        for tablename in counterpart.ordering[::-1]:
+            condition = context.delete_condition_sql(
+                deleted, counterpart.tables[tablename], staging, plan_joins=plan_joins
+            )
+            yield (
+                f"{side}_delete_fn {tablename}",
+                f"SELECT * FROM {counterpart.schema}.{tablename} AS counterpart\nWHERE {condition}",
+            )
+
+
+    for update in generator.update_join_tables:
+        source = f"{update.source.schema}.{update.source.name}"
+        updated = f"SELECT * FROM {source}_DELETE"
+        for key, columns in update.siblings:
+            yield (
+                f"{update.name}_fn siblings ({', '.join(key)})",
+                f"SELECT sibling.* FROM {source} AS sibling, ({updated}) AS updated\n"
+                f"WHERE {update.sibling_condition(key, columns)}",
+            )
+        for table in update.derived_tables():
+            yield f"{update.name}_fn {table.name}", update.derive_sql(table, updated, plan_joins=plan_joins)
+
+    for side, loaded, complete_tuples in (("source", context.source, False), ("target", context.target, True)):
+        for tablename in loaded.ordering:
+            yield (
+                f"bulk_load_{side} {tablename}_BULK",
+                context.bulk_join_sql(loaded, tablename, complete_tuples=complete_tuples),
+            )
+
+
+def _delete_sides(context: Context) -> Iterator[tuple[str, DbContext, DbContext, str]]:
+    """
+    Yields the side, deleted and counterpart tables and candidate staging
+    table of each delete function. The functions stage into temporary
+    tables, which do not outlive a session, so regular tables of the same
+    name stand in for them.
+    """
+    yield "source", context.source, context.target, f"{context.source.schema}.{context.source_delete_staging_tablename}"
+    yield "target", context.target, context.source, f"{context.target.schema}.{context.target_delete_staging_tablename}"
+
+
+def seed_delta_sql(context: Context, cardinality: int, delta: int) -> str:
+    """
+    Fills the staging and _BULK tables of both sides with `delta` new
+    tuples, and the _DELETE tables with `delta` existing ones, without
+    firing any trigger.
+    The delete candidates are staged from the _DELETE tables.
+    """
+    result = "SET session_replication_role = replica;\nDO $$\nDECLARE\nlo INT;\nhi INT;\nBEGIN\n"
+    result += f"lo := {cardinality};\nhi := {cardinality + delta - 1};\n"
+    for db in (context.source, context.target):
+        result += insert_sql(db, lambda tablename: tablename + "_INSERT")
+        result += insert_sql(db, lambda tablename: tablename + "_INSERT_JOIN")
+        result += insert_sql(db, Context.bulk_tablename)
+    result += f"lo := 0;\nhi := {min(delta, cardinality) - 1};\n"
+    for db in (context.source, context.target):
+        result += insert_sql(db, lambda tablename: tablename + "_DELETE")
+    result += "END $$;\n"
+    # The delete candidates, as the delete functions stage them
+    for _, deleted, _, staging in _delete_sides(context):
+        columns = ", ".join(attr.name for attr in deleted.all_attributes())
+        definitions = ",\n".join(f"\t{attr.name} {attr._type}" for attr in deleted.all_attributes())
+        result += f"CREATE TABLE {staging} (\n{definitions}\n);\n"
+        for tablename in deleted.ordering:
+            result += f"INSERT INTO {staging} ({columns}) ({context.delete_join_sql(deleted, tablename)});\n"
+    result += "RESET session_replication_role;\nANALYZE;\n"
+    return result
+
+
+def _nodes(plan: dict, parent: dict | None = None) -> Iterator[tuple[dict, dict | None]]:
+    yield plan, parent
+    for child in plan.get("Plans", []):
+        yield from _nodes(child, plan)
+
+
+def _describe(node: dict) -> str:
+    relation = node.get("Relation Name")
+    if relation is None:
+        return node["Node Type"]
+    return f"{node['Node Type']} on {relation}"
+
+
+def audit_plan(plan: dict, large_rows: int, estimate_factor: float) -> list[Finding]:
+    findings = []
+    for node, parent in _nodes(plan):
+        loops = node.get("Actual Loops", 1)
+        actual = node.get("Actual Rows", 0)
+        estimated = node.get("Plan Rows", 0)
+
+        if node["Node Type"] == "Seq Scan":
+            scanned = (actual + node.get("Rows Removed by Filter", 0)) * loops
+            if scanned > large_rows:
+                findings.append(Finding("seq_scan", _describe(node), f"{scanned} rows read over {loops} loop(s)"))
+
+        if node["Node Type"] == "Nested Loop" and len(node.get("Plans", [])) == 2:
+            inner = node["Plans"][1]
+            while inner["Node Type"] in ("Materialize", "Memoize") and inner.get("Plans"):
+                inner = inner["Plans"][0]
+            if inner["Node Type"] == "Seq Scan":
+                findings.append(
+                    Finding("unindexed_nested_loop", _describe(node), f"inner side is a {_describe(inner)}")
+                )
+
+        if loops > 0 and max(actual, estimated) > 0:
+            ratio = max(actual, 1) / max(estimated, 1)
+            if ratio > estimate_factor or 1 / ratio > estimate_factor:
+                findings.append(
+                    Finding("estimate", _describe(node), f"estimated {estimated} rows, got {actual} per loop")
+                )
+    return findings
+
+
+def run_audit(
+    postgres: EphemeralPostgres,
+    generator: Generator,
+    large_rows: int,
+    estimate_factor: float,
+) -> list[QueryAudit]:
+    audits = []
+    for name, sql in propagation_queries(generator):
+        output = postgres.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql};")
+        explained = json.loads(output)[0]
+        plan = explained["Plan"]
+        audits.append(
+            QueryAudit(
+                name=name,
+                sql=sql,
+                execution_ms=explained.get("Execution Time", 0.0),
+                # Buffer counts of a node include its children's
+                shared_hit_blocks=plan.get("Shared Hit Blocks", 0),
+                shared_read_blocks=plan.get("Shared Read Blocks", 0),
+                findings=audit_plan(plan, large_rows, estimate_factor),
+            )
+        )
+    return audits
+
+
+def format_report(audits: list[QueryAudit]) -> str:
+    lines = []
+    for audit in sorted(audits, key=lambda audit: -audit.execution_ms):
+        status = "OK" if not audit.findings else f"{len(audit.findings)} finding(s)"
+        lines.append(
+            f"{audit.name}: {audit.execution_ms:.2f} ms, "
+            f"{audit.shared_hit_blocks} hit / {audit.shared_read_blocks} read blocks, {status}"
+        )
+        for finding in audit.findings:
+            lines.append(f"   [{finding.kind}] {finding.node}: {finding.detail}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="Transducer input directory")
+    parser.add_argument("--cardinality", type=int, default=10000, help="Universal tuples seeded on each side")
+    parser.add_argument("--delta", type=int, default=10, help="Tuples seeded in the staging tables")
+    parser.add_argument("--large-rows", type=int, default=1000, help="Rows above which a sequential scan is flagged")
+    parser.add_argument("--estimate-factor", type=float, default=10.0)
+    parser.add_argument("--trigger-level", choices=[level.name.lower() for level in TriggerLevel], default="row")
+    parser.add_argument("--semi-join", action="store_true", help="Audit the semi-join restricted queries")
+    parser.add_argument("--plan-joins", action="store_true", help="Audit the queries with planned joins")
+    parser.add_argument("--port", type=int, default=54329)
+    parser.add_argument("--json", help="File to write the full JSON report to")
+    args = parser.parse_args()
+
+    generator = Generator.from_dir(
+        args.input,
+        trigger_level=TriggerLevel[args.trigger_level.upper()],
+        semi_join=args.semi_join,
+        plan_joins=args.plan_joins,
+    )
+    context = generator.context
+
+    with tempfile.TemporaryDirectory() as path:
+        script_path = os.path.join(path, "transducer.sql")
+        generator.generate_to_path(script_path)
+
+        with EphemeralPostgres(port=args.port, settings={"client_min_messages": "warning"}) as postgres:
+            postgres.execute_file(script_path)
+            if args.cardinality > 0:
+                postgres.execute(preload_sql(context, "source", args.cardinality))
+            postgres.execute(seed_delta_sql(context, args.cardinality, args.delta))
+            audits = run_audit(postgres, generator, args.large_rows, args.estimate_factor)
+
+    print(format_report(audits))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(audit) for audit in audits], f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
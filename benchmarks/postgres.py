@@ -0,0 +1,114 @@
+"""
+A throwaway PostgreSQL cluster for benchmarks.
+
+The cluster is created with `initdb` in a temporary directory, started with
+`pg_ctl` on a Unix socket only, and removed again on exit. Binaries are
+looked up in $PG_BIN, then `pg_config --bindir`, then $PATH.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+def _bindir() -> str | None:
+    if "PG_BIN" in os.environ:
+        return os.environ["PG_BIN"]
+    pg_config = shutil.which("pg_config")
+    if pg_config is not None:
+        return subprocess.run([pg_config, "--bindir"], check=True, capture_output=True, text=True).stdout.strip()
+    return None
+
+
+class EphemeralPostgres:
+    user = "postgres"
+    database = "postgres"
+
+    def __init__(self, port: int = 54329, settings: dict[str, str] | None = None) -> None:
+        self.port = port
+        self.settings = settings or {}
+        self.bindir = _bindir()
+        self.path: str | None = None
+
+    def _binary(self, name: str) -> str:
+        if self.bindir is not None:
+            return os.path.join(self.bindir, name)
+        binary = shutil.which(name)
+        if binary is None:
+            raise FileNotFoundError(f"{name} not found, set PG_BIN to the PostgreSQL bin directory")
+        return binary
+
+    @property
+    def data_dir(self) -> str:
+        assert self.path is not None, "Cluster is not running"
+        return os.path.join(self.path, "data")
+
+    def start(self) -> None:
+        self.path = tempfile.mkdtemp(prefix="ssqlt_pg_")
+        subprocess.run(
+            [self._binary("initdb"), "-D", self.data_dir, "-U", self.user, "--auth=trust", "--no-sync"],
+            check=True,
+            capture_output=True,
+        )
+        options = [f"-p {self.port}", f"-k {self.path}", "-c listen_addresses=''"]
+        options += [f"-c {name}={value}" for name, value in self.settings.items()]
+        subprocess.run(
+            [
+                self._binary("pg_ctl"),
+                "-D", self.data_dir,
+                "-l", os.path.join(self.path, "server.log"),
+                "-o", " ".join(options),
+                "-w", "start",
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+    def stop(self) -> None:
+        if self.path is None:
+            return
+        try:
+            subprocess.run(
+                [self._binary("pg_ctl"), "-D", self.data_dir, "-m", "immediate", "-w", "stop"],
+                check=True,
+                capture_output=True,
+            )
+        finally:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+    def __enter__(self) -> "EphemeralPostgres":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _psql(self, *args: str, stdin: str | None = None) -> str:
+        assert self.path is not None, "Cluster is not running"
+        result = subprocess.run(
+            [
+                self._binary("psql"),
+                "-h", self.path,
+                "-p", str(self.port),
+                "-U", self.user,
+                "-d", self.database,
+                "-X", "-q", "-A", "-t",
+                "-v", "ON_ERROR_STOP=1",
+                *args,
+            ],
+            input=stdin,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"psql failed: {result.stderr.strip()}")
+        return result.stdout
+
+    def execute(self, sql: str) -> str:
+        """Runs `sql` in autocommit mode and returns the unaligned output."""
+        return self._psql(stdin=sql)
+
+    def execute_file(self, path: str) -> str:
+        return self._psql("-f", path)
@@ -0,0 +1,234 @@
+"""
+Measures the insert throughput and latency of a generated transducer.
+
+The script produced by the generator is loaded into an ephemeral PostgreSQL
+cluster (see `benchmarks/postgres.py`). For each side, table cardinality and
+batch size, the tables are first filled with `cardinality` universal tuples
+through the bulk load procedure, then `iterations` batches of `batch_size`
+new tuples are inserted into the tables of that side, one transaction per
+batch. Timing happens inside the server so psql round trips are not counted.
+A case failing in the server is reported with its `error` instead of the
+measurements, and the remaining cases still run.
+
+Tuple `i` sets every attribute `a` to 'a_i' (or `i` for integer columns), so
+the rows of all tables of a tuple join, and tuples never collide.
+
+    PYTHONPATH=src python -m benchmarks.runtime test/resources/input \\
+        --batch-sizes 1 10 100 --cardinalities 0 10000
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from typing import Callable
+
+from ssqlt_prototype import Context, LoopPrevention, TriggerLevel
+from ssqlt_prototype import instrumentation
+from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.TransducerContext.Dataclasses.db_context import DbContext
+from ssqlt_prototype.TransducerContext.Dataclasses.table import Attr
+
+from .postgres import EphemeralPostgres
+
+LATENCY_TABLE = "public._bench_latency"
+INTEGER_TYPES = ("INT", "INTEGER", "BIGINT", "SMALLINT", "SERIAL", "BIGSERIAL")
+
+
+def _value(attr: Attr) -> str:
+    if attr._type in INTEGER_TYPES:
+        return "i"
+    return f"'{attr.name}_' || i"
+
+
+def insert_sql(context: DbContext, rename: Callable[[str], str] | None = None) -> str:
+    """
+    Statements inserting the universal tuples `lo` to `hi` into every table of
+    `context`, or into the tables `rename` maps their names to, referenced
+    tables first. `lo` and `hi` are left as variables.
+    """
+    result = ""
+    for tablename in context.ordering:
+        table = context.tables[tablename]
+        columns = ", ".join(attr.name for attr in table.attributes)
+        values = ", ".join(_value(attr) for attr in table.attributes)
+        if rename is not None:
+            tablename = rename(tablename)
+        result += (
+            f"INSERT INTO {table.schema}.{tablename} ({columns})\n"
+            f"SELECT {values} FROM generate_series(lo, hi) AS i;\n"
+        )
+    return result
+
+
+def preload_sql(context: Context, side: str, cardinality: int) -> str:
+    """Fills the tables of `side` with `cardinality` tuples through its bulk load procedure."""
+    loaded = context.source if side == "source" else context.target
+    return f"""DO $$
+DECLARE
+lo INT := 0;
+hi INT := {cardinality - 1};
+BEGIN
+{insert_sql(loaded, Context.bulk_tablename)}END $$;
+CALL {loaded.schema}.bulk_load_{side}();
+"""
+
+
+def measure_sql(context: Context, side: str, first: int, batch_size: int, iterations: int) -> str:
+    inserted = context.source if side == "source" else context.target
+    return f"""DROP TABLE IF EXISTS {LATENCY_TABLE};
+CREATE UNLOGGED TABLE {LATENCY_TABLE} (batch INT NOT NULL, seconds DOUBLE PRECISION NOT NULL);
+DO $$
+DECLARE
+lo INT;
+hi INT;
+t0 TIMESTAMPTZ;
+elapsed DOUBLE PRECISION;
+BEGIN
+FOR batch IN 0..{iterations - 1} LOOP
+   lo := {first} + batch * {batch_size};
+   hi := lo + {batch_size - 1};
+   t0 := clock_timestamp();
+{insert_sql(inserted)}   COMMIT;
+   elapsed := extract(epoch FROM clock_timestamp() - t0);
+   INSERT INTO {LATENCY_TABLE} VALUES (batch, elapsed);
+END LOOP;
+COMMIT;
+END $$;
+SELECT count(*), sum(seconds),
+   percentile_cont(0.5) WITHIN GROUP (ORDER BY seconds),
+   percentile_cont(0.99) WITHIN GROUP (ORDER BY seconds)
+FROM {LATENCY_TABLE};
+"""
+
+
+def run_case(
+    postgres: EphemeralPostgres,
+    script_path: str,
+    context: Context,
+    side: str,
+    cardinality: int,
+    batch_size: int,
+    iterations: int,
+    instrument: bool = False,
+) -> dict:
+    # The script starts by dropping the schema, so every case starts afresh
+    postgres.execute_file(script_path)
+    if cardinality > 0:
+        postgres.execute(preload_sql(context, side, cardinality))
+    if instrument:
+        postgres.execute(f"TRUNCATE {context.source.schema}._stats;")
+    output = postgres.execute(measure_sql(context, side, cardinality, batch_size, iterations))
+    batches, seconds, p50, p99 = output.strip().splitlines()[-1].split("|")
+    tuples = int(batches) * batch_size
+    result = {
+        "side": side,
+        "cardinality": cardinality,
+        "batch_size": batch_size,
+        "batches": int(batches),
+        "seconds": float(seconds),
+        "tuples_per_second": tuples / float(seconds),
+        "p50_batch_seconds": float(p50),
+        "p99_batch_seconds": float(p99),
+    }
+    if instrument:
+        functions = postgres.execute(
+            f"SELECT COALESCE(json_agg(summary), '[]') FROM {context.source.schema}._stats_summary AS summary;"
+        )
+        result["functions"] = json.loads(functions)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="Transducer input directory")
+    parser.add_argument("--sides", nargs="+", choices=["source", "target"], default=["source", "target"])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--cardinalities", type=int, nargs="+", default=[0, 1000, 10000])
+    parser.add_argument("--iterations", type=int, default=200, help="Batches measured per case")
+    parser.add_argument("--trigger-level", choices=[level.name.lower() for level in TriggerLevel], default="row")
+    parser.add_argument(
+        "--loop-prevention", choices=[loop.value for loop in LoopPrevention], default=LoopPrevention.TABLE.value
+    )
+    parser.add_argument("--semi-join", action="store_true", help="Generate semi-join restricted propagation queries")
+    parser.add_argument("--plan-joins", action="store_true", help="Plan propagation joins from the foreign keys")
+    parser.add_argument(
+        "--dispatch-constraints", action="store_true", help="Check constraints through one trigger per table and event"
+    )
+    parser.add_argument(
+        "--statement-constraints", action="store_true", help="Check FD and MVD constraints once per statement"
+    )
+    parser.add_argument("--fd-index", action="store_true", help="Check FD constraints through indexed lookup tables")
+    parser.add_argument(
+        "--instrument", action="store_true", help="Report the calls, rows and time of every generated function"
+    )
+    parser.add_argument("--port", type=int, default=54329)
+    parser.add_argument("--output", help="File to write the JSON results to")
+    args = parser.parse_args()
+
+    trigger_level = TriggerLevel[args.trigger_level.upper()]
+    loop_prevention = LoopPrevention(args.loop_prevention)
+    generator = Generator.from_dir(
+        args.input,
+        trigger_level=trigger_level,
+        loop_prevention=loop_prevention,
+        semi_join=args.semi_join,
+        plan_joins=args.plan_joins,
+        dispatch_constraints=args.dispatch_constraints,
+        statement_constraints=args.statement_constraints,
+        fd_index=args.fd_index,
+        instrument=args.instrument,
+    )
+
+    results = []
+    with tempfile.TemporaryDirectory() as path:
+        script_path = os.path.join(path, "transducer.sql")
+        generator.generate_to_path(script_path)
+
+        settings = {"client_min_messages": "warning"}
+        if args.instrument:
+            settings[instrumentation.setting(generator.context.source.schema)] = "on"
+        with EphemeralPostgres(port=args.port, settings=settings) as postgres:
+            version = postgres.execute("SHOW server_version;").strip()
+            for side in args.sides:
+                for cardinality in args.cardinalities:
+                    for batch_size in args.batch_sizes:
+                        try:
+                            result = run_case(
+                                postgres, script_path, generator.context,
+                                side, cardinality, batch_size, args.iterations,
+                                instrument=args.instrument,
+                            )
+                        except RuntimeError as e:
+                            # A mode failing on one case still leaves the others worth measuring
+                            print(f"{side}, cardinality {cardinality}, batch size {batch_size}: {e}", file=sys.stderr)
+                            result = {"side": side, "cardinality": cardinality, "batch_size": batch_size, "error": str(e)}
+                        results.append(result)
+
+    report = json.dumps(
+        {
+            "python": platform.python_version(),
+            "postgres": version,
+            "trigger_level": args.trigger_level,
+            "loop_prevention": args.loop_prevention,
+            "semi_join": args.semi_join,
+            "plan_joins": args.plan_joins,
+            "dispatch_constraints": args.dispatch_constraints,
+            "statement_constraints": args.statement_constraints,
+            "fd_index": args.fd_index,
+            "instrument": args.instrument,
+            "results": results,
+        },
+        indent=2,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Synthesizes transducer input directories of arbitrary size.
+
+Source table `_s{i}` holds a key `k{i}`, a name `n{i}`, value columns
+`v{i}_{j}` and, unless it starts a foreign key chain, the key `k{i-1}` of its
+parent. Each source table is decomposed into target tables: `_t{i}_0` keeps
+the keys and the name and `_t{i}_{j}` pairs the key with one value column. Mappings join a table with
+its parent and child in the chain, and every source table gets a functional
+dependency constraint `k{i} -> v{i}_1`.
+"""
+
+import argparse
+import os
+
+SCHEMA = "transducer"
+TYPE = "VARCHAR(100)"
+
+
+def _parent(i: int, chain_length: int) -> int | None:
+    return i - 1 if i % chain_length != 0 else None
+
+
+def _children(i: int, tables: int, chain_length: int) -> list[int]:
+    child = i + 1
+    if child < tables and _parent(child, chain_length) == i:
+        return [child]
+    return []
+
+
+def _write(path: str, content: str) -> None:
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _create_sql(name: str, columns: list[str], pkey: list[str], fkeys: list[tuple[list[str], str, list[str]]]) -> str:
+    lines = [f"  {column} {TYPE} NOT NULL" for column in columns]
+    lines.append(f"  PRIMARY KEY ({', '.join(pkey)})")
+    for fk_columns, ref_table, ref_columns in fkeys:
+        lines.append(
+            f"  FOREIGN KEY ({', '.join(fk_columns)}) REFERENCES {SCHEMA}.{ref_table.upper()}({', '.join(ref_columns)})"
+        )
+    return f"CREATE TABLE {SCHEMA}.{name.upper()} (\n" + ",\n".join(lines) + "\n);\n"
+
+
+def _mapping_sql(name: str, partners: list[str]) -> str:
+    sql = "${select_preamble} ${attributes}\n"
+    sql += f"FROM {SCHEMA}.{name.upper()}${{primary_suffix}}\n"
+    for partner in partners:
+        sql += f"   NATURAL LEFT OUTER JOIN {SCHEMA}.{partner.upper()}${{secondary_suffix}}\n"
+    return sql
+
+
+def _constraint_sql(name: str, lhs: str, rhs: str) -> str:
+    return f"""CREATE OR REPLACE FUNCTION {SCHEMA}.{name}_fd_1_insert_fn()
+RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+BEGIN
+   IF EXISTS (SELECT * FROM {SCHEMA}.{name.upper()} AS r1
+         WHERE r1.{lhs} = NEW.{lhs} AND r1.{rhs} <> NEW.{rhs}) THEN
+      RAISE EXCEPTION 'THIS ADDED VALUES VIOLATE THE FD CONSTRAINT IN {name.upper()}';
+      RETURN NULL;
+   ELSE
+      RETURN NEW;
+   END IF;
+END;
+$$;
+"""
+
+
+def write_schema(
+    path: str,
+    tables: int,
+    targets_per_source: int = 3,
+    chain_length: int = 10,
+) -> str:
+    """
+    Writes an input directory with `tables` source tables and
+    `tables * targets_per_source` target tables to `path`.
+    """
+    if targets_per_source < 2:
+        raise ValueError("Each source table needs at least two target tables")
+
+    dirs = {}
+    for side in ("source", "target"):
+        for kind in ("create", "constraints", "mappings"):
+            dirs[side, kind] = os.path.join(path, side, kind)
+            os.makedirs(dirs[side, kind], exist_ok=True)
+
+    values = range(1, targets_per_source)
+
+    for i in range(tables):
+        parent = _parent(i, chain_length)
+        children = _children(i, tables, chain_length)
+        key = f"k{i}"
+
+        # Source table
+
+        name = f"_s{i}"
+        columns = [key, f"n{i}"] + [f"v{i}_{j}" for j in values]
+        fkeys = []
+        if parent is not None:
+            columns.append(f"k{parent}")
+            fkeys.append(([f"k{parent}"], f"_s{parent}", [f"k{parent}"]))
+        partners = [f"_s{j}" for j in ([parent] if parent is not None else []) + children]
+
+        _write(os.path.join(dirs["source", "create"], f"{name}.sql"), _create_sql(name, columns, [key], fkeys))
+        _write(os.path.join(dirs["source", "mappings"], f"{name}.sql"), _mapping_sql(name, partners))
+        _write(
+            os.path.join(dirs["source", "constraints"], f"{SCHEMA}.{name}.fd.1.insert.sql"),
+            _constraint_sql(name, key, f"v{i}_1"),
+        )
+
+        # Target tables
+
+        name = f"_t{i}_0"
+        columns = [key, f"n{i}"]
+        fkeys = []
+        if parent is not None:
+            columns.append(f"k{parent}")
+            fkeys.append(([f"k{parent}"], f"_t{parent}_0", [f"k{parent}"]))
+        partners = [f"_t{i}_{j}" for j in values]
+        partners += [f"_t{j}_0" for j in ([parent] if parent is not None else []) + children]
+
+        _write(os.path.join(dirs["target", "create"], f"{name}.sql"), _create_sql(name, columns, [key], fkeys))
+        _write(os.path.join(dirs["target", "mappings"], f"{name}.sql"), _mapping_sql(name, partners))
+
+        for j in values:
+            name = f"_t{i}_{j}"
+            partners = [f"_t{i}_0"] + [f"_t{i}_{other}" for other in values if other != j]
+            _write(
+                os.path.join(dirs["target", "create"], f"{name}.sql"),
+                _create_sql(name, [key, f"v{i}_{j}"], [key], [([key], f"_t{i}_0", [key])]),
+            )
+            _write(os.path.join(dirs["target", "mappings"], f"{name}.sql"), _mapping_sql(name, partners))
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="Directory to write the input files to")
+    parser.add_argument("--tables", type=int, default=100, help="Number of source tables")
+    parser.add_argument("--targets-per-source", type=int, default=3)
+    parser.add_argument("--chain-length", type=int, default=10, help="Length of the foreign key chains")
+    args = parser.parse_args()
+    write_schema(args.path, args.tables, args.targets_per_source, args.chain_length)
+
+
+if __name__ == "__main__":
+    main()
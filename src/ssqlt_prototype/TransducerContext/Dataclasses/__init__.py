@@ -1,9 +1,15 @@
-from .constraint import Constraint as Constraint
+from .constraint import Constraint as Constraint, ConstraintDispatch as ConstraintDispatch
 from .create_table import CreateTable as CreateTable
 from .insert_table import InsertTable as InsertTable
 from .delete_table import DeleteTable as DeleteTable
+from .fd_index import FdIndex as FdIndex
+from .update_table import UpdateTable as UpdateTable, UpdateJoinTable as UpdateJoinTable
 from .mapping import Mapping as Mapping
 from .join_table import JoinTable as JoinTable
-from .enums import SourceTarget as SourceTarget
+from .enums import SourceTarget as SourceTarget, TriggerLevel as TriggerLevel
+from .dependency import Dependency as Dependency
+from .loop_prevention import LoopPrevention as LoopPrevention
 from .attribute import Attribute as Attribute
 from .table import Table as Table, Attr as Attr
+from .catalog import Catalog as Catalog
+from .join_planner import JoinPlanner as JoinPlanner, JoinPlan as JoinPlan
@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+
+from .table import Attr, Table
+
+
+@dataclass
+class Catalog:
+    """
+    Lookups over the tables of one side of the transducer, built once per
+    `DbContext`. Tables and attributes keep the order of the context's
+    tables, so everything generated from them is stable between runs.
+    """
+
+    # Union of the table attributes, the first one of each name
+    attributes: list[Attr]
+    # Attribute name to the names of the tables having it
+    owners: dict[str, list[str]]
+    # Table name to the names of the tables it references or is referenced by
+    neighbours: dict[str, list[str]]
+    # Names of the attributes in a primary or foreign key of any table
+    keys: list[str]
+
+    @classmethod
+    def from_tables(cls, tables: dict[str, Table]) -> "Catalog":
+        attributes: dict[str, Attr] = {}
+        owners: dict[str, list[str]] = {}
+        neighbours: dict[str, dict[str, None]] = {tablename: {} for tablename in tables}
+        keys: dict[str, None] = {}
+
+        for tablename, table in tables.items():
+            for attr in table.attributes:
+                attributes.setdefault(attr.name, attr)
+                owners.setdefault(attr.name, []).append(tablename)
+            for pk in table.pkey:
+                keys.update(dict.fromkeys(pk.columns))
+            for fk in table.fkey:
+                keys.update(dict.fromkeys(fk.columns))
+                if fk.ref_tablename in neighbours and fk.ref_tablename != tablename:
+                    neighbours[tablename][fk.ref_tablename] = None
+                    neighbours[fk.ref_tablename][tablename] = None
+
+        return cls(
+            attributes=list(attributes.values()),
+            owners=owners,
+            neighbours={tablename: list(names) for tablename, names in neighbours.items()},
+            keys=list(keys),
+        )
+
+    def shared_columns(self, table: Table) -> dict[str, list[str]]:
+        """
+        Returns, per other table sharing attributes with `table`, the names
+        of the shared attributes in the order of `table`.
+        """
+        result: dict[str, list[str]] = {}
+        for attr in table.attributes:
+            for owner in self.owners.get(attr.name, []):
+                if owner != table.name:
+                    result.setdefault(owner, []).append(attr.name)
+        return result
@@ -1,8 +1,11 @@
 from dataclasses import dataclass
 import os
-from typing import Self
+from typing import Iterable, Self
 from enum import Enum
 
+from .dependency import Dependency
+from .enums import TriggerLevel
+
 
 @dataclass
 class Constraint:
@@ -16,6 +19,7 @@ class Constraint:
     index: int
     insert_delete: InsertDelete
     sql: str
+    dependency: Dependency | None = None
 
     @classmethod
     def from_file(cls, file_path: str) -> Self:
@@ -30,8 +34,9 @@ class Constraint:
         insert_delete = Constraint.InsertDelete(tokens[4])
         with open(file_path, "r") as f:
             sql = f.read().strip()
+        dependency = Dependency.from_sql(type_, sql)
         sql = sql[sql.index("$$") :]
-        return cls(schema, table, type_, index, insert_delete, sql)
+        return cls(schema, table, type_, index, insert_delete, sql, dependency)
 
     def _function_name(self) -> str:
         return f"{self.table}_{self.type_}_{self.index}_{self.insert_delete.value}_fn"
@@ -45,6 +50,145 @@ class Constraint:
         return f"""CREATE OR REPLACE FUNCTION {self.schema}.{self._function_name()}()
 RETURNS TRIGGER LANGUAGE PLPGSQL AS {self.sql}"""
 
+    def _row(self) -> str:
+        return "NEW" if self.insert_delete == Constraint.InsertDelete.INSERT else "OLD"
+
+    def _check_function_name(self) -> str:
+        return f"{self.table}_{self.type_}_{self.index}_{self.insert_delete.value}_check"
+
+    def generate_check_function(self) -> str:
+        """
+        The constraint as a plain function of the inserted or deleted row,
+        for `ConstraintDispatch` to call. It returns what the trigger
+        function would: the row, or NULL to skip it.
+        """
+        rowtype = f"{self.schema}.{self.table}"
+        return f"""CREATE OR REPLACE FUNCTION {self.schema}.{self._check_function_name()}({self._row()} {rowtype})
+RETURNS {rowtype} LANGUAGE PLPGSQL AS {self.sql}"""
+
+    def trigger_name(self) -> str:
+        return f"{self.schema}_{self._trigger_name()}"
+
+    def generate_trigger(self) -> str:
+        return f"""CREATE TRIGGER {self.trigger_name()}
+BEFORE {self.insert_delete.name} ON {self.schema}.{self.table}
+FOR EACH ROW
+EXECUTE FUNCTION {self.schema}.{self._function_name()}();"""
+
+    def checks_per_statement(self, others: Iterable["Constraint"] = ()) -> bool:
+        """
+        Whether the constraint can be checked once per statement, see
+        `generate_statement_function`, given the `others` of its table.
+
+        A constraint of the same type and event without a dependency is a
+        chase, e.g. mvd.2 inserting the tuples an MVD calls for. Its row
+        trigger must only see rows the check let through, so the check
+        keeps its row trigger ahead of it.
+        """
+        if self.dependency is None or self.insert_delete != Constraint.InsertDelete.INSERT:
+            return False
+        return not any(
+            other.type_ == self.type_ and other.insert_delete == self.insert_delete and other.dependency is None
+            for other in others
+        )
+
+    def _statement_function_name(self) -> str:
+        return f"{self.table}_{self.type_}_{self.index}_{self.insert_delete.value}_statement_fn"
+
+    def generate_statement_function(self, attributes: list[str]) -> str:
+        """
+        Checks the dependency of the constraint once per insert statement,
+        after it, for the lhs values of the inserted rows. The table then
+        holds both the inserted rows and the existing rows they relate to.
+        Every violating lhs value is reported.
+        """
+        assert self.dependency is not None
+        violations = self.dependency.violation_sql(
+            self.schema, self.table, attributes, TriggerLevel.transition_table("NEW")
+        )
+        if violations is None:
+            check = ""
+        else:
+            check = f"""   SELECT string_agg(violation::text, ', ') INTO violations
+   FROM ({violations}
+   ) AS violation;
+   IF violations IS NOT NULL THEN
+      RAISE EXCEPTION 'THESE ADDED VALUES VIOLATE THE {self.type_.upper()} CONSTRAINT {self.dependency} IN {self.table.upper()} FOR %', violations;
+   END IF;
+"""
+        return f"""CREATE OR REPLACE FUNCTION {self.schema}.{self._statement_function_name()}()
+RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+DECLARE
+   violations TEXT;
+BEGIN
+{check}   RETURN NULL;
+END;
+$$;"""
+
+    def generate_statement_trigger(self) -> str:
+        return f"""CREATE TRIGGER {self.schema}_{self.table}_{self.type_}_{self.index}_{self.insert_delete.value}_statement_trigger
+AFTER {self.insert_delete.name} ON {self.schema}.{self.table}
+{TriggerLevel.STATEMENT.for_each("NEW")}
+EXECUTE FUNCTION {self.schema}.{self._statement_function_name()}();"""
+
+
+@dataclass
+class ConstraintDispatch:
+    """
+    All constraints of one table and event, checked by a single trigger.
+
+    Checks run in the order the per-constraint triggers fired, which
+    PostgreSQL fires by name, and stop at the first one raising or
+    skipping the row.
+    """
+
+    schema: str
+    table: str
+    insert_delete: Constraint.InsertDelete
+    constraints: list[Constraint]
+
+    @classmethod
+    def group(cls, constraints: Iterable[Constraint]) -> list[Self]:
+        """Groups constraints by table and event, in order of first appearance."""
+        groups: dict[tuple[str, Constraint.InsertDelete], Self] = {}
+        for constraint in constraints:
+            key = (constraint.table, constraint.insert_delete)
+            if key not in groups:
+                groups[key] = cls(constraint.schema, constraint.table, constraint.insert_delete, [])
+            groups[key].constraints.append(constraint)
+        for dispatch in groups.values():
+            dispatch.constraints.sort(key=lambda constraint: constraint.trigger_name())
+        return list(groups.values())
+
+    def _function_name(self) -> str:
+        return f"{self.table}_{self.insert_delete.value}_constraints_fn"
+
+    def _trigger_name(self) -> str:
+        return f"{self.table}_{self.insert_delete.value}_constraints_trigger"
+
+    def generate_function(self) -> str:
+        row = "NEW" if self.insert_delete == Constraint.InsertDelete.INSERT else "OLD"
+        checks = ""
+        for constraint in self.constraints:
+            if row == "NEW":
+                # Like consecutive BEFORE triggers, each check sees the row the previous one returned
+                checks += f"""   NEW := {self.schema}.{constraint._check_function_name()}(NEW);
+   IF NEW IS NULL THEN
+      RETURN NULL;
+   END IF;
+"""
+            else:
+                checks += f"""   IF {self.schema}.{constraint._check_function_name()}(OLD) IS NULL THEN
+      RETURN NULL;
+   END IF;
+"""
+        return f"""CREATE OR REPLACE FUNCTION {self.schema}.{self._function_name()}()
+RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+BEGIN
+{checks}   RETURN {row};
+END;
+$$;"""
+
     def generate_trigger(self) -> str:
         return f"""CREATE TRIGGER {self.schema}_{self._trigger_name()}
 BEFORE {self.insert_delete.name} ON {self.schema}.{self.table}
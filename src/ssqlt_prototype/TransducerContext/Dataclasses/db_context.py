@@ -1,21 +1,36 @@
-from dataclasses import dataclass
+import os
+import re
+from concurrent.futures import Executor
+from dataclasses import dataclass, field, replace
+from string import Template
+from typing import TYPE_CHECKING, Literal
 
+from .catalog import Catalog
 from .constraint import Constraint
+from .join_planner import JoinPlanner
 from .table import Table, Attr
 
+if TYPE_CHECKING:
+    from ...profiling import Profiler
+    from ..context_cache import ContextCache
+
+# A secondary table of a mapping template, e.g. transducer._PERSON${secondary_suffix}
+_SECONDARY_LEG = re.compile(r"([\w.]+)\$\{secondary_suffix\}")
+
 class Graph:
     def __init__(self):
-        self.nodes: dict[str, set] = {}
+        # Neighbours are kept in insertion order so sorting is deterministic
+        self.nodes: dict[str, dict[str, None]] = {}
 
     def add_node(self, name: str):
         if name not in self.nodes:
-            self.nodes[name] = set()
+            self.nodes[name] = {}
 
     def add_edge(self, from_name: str, to_name: str):
 
         self.add_node(from_name)
         self.add_node(to_name)
-        self.nodes[from_name].add(to_name)
+        self.nodes[from_name][to_name] = None
 
 def topological_sort(graph: Graph) -> list[str]:
     visited = set()
@@ -44,6 +59,16 @@ class DbContext:
     tables: dict[str, Table]
     constraints: dict[str, list[Constraint]]
     ordering: list[str]
+    # Semi-joined copies of the tables, by table name, mapping and suffixes
+    semi_join_tables: dict[tuple[str, str, str, str], Table] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    catalog: Catalog = field(init=False, repr=False, compare=False)
+    join_planner: JoinPlanner = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.catalog = Catalog.from_tables(self.tables)
+        self.join_planner = JoinPlanner(self.tables, self.catalog)
 
     @classmethod
     def from_files(
@@ -51,24 +76,52 @@ class DbContext:
         create_paths: list[str],
         constraint_paths: list[str],
         mapping_paths: list[str],
+        cache: "ContextCache | None" = None,
+        executor: Executor | None = None,
+        profiler: "Profiler | None" = None,
     ) -> "DbContext":
+        """
+        Builds the context of one side of the transducer. Files are parsed
+        with `executor` if given, and through `cache` if given; either way
+        the result only depends on the file names and contents. `profiler`
+        records parsing each table and constraint, and the ordering.
+        """
 
-        tables: dict[str, Table] = {}
-        for file_path in create_paths:
-            found = False
-            filename = file_path.split("/")[-1].split(".")[0]
-            for mapping_path in mapping_paths:
-                mapping_filename = mapping_path.split("/")[-1].split(".")[0]
-                if filename == mapping_filename:
-                    create_table = Table.from_create_path(file_path, mapping_path=mapping_path)
-                    tables[create_table.name] = create_table
-                    found = True
-                    break
-            if not found:
+        def filename(path: str) -> str:
+            return os.path.basename(path).split(".")[0]
+
+        mappings = {filename(path): path for path in mapping_paths}
+        pairs = []
+        for file_path in sorted(create_paths, key=os.path.basename):
+            if filename(file_path) not in mappings:
                 raise ValueError(
-                    f"Mapping file not found for table: {filename}. "
+                    f"Mapping file not found for table: {filename(file_path)}. "
                     "Ensure that the mapping file has the same name as the create file."
                 )
+            pairs.append((file_path, mappings[filename(file_path)]))
+        constraint_paths = sorted(constraint_paths, key=os.path.basename)
+
+        map_fn = map if executor is None else executor.map
+        if cache is None:
+            parsed_tables = map_fn(
+                Table.from_create_path,
+                [create for create, _ in pairs],
+                [mapping for _, mapping in pairs],
+            )
+            parsed_constraints = map_fn(Constraint.from_file, constraint_paths)
+        else:
+            parsed_tables = cache.tables(pairs, map_fn)
+            parsed_constraints = cache.constraints(constraint_paths, map_fn)
+
+        if profiler is not None:
+            parsed_tables = profiler.iter_items("parse_table", parsed_tables, lambda table: table.name)
+            parsed_constraints = profiler.iter_items(
+                "parse_constraint", parsed_constraints, lambda constraint: constraint.table
+            )
+
+        tables: dict[str, Table] = {}
+        for create_table in parsed_tables:
+            tables[create_table.name] = create_table
 
         schema = ""
         for table in tables.values():
@@ -81,19 +134,24 @@ class DbContext:
                 )
 
         constraints = {}
-        for file_path in constraint_paths:
-            constraint = Constraint.from_file(file_path)
+        for constraint in parsed_constraints:
             if constraint.table not in constraints:
                 constraints[constraint.table] = []
             constraints[constraint.table].append(constraint)
 
-        depGraph = Graph()
-        for table in tables.values():
-            depGraph.add_node(table.name)
-            for fkey in table.fkey:
-                depGraph.add_edge(fkey.ref_tablename, table.name)
+        def ordering() -> list[str]:
+            depGraph = Graph()
+            for table in tables.values():
+                depGraph.add_node(table.name)
+                for fkey in table.fkey:
+                    depGraph.add_edge(fkey.ref_tablename, table.name)
+            return topological_sort(depGraph)
 
-        path = topological_sort(depGraph)
+        if profiler is None:
+            path = ordering()
+        else:
+            with profiler.phase("ordering"):
+                path = ordering()
 
         return cls(
             tables=tables,
@@ -103,15 +161,122 @@ class DbContext:
         )
 
     def all_attributes(self) -> list[Attr]:
-        attributes = []
-        for table in self.tables.values():
-            attributes.extend(table.attributes)
-        return list(set(attributes))
-
-    def create_temp_table(self, name: str) -> str:
-        result = ""
-        all_attributes = self.all_attributes()
-        result += "\n" + f"create temporary table {name} (\n"
-        result += ",\n".join(f"\t{attr.name} {attr._type}" for attr in all_attributes)
-        result += "\n);"
+        """
+        Returns the union of the table attributes, in table order and
+        deduplicated by name, see `Catalog.attributes`.
+        """
+        return list(self.catalog.attributes)
+
+    def index_columns(self, tablename: str) -> list[list[str]]:
+        """
+        Returns the column lists propagation joins look a table up by: its
+        primary keys, its foreign keys and the columns it shares with each
+        other table, which are the join columns of the NATURAL JOIN mappings.
+        Lists already served by a previous list's index are skipped.
+        """
+        table = self.tables[tablename]
+        shared = self.catalog.shared_columns(table)
+
+        candidates = [pk.columns for pk in table.pkey]
+        candidates += [fk.columns for fk in table.fkey]
+        for other_tablename in self.ordering:
+            if other_tablename in shared:
+                candidates.append(shared[other_tablename])
+
+        result: list[list[str]] = []
+        for columns in candidates:
+            if any(existing[: len(columns)] == columns for existing in result):
+                continue
+            result.append(columns)
+        return result
+
+    def mapping_sql(
+        self,
+        tablename: str,
+        select_preamble: (
+            Literal["SELECT"] | Literal["SELECT DISTINCT"] | Literal[""]
+        ) = "",
+        custom_attributes: list[Attr] | None = None,
+        primary_suffix: str = "",
+        secondary_suffix: str = "",
+        semi_join: bool = False,
+        plan_joins: bool = False,
+    ) -> str:
+        """
+        Returns the SQL for the mapping of a table, see `Table.mapping_sql`.
+
+        With `semi_join`, every secondary table sharing columns with the
+        primary one is restricted to the rows matching a primary row on
+        them. Those are the only rows the NATURAL JOIN can pair with the
+        primary rows, so the result is unchanged while the join only reads
+        the rows related to the (small) primary table.
+
+        With `plan_joins`, the joins of the mapping are planned from the
+        foreign keys, see `JoinPlanner`.
+        """
+        table = self.tables[tablename]
+        if plan_joins:
+            attributes = table.attributes if custom_attributes is None else custom_attributes
+            planned = self.join_planner.planned_table(
+                tablename,
+                [attr.name for attr in attributes],
+                base_primary=primary_suffix == "",
+                base_secondary=secondary_suffix == "",
+                distinct=select_preamble == "SELECT DISTINCT",
+            )
+            if planned is not None:
+                table = planned
+        if not semi_join:
+            return table.mapping_sql(
+                select_preamble=select_preamble,
+                custom_attributes=custom_attributes,
+                primary_suffix=primary_suffix,
+                secondary_suffix=secondary_suffix,
+            )
+
+        key = (tablename, table.mapping.template, primary_suffix, secondary_suffix)
+        restricted = self.semi_join_tables.get(key)
+        if restricted is None:
+            restricted = self._semi_join_table(table, primary_suffix, secondary_suffix)
+            self.semi_join_tables[key] = restricted
+        return restricted.mapping_sql(
+            select_preamble=select_preamble,
+            custom_attributes=custom_attributes,
+            primary_suffix=primary_suffix,
+            secondary_suffix=secondary_suffix,
+        )
+
+    def _semi_join_table(self, table: Table, primary_suffix: str, secondary_suffix: str) -> Table:
+        primary = f"{table.schema}.{table.name}{primary_suffix}"
+
+        def restrict(match: re.Match) -> str:
+            leg = match.group(1)
+            leg_table = self.tables.get(leg.split(".")[-1].lower())
+            if leg_table is None:
+                return match.group(0)
+            shared = self.catalog.shared_columns(leg_table).get(table.name)
+            if not shared:
+                return match.group(0)
+            columns = ", ".join(shared)
+            return (
+                f"(SELECT * FROM {leg}{secondary_suffix} "
+                f"WHERE ({columns}) IN (SELECT {columns} FROM {primary})) AS {leg.split('.')[-1]}"
+            )
+
+        return replace(table, mapping=Template(_SECONDARY_LEG.sub(restrict, table.mapping.template)))
+
+    @staticmethod
+    def staging_table(name: str) -> str:
+        """Qualified name of the staging table `name`, see `create_staging_table`."""
+        return f"pg_temp.{name}"
+
+    def create_staging_table(self, name: str) -> str:
+        """
+        Returns the CREATE statement of a staging table for full join tuples.
+        The functions using it run it first, so each session gets its own
+        table on first use and concurrent propagations never share rows.
+        """
+        result = f"CREATE TEMP TABLE IF NOT EXISTS {name} (\n"
+        result += ",\n".join(f"\t{attr.name} {attr._type}" for attr in self.all_attributes())
+        result += "\n) ON COMMIT DELETE ROWS;"
         return result
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+from .enums import TriggerLevel
+from .loop_prevention import LoopPrevention
 from .table import Table
 
 
@@ -19,29 +21,61 @@ class DeleteTable:
         sql += "WHERE 1<>1;"
         return sql
 
-    def generate_function(self) -> str:
-        sql = f"""CREATE OR REPLACE FUNCTION {self.source.schema}.{self.table}_fn()
+    def create_index_sql(self, index_columns: list[list[str]]) -> str:
+        return self.source.create_index_sql(index_columns, tablename=self.table)
+
+    def generate_function(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+    ) -> str:
+        """
+        Stages the deleted rows in the _DELETE table, whose insert trigger
+        propagates them. Deletes issued by a propagation are not staged
+        again.
+        """
+        schema = self.source.schema
+        function_name = f"{schema}.{self.table}_fn"
+
+        if level == TriggerLevel.STATEMENT:
+            old_rows = TriggerLevel.transition_table("OLD")
+            attributestr = ", ".join(attr.name for attr in self.source.attributes)
+            guard = f"""
+   IF NOT EXISTS (SELECT * FROM {old_rows}) THEN
+      RETURN NULL;
+   END IF;"""
+            staged = f"SELECT {attributestr} FROM {old_rows}"
+            returned = "NULL"
+        else:
+            attributestr = ", ".join(
+                f"old.{attr.name}" for attr in self.source.attributes
+            )
+            guard = ""
+            staged = f"VALUES({attributestr})"
+            returned = "OLD"
+
+        columns = ", ".join(attr.name for attr in self.source.attributes)
+        sql = f"""CREATE OR REPLACE FUNCTION {function_name}()
    RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
    BEGIN
-   IF EXISTS (SELECT * FROM {self.source.schema}._loop WHERE loop_start = 2) THEN
-         DELETE FROM {self.source.schema}.{self.table};
-         RETURN NULL;
-   END IF;
-   IF EXISTS (SELECT * FROM {self.source.schema}._loop WHERE loop_start = 1) THEN
-         RETURN NULL;
+   RAISE NOTICE 'Triggered function {function_name} called';{guard}
+   IF {loop.is_active(schema)} THEN
+      RETURN {returned};
    END IF;
-   INSERT INTO {self.source.schema}._loop VALUES (-1);
-   INSERT INTO {self.source.schema}.{self.table} VALUES(SELECT * FROM OLD);
-   RETURN NEW;
+   INSERT INTO {schema}.{self.table} ({columns}) {staged};
+   RETURN {returned};
 END;  $$;
 """
 
         return sql
 
-    def generate_trigger(self) -> str:
-        sql = f"""CREATE TRIGGER {self.source.schema}_{self.table}_trigger
+    def trigger_name(self) -> str:
+        return f"{self.source.schema}_{self.table}_trigger"
+
+    def generate_trigger(self, level: TriggerLevel = TriggerLevel.ROW) -> str:
+        sql = f"""CREATE TRIGGER {self.trigger_name()}
 AFTER DELETE ON {self.source.schema}.{self.source.name}
-FOR EACH ROW
+{level.for_each("OLD")}
 EXECUTE FUNCTION {self.source.schema}.{self.table}_fn();
         """
         return sql
@@ -0,0 +1,83 @@
+import re
+from dataclasses import dataclass
+from enum import Enum
+from typing import Self
+
+# e.g. -- mvd: ssn ->> phone, email
+_ANNOTATION = re.compile(r"^\s*--\s*(fd|mvd)\s*:\s*(.+?)\s*(->>?)\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+# The comparisons of an FD check joining the table (r1) with the new row (r2)
+_EQUAL = re.compile(r"\br1\.(\w+)\s*=\s*r2\.\1\b", re.IGNORECASE)
+_DIFFERENT = re.compile(r"\br1\.(\w+)\s*<>\s*r2\.\1\b", re.IGNORECASE)
+
+
+@dataclass
+class Dependency:
+    """
+    A functional (lhs -> rhs) or multivalued (lhs ->> rhs) dependency a
+    constraint enforces, which allows checking it once per statement.
+    """
+
+    class Kind(Enum):
+        FD = "fd"
+        MVD = "mvd"
+
+    kind: Kind
+    lhs: list[str]
+    rhs: list[str]
+
+    @classmethod
+    def from_sql(cls, type_: str, sql: str) -> Self | None:
+        """
+        Returns the dependency declared by a `-- fd: a, b -> c` or
+        `-- mvd: a ->> b` comment of the constraint file, or else the one an
+        FD check compares the table and the new row on. None if neither.
+        """
+        if match := _ANNOTATION.search(sql):
+            kind = cls.Kind(match.group(1).lower())
+            arrow = "->>" if kind == cls.Kind.MVD else "->"
+            if match.group(3) != arrow:
+                raise ValueError(f"A {kind.value} dependency is written with {arrow}: {match.group(0).strip()}")
+            return cls(
+                kind=kind,
+                lhs=[name.strip().lower() for name in match.group(2).split(",")],
+                rhs=[name.strip().lower() for name in match.group(4).split(",")],
+            )
+
+        if type_.lower() != cls.Kind.FD.value:
+            return None
+        lhs = list(dict.fromkeys(name.lower() for name in _EQUAL.findall(sql)))
+        rhs = list(dict.fromkeys(name.lower() for name in _DIFFERENT.findall(sql)))
+        if not lhs or not rhs:
+            return None
+        return cls(kind=cls.Kind.FD, lhs=lhs, rhs=rhs)
+
+    def __str__(self) -> str:
+        arrow = "->>" if self.kind == Dependency.Kind.MVD else "->"
+        return f"{', '.join(self.lhs)} {arrow} {', '.join(self.rhs)}"
+
+    def violation_sql(self, schema: str, table: str, attributes: list[str], new_rows: str) -> str | None:
+        """
+        Returns the query of the `lhs` values of `table` which violate the
+        dependency, among those appearing in `new_rows`. None if the
+        dependency is trivial.
+
+        An FD is violated by an lhs value with more than one rhs value. An
+        MVD is violated by an lhs value whose rows are not all the
+        combinations of their rhs and remaining values.
+        """
+        lhs = ", ".join(self.lhs)
+        rhs = ", ".join(self.rhs)
+        if self.kind == Dependency.Kind.FD:
+            having = f"count(DISTINCT ({rhs})) > 1"
+        else:
+            rest = [name for name in attributes if name not in self.lhs + self.rhs]
+            if not rest:
+                return None
+            having = (
+                f"count(DISTINCT ({rhs}, {', '.join(rest)})) "
+                f"<> count(DISTINCT ({rhs})) * count(DISTINCT ({', '.join(rest)}))"
+            )
+        return f"""SELECT {lhs} FROM {schema}.{table}
+      WHERE ({lhs}) IN (SELECT {lhs} FROM {new_rows})
+      GROUP BY {lhs}
+      HAVING {having}"""
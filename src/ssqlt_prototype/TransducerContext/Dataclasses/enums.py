@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Literal
 
 
 class SourceTarget(Enum):
@@ -8,3 +9,36 @@ class SourceTarget(Enum):
 
     SOURCE = "source"
     TARGET = "target"
+
+
+class TriggerLevel(Enum):
+    """
+    Enum for the granularity at which generated triggers fire.
+
+    ROW triggers run once per affected row and see it as NEW/OLD.
+    STATEMENT triggers run once per statement and see the affected rows
+    through a transition table (see `transition_table`).
+    """
+
+    ROW = "ROW"
+    STATEMENT = "STATEMENT"
+
+    @staticmethod
+    def transition_table(old_new: Literal["NEW"] | Literal["OLD"] = "NEW") -> str:
+        """Name of the transition table exposed to STATEMENT triggers."""
+        return f"{old_new.lower()}_rows"
+
+    def for_each(
+        self, old_new: Literal["NEW"] | Literal["OLD"] | Literal["OLD NEW"] | None = None
+    ) -> str:
+        """
+        Returns the FOR EACH clause of a trigger, preceded by a REFERENCING
+        clause for STATEMENT triggers that need transition tables.
+        """
+        if self == TriggerLevel.STATEMENT and old_new is not None:
+            referencing = " ".join(
+                f"{table} TABLE AS {self.transition_table(table)}"
+                for table in old_new.split()
+            )
+            return f"REFERENCING {referencing}\nFOR EACH {self.value}"
+        return f"FOR EACH {self.value}"
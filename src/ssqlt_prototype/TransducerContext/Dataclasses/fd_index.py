@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+
+from .constraint import Constraint
+from .dependency import Dependency
+
+
+@dataclass
+class FdIndex:
+    """
+    A functional dependency lhs -> rhs checked through a lookup table
+    holding, for every lhs value of the table, its rhs value and how many
+    rows have it. The lookup table has a unique index on lhs, so each
+    inserted row costs one index probe instead of a scan of the table.
+
+    Rows with a NULL lhs value are not checked, as by the FD constraint
+    functions. Unlike those, NULL rhs values have to match as well, and
+    updates are checked too.
+    """
+
+    constraint: Constraint
+
+    @classmethod
+    def applies_to(cls, constraint: Constraint) -> bool:
+        return (
+            constraint.dependency is not None
+            and constraint.dependency.kind == Dependency.Kind.FD
+            and constraint.insert_delete == Constraint.InsertDelete.INSERT
+        )
+
+    @property
+    def dependency(self) -> Dependency:
+        assert self.constraint.dependency is not None
+        return self.constraint.dependency
+
+    @property
+    def name(self) -> str:
+        return f"{self.constraint.table}_{self.constraint.type_}_{self.constraint.index}_LOOKUP"
+
+    def create_sql(self) -> str:
+        """
+        Creates the lookup table from the rows of the table, so it is also
+        correct when created after the table was filled.
+        """
+        schema = self.constraint.schema
+        lhs = ", ".join(self.dependency.lhs)
+        columns = ", ".join(self.dependency.lhs + self.dependency.rhs)
+        not_null = " AND ".join(f"{col} IS NOT NULL" for col in self.dependency.lhs)
+        return f"""CREATE TABLE {schema}.{self.name} AS
+SELECT {columns}, count(*) AS row_count FROM {schema}.{self.constraint.table}
+WHERE {not_null}
+GROUP BY {columns};
+CREATE UNIQUE INDEX {self.name}_idx ON {schema}.{self.name} ({lhs});"""
+
+    def generate_function(self) -> str:
+        schema = self.constraint.schema
+        lookup = f"{schema}.{self.name}"
+        lhs = self.dependency.lhs
+        rhs = self.dependency.rhs
+
+        def not_null(row: str) -> str:
+            return " AND ".join(f"{row}.{col} IS NOT NULL" for col in lhs)
+
+        def matches(row: str) -> str:
+            return " AND ".join(f"{col} = {row}.{col}" for col in lhs)
+
+        rhs_row = "(" + ", ".join(f"lookup.{col}" for col in rhs) + ")"
+        excluded_row = "(" + ", ".join(f"EXCLUDED.{col}" for col in rhs) + ")"
+        new_values = ", ".join(f"NEW.{col}" for col in lhs + rhs)
+        new_lhs = ", ".join(f"NEW.{col}" for col in lhs)
+        function_name = f"{schema}.{self.name}_fn"
+
+        return f"""CREATE OR REPLACE FUNCTION {function_name}()
+RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+BEGIN
+   IF TG_OP IN ('UPDATE', 'DELETE') THEN
+      IF {not_null("OLD")} THEN
+         UPDATE {lookup} SET row_count = row_count - 1 WHERE {matches("OLD")};
+         DELETE FROM {lookup} WHERE {matches("OLD")} AND row_count = 0;
+      END IF;
+   END IF;
+   IF TG_OP IN ('INSERT', 'UPDATE') THEN
+      IF {not_null("NEW")} THEN
+         INSERT INTO {lookup} AS lookup ({", ".join(lhs + rhs)}, row_count) VALUES ({new_values}, 1)
+         ON CONFLICT ({", ".join(lhs)}) DO UPDATE SET row_count = lookup.row_count + 1
+         WHERE {rhs_row} IS NOT DISTINCT FROM {excluded_row};
+         IF NOT FOUND THEN
+            RAISE EXCEPTION 'THIS ADDED VALUES VIOLATE THE {self.constraint.type_.upper()} CONSTRAINT {self.dependency} IN {self.constraint.table.upper()} FOR %', ROW({new_lhs});
+         END IF;
+      END IF;
+   END IF;
+   RETURN NULL;
+END;
+$$;"""
+
+    def generate_trigger(self) -> str:
+        schema = self.constraint.schema
+        columns = ", ".join(self.dependency.lhs + self.dependency.rhs)
+        return f"""CREATE TRIGGER {schema}_{self.name}_trigger
+AFTER INSERT OR DELETE OR UPDATE OF {columns} ON {schema}.{self.constraint.table}
+FOR EACH ROW
+EXECUTE FUNCTION {schema}.{self.name}_fn();"""
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+from .enums import TriggerLevel
+from .loop_prevention import LoopPrevention
 from .universal_mapping import UniversalMapping
 from .table import Table
 
@@ -21,33 +23,64 @@ class InsertTable:
         sql += "WHERE 1<>1;"
         return sql
 
-    def generate_function(self) -> str:
-        function_name = f"{self.source.schema}.{self.table}_fn"
-        attributestr = ", ".join(
-            f"new.{attr.name}" for attr in self.source.attributes
-        )
+    def create_index_sql(self, index_columns: list[list[str]]) -> str:
+        # Staged rows may repeat, so keys are indexed without uniqueness.
+        return self.source.create_index_sql(index_columns, tablename=self.table)
+
+    def generate_function(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+    ) -> str:
+        schema = self.source.schema
+        function_name = f"{schema}.{self.table}_fn"
+
+        if level == TriggerLevel.STATEMENT:
+            # The whole batch is staged at once from the transition table.
+            # Statement triggers also fire for statements touching no rows,
+            # which must not leave a dangling _LOOP entry behind.
+            new_rows = TriggerLevel.transition_table("NEW")
+            attributestr = ", ".join(attr.name for attr in self.source.attributes)
+            guard = f"""
+   IF NOT EXISTS (SELECT * FROM {new_rows}) THEN
+      RETURN NULL;
+   END IF;"""
+            staged = f"SELECT {attributestr} FROM {new_rows}"
+            returned = "NULL"
+        else:
+            attributestr = ", ".join(
+                f"new.{attr.name}" for attr in self.source.attributes
+            )
+            guard = ""
+            staged = f"VALUES({attributestr})"
+            returned = "NEW"
+
+        # Rows a propagation writes start no propagation of their own. The
+        # markers are left to the propagation, which clears them once all
+        # its rows are written
         sql = f"""CREATE OR REPLACE FUNCTION {function_name}()
    RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
    BEGIN
-   RAISE NOTICE 'Triggered function {function_name} called';
-   IF EXISTS (SELECT * FROM {self.source.schema}._loop) THEN
-      DELETE FROM {self.source.schema}._loop;
-      DELETE FROM {self.source.schema}.{self.table};
-      RETURN NULL;
+   RAISE NOTICE 'Triggered function {function_name} called';{guard}
+   IF {loop.is_active(schema)} THEN
+      RETURN {returned};
    ELSE
-      INSERT INTO {self.source.schema}._loop VALUES (-1);
-      INSERT INTO {self.source.schema}.{self.table} VALUES({attributestr});
-      RETURN NEW;
+      {loop.push(schema, -1)}
+      INSERT INTO {schema}.{self.table} {staged};
+      RETURN {returned};
    END IF;
 END;  $$;
 """
 
         return sql
 
-    def generate_trigger(self) -> str:
-        sql = f"""CREATE TRIGGER {self.source.schema}_{self.table}_trigger
+    def trigger_name(self) -> str:
+        return f"{self.source.schema}_{self.table}_trigger"
+
+    def generate_trigger(self, level: TriggerLevel = TriggerLevel.ROW) -> str:
+        sql = f"""CREATE TRIGGER {self.trigger_name()}
 AFTER INSERT ON {self.source.schema}.{self.source.name}
-FOR EACH ROW
+{level.for_each("NEW")}
 EXECUTE FUNCTION {self.source.schema}.{self.table}_fn();
         """
         return sql
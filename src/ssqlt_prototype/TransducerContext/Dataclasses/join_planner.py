@@ -0,0 +1,256 @@
+import re
+from dataclasses import dataclass, field, replace
+from string import Template
+
+from .catalog import Catalog
+from .table import Table
+
+# A mapping that is a chain of natural left outer joins from its primary table
+_CHAIN = re.compile(
+    r"\s*\$\{select_preamble\}\s+\$\{attributes\}\s+FROM\s+([\w.]+)\$\{primary_suffix\}"
+    r"((?:\s+NATURAL\s+LEFT\s+(?:OUTER\s+)?JOIN\s+[\w.]+\$\{secondary_suffix\})*)\s*",
+    re.IGNORECASE,
+)
+_LEG = re.compile(r"NATURAL\s+LEFT\s+(?:OUTER\s+)?JOIN\s+([\w.]+)\$\{secondary_suffix\}", re.IGNORECASE)
+
+
+@dataclass
+class JoinPlan:
+    """
+    The joins of a planned mapping. `groups` lists the joined tables in
+    join order, each group being a table left joined to the tables before
+    it, followed by the tables inner joined to it through their foreign
+    keys. The first group starts with the primary table. `using` holds the
+    join columns of every table but the primary one, and `pruned` the
+    tables of the mapping left out. `legs` are the tables as written in
+    the mapping, by table name.
+    """
+
+    primary: str
+    legs: dict[str, str]
+    groups: list[list[str]]
+    using: dict[str, list[str]]
+    pruned: list[str]
+
+
+@dataclass
+class JoinPlanner:
+    """
+    Plans the joins of mappings written as a chain of NATURAL LEFT OUTER
+    JOINs from their primary table, following the foreign keys between the
+    tables instead of the written order:
+
+    - Tables are joined depth first through the foreign keys, starting
+      from the primary table. Ties keep the order of the mapping file.
+    - A table referenced through NOT NULL foreign key columns of the same
+      name is inner joined, nested with the referencing table, as the key
+      guarantees its match. Keys only hold between base tables, so this
+      needs unsuffixed secondary tables, and an unsuffixed primary table
+      for the tables it references.
+    - Tables whose own attributes are not projected and which match at
+      most one row, through their primary key or a foreign key, are left
+      out. With SELECT DISTINCT, any such table is left out.
+
+    Like the NATURAL JOINs it replaces, the plan joins on every column a
+    table shares with the tables joined before it. Plans where a table
+    would join on other columns than in the written chain, as it shares a
+    column with a table moved after it, are dropped, as are mappings of
+    another shape.
+    """
+
+    tables: dict[str, Table]
+    catalog: Catalog
+    # Planned tables by table name, projected attributes, base primary, base secondaries and DISTINCT
+    planned_tables: dict[tuple, Table | None] = field(default_factory=dict, repr=False)
+
+    def planned_table(
+        self,
+        tablename: str,
+        attributes: list[str],
+        base_primary: bool,
+        base_secondary: bool,
+        distinct: bool,
+    ) -> Table | None:
+        """
+        Returns a copy of a table with its mapping planned for projecting
+        `attributes`, or None if its mapping cannot be planned.
+        """
+        key = (tablename, tuple(attributes), base_primary, base_secondary, distinct)
+        if key not in self.planned_tables:
+            plan = self.plan(tablename, attributes, base_primary, base_secondary, distinct)
+            self.planned_tables[key] = (
+                None if plan is None else replace(self.tables[tablename], mapping=self._template(plan))
+            )
+        return self.planned_tables[key]
+
+    def plan(
+        self,
+        tablename: str,
+        attributes: list[str],
+        base_primary: bool,
+        base_secondary: bool,
+        distinct: bool,
+    ) -> JoinPlan | None:
+        match = _CHAIN.fullmatch(self.tables[tablename].mapping.template)
+        if match is None or match.group(1).split(".")[-1].lower() != tablename:
+            return None
+        legs = {tablename: match.group(1)}
+        for leg in _LEG.findall(match.group(2)):
+            name = leg.split(".")[-1].lower()
+            if name not in self.tables or name in legs:
+                return None
+            legs[name] = leg
+
+        order = self._order(tablename, legs)
+
+        # Inner join the tables referenced through NOT NULL keys
+        parents: dict[str, str] = {}
+        if base_secondary:
+            for i, name in enumerate(order):
+                candidates = order[:i] if base_primary else order[1:i]
+                for parent in candidates:
+                    if self._key(parent, name) is not None:
+                        parents[name] = parent
+                        break
+
+        while True:
+            groups = self._groups(order, parents)
+            using = self._using(groups)
+            if using is None:
+                return None
+            # A nested table may only join on its key, else the inner join
+            # would drop rows the left join keeps
+            invalid = [name for name in parents if set(using[name]) != set(self._key(parents[name], name) or [])]
+            if not invalid:
+                break
+            del parents[invalid[0]]
+
+        # Leave out the tables that neither add projected attributes nor rows
+        needed = set(attributes)
+        heads = {group[0] for group in groups if len(group) > 1}
+        pruned = []
+        flat = [name for group in groups for name in group]
+        for name in reversed(flat[1:]):
+            own = {attr.name for attr in self.tables[name].attributes} - set(using[name])
+            pkey = [col for pk in self.tables[name].pkey for col in pk.columns]
+            # Inner joined tables match exactly one row, left joined ones at
+            # most one if joined on their primary key
+            unique = name in parents or distinct or (base_secondary and pkey and set(pkey) <= set(using[name]))
+            if own & needed or name in parents.values() or name in heads or not unique:
+                needed |= set(using[name])
+                continue
+            pruned.append(name)
+
+        if pruned:
+            order = [name for name in order if name not in pruned]
+            groups = self._groups(order, parents)
+            using = self._using(groups)
+            if using is None:
+                return None
+
+        # A NATURAL JOIN matches the columns of the tables written before it,
+        # so a new order must keep the join columns of every table
+        written = self._written_using(legs)
+        if any(set(columns) != set(written[name]) for name, columns in using.items()):
+            return None
+
+        return JoinPlan(primary=tablename, legs=legs, groups=groups, using=using, pruned=pruned[::-1])
+
+    def _order(self, tablename: str, legs: dict[str, str]) -> list[str]:
+        """Returns the mapping tables depth first through the foreign keys."""
+        position = {name: i for i, name in enumerate(legs)}
+        order: list[str] = []
+
+        def visit(name: str) -> None:
+            order.append(name)
+            neighbours = [n for n in self.catalog.neighbours[name] if n in position and n not in order]
+            for neighbour in sorted(neighbours, key=position.__getitem__):
+                if neighbour not in order:
+                    visit(neighbour)
+
+        visit(tablename)
+        # Tables not connected through foreign keys, as written
+        order += [name for name in legs if name not in order]
+        return order
+
+    def _written_using(self, legs: dict[str, str]) -> dict[str, list[str]]:
+        """Returns the columns each table shares with the tables written before it."""
+        joined: set[str] = set()
+        result = {}
+        for i, name in enumerate(legs):
+            columns = [attr.name for attr in self.tables[name].attributes]
+            if i > 0:
+                result[name] = [col for col in columns if col in joined]
+            joined |= set(columns)
+        return result
+
+    def _key(self, parent: str, child: str) -> list[str] | None:
+        """Returns the NOT NULL foreign key columns of `parent` to `child` of the same name."""
+        nullable = {attr.name: attr.nullable for attr in self.tables[parent].attributes}
+        for fk in self.tables[parent].fkey:
+            if (
+                fk.ref_tablename == child
+                and fk.columns == fk.ref_columns
+                and not any(nullable.get(col, True) for col in fk.columns)
+            ):
+                return fk.columns
+        return None
+
+    @staticmethod
+    def _groups(order: list[str], parents: dict[str, str]) -> list[list[str]]:
+        heads: dict[str, str] = {}
+        groups: dict[str, list[str]] = {}
+        for name in order:
+            head = heads[parents[name]] if name in parents else name
+            heads[name] = head
+            if name == order[0] or name not in parents:
+                groups[head] = [name]
+            else:
+                groups[head].append(name)
+        return list(groups.values())
+
+    def _using(self, groups: list[list[str]]) -> dict[str, list[str]] | None:
+        """Returns the columns each table shares with the tables joined before it."""
+        joined: set[str] = set()
+        result = {}
+        for i, group in enumerate(groups):
+            for j, name in enumerate(group):
+                if i == 0 and j == 0:
+                    joined |= {attr.name for attr in self.tables[name].attributes}
+                    continue
+                result[name] = [attr.name for attr in self.tables[name].attributes if attr.name in joined]
+                if not result[name]:
+                    return None
+                joined |= {attr.name for attr in self.tables[name].attributes}
+        return result
+
+    def _template(self, plan: JoinPlan) -> Template:
+        def leg(name: str) -> str:
+            return f"{plan.legs[name]}${{secondary_suffix}}"
+
+        sql = f"${{select_preamble}} ${{attributes}}\nFROM {plan.legs[plan.primary]}${{primary_suffix}}"
+        for i, group in enumerate(plan.groups):
+            if i == 0:
+                for name in group[1:]:
+                    sql += f"\n   JOIN {leg(name)} USING ({', '.join(plan.using[name])})"
+                continue
+            joined = leg(group[0])
+            for name in group[1:]:
+                joined += f" JOIN {leg(name)} USING ({', '.join(plan.using[name])})"
+            if len(group) > 1:
+                joined = f"({joined})"
+            columns = self._group_using(plan, i)
+            sql += f"\n   LEFT JOIN {joined} USING ({', '.join(columns)})"
+        return Template(sql)
+
+    def _group_using(self, plan: JoinPlan, index: int) -> list[str]:
+        """Returns the columns a group shares with the groups before it."""
+        joined = {
+            attr.name for group in plan.groups[:index] for name in group for attr in self.tables[name].attributes
+        }
+        columns: dict[str, None] = {}
+        for name in plan.groups[index]:
+            for attr in self.tables[name].attributes:
+                if attr.name in joined:
+                    columns[attr.name] = None
+        return list(columns)
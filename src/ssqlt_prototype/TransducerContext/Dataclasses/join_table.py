@@ -3,6 +3,8 @@ from typing import Literal
 
 from .db_context import DbContext
 from .constraint import Constraint
+from .enums import TriggerLevel
+from .loop_prevention import LoopPrevention
 from .table import Table
 
 
@@ -17,6 +19,10 @@ class JoinTable:
         self.insert_tablename = create_table.name + "_INSERT_JOIN"
         self.delete_tablename = create_table.name + "_DELETE_JOIN"
 
+    @staticmethod
+    def staging_tablename(tablename: str) -> str:
+        return tablename + "_TEMP"
+
     def _create_sql(self, tablename: str) -> str:
         sql = f"CREATE TABLE {self.create_table.schema}.{tablename} AS\n"
         sql += f"SELECT * FROM {self.create_table.schema}.{self.create_table.name}\n"
@@ -29,20 +35,84 @@ class JoinTable:
     def create_delete_sql(self) -> str:
         return self._create_sql(self.delete_tablename)
 
-    def generate_insert_function(self) -> str:
+    def create_insert_index_sql(self) -> str:
+        # Join tables receive projections that may repeat, so keys are
+        # indexed without uniqueness.
+        return self.create_table.create_index_sql(
+            self.context.index_columns(self.create_table.name),
+            tablename=self.insert_tablename,
+        )
+
+    def create_delete_index_sql(self) -> str:
+        return self.create_table.create_index_sql(
+            self.context.index_columns(self.create_table.name),
+            tablename=self.delete_tablename,
+        )
+
+    def generate_insert_function(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+    ) -> str:
         return self._generate_function(
-            self.insert_tablename, insert_delete=Constraint.InsertDelete.INSERT
+            self.insert_tablename,
+            insert_delete=Constraint.InsertDelete.INSERT,
+            level=level,
+            loop=loop,
+            semi_join=semi_join,
+            plan_joins=plan_joins,
         )
 
-    def generate_delete_function(self) -> str:
+    def generate_delete_function(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+    ) -> str:
         return self._generate_function(
-            self.delete_tablename, insert_delete=Constraint.InsertDelete.DELETE
+            self.delete_tablename,
+            insert_delete=Constraint.InsertDelete.DELETE,
+            level=level,
+            loop=loop,
+            semi_join=semi_join,
+            plan_joins=plan_joins,
+        )
+
+    def join_sql(
+        self,
+        insert_delete: Constraint.InsertDelete,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+    ) -> str:
+        """
+        Returns the query of the full join tuples of the rows staged in the
+        _INSERT or _DELETE table, which the function stages.
+        """
+        suffix = "_INSERT" if insert_delete == Constraint.InsertDelete.INSERT else "_DELETE"
+        return self.context.mapping_sql(
+            self.create_table.name,
+            select_preamble="SELECT",
+            custom_attributes=self.context.all_attributes(),
+            primary_suffix=suffix,
+            semi_join=semi_join,
+            plan_joins=plan_joins,
         )
 
     def _generate_function(
-        self, tablename: str, insert_delete: Constraint.InsertDelete
+        self,
+        tablename: str,
+        insert_delete: Constraint.InsertDelete,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+        semi_join: bool = False,
+        plan_joins: bool = False,
     ) -> str:
         ordering = self.context.ordering
+        staging = DbContext.staging_table(self.staging_tablename(tablename))
+        attributes = self.context.all_attributes()
 
         if insert_delete == Constraint.InsertDelete.INSERT:
             suffix = "_INSERT"
@@ -56,48 +126,54 @@ RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
 BEGIN
 """
 
-        # Create temporary table
-        sql += self.context.create_temp_table("temp_table")
+        # Fill staging table
 
-        to_sql = self.create_table.mapping_sql(
-            select_preamble="SELECT",
-            primary_suffix=suffix
-        )
-        sql += f"\nINSERT INTO temp_table ({to_sql});\n"
+        sql += self.context.create_staging_table(self.staging_tablename(tablename)) + "\n"
 
-        # Inserts
+        to_sql = self.join_sql(insert_delete, semi_join=semi_join, plan_joins=plan_joins)
+        columns = ", ".join(attr.name for attr in attributes)
+        sql += f"\nINSERT INTO {staging} ({columns}) ({to_sql});\n"
+
+        # Inserts. Every _JOIN table fires the complex function, which must
+        # only see the markers ready once the last partner is staged
 
         for i, tablename in enumerate(ordering):
             table = self.context.tables[tablename]
-            partner_sql = table.from_full_join(tablename="temp_table")
+            partner_sql = table.from_full_join(tablename=staging)
+            if i == 0 and len(ordering) > 1:
+                sql += "\n" + loop.push(self.create_table.schema, 1)
+            elif i == len(ordering) - 1 and len(ordering) > 1:
+                sql += "\n" + loop.pop(self.create_table.schema, 1)
             sql += f"\nINSERT INTO {self.create_table.schema}.{table.name}{suffix}_JOIN ({partner_sql});"
 
-            if i == len(ordering) - 2:
-                sql += f"\nINSERT INTO {self.create_table.schema}._LOOP VALUES (1);"
-
         # Conclude
 
-        sql += """\n
-DELETE FROM temp_table;
-DROP TABLE temp_table;
+        returned = "NULL" if level == TriggerLevel.STATEMENT else "NEW"
+        sql += f"""\n
+DELETE FROM {staging};
 
-RETURN NEW;
+RETURN {returned};
 END;  $$;
         """
         return sql
 
     def generate_trigger(
-        self, tablename: str, _type: Literal["INSERT"] | Literal["DELETE"]
+        self,
+        tablename: str,
+        _type: Literal["INSERT"] | Literal["DELETE"],
+        level: TriggerLevel = TriggerLevel.ROW,
     ) -> str:
+        # The function reads the whole staging table, so statement triggers
+        # need no transition table.
         sql = f"""CREATE TRIGGER {tablename}_trigger
 AFTER INSERT ON {self.create_table.schema}.{self.create_table.name}_{_type}
-FOR EACH ROW
+{level.for_each()}
 EXECUTE FUNCTION {self.create_table.schema}.{tablename}_fn();
         """
         return sql
 
-    def generate_insert_trigger(self) -> str:
-        return self.generate_trigger(self.insert_tablename, "INSERT")
+    def generate_insert_trigger(self, level: TriggerLevel = TriggerLevel.ROW) -> str:
+        return self.generate_trigger(self.insert_tablename, "INSERT", level=level)
 
-    def generate_delete_trigger(self) -> str:
-        return self.generate_trigger(self.delete_tablename, "DELETE")
+    def generate_delete_trigger(self, level: TriggerLevel = TriggerLevel.ROW) -> str:
+        return self.generate_trigger(self.delete_tablename, "DELETE", level=level)
@@ -0,0 +1,95 @@
+from enum import Enum
+
+
+class LoopPrevention(Enum):
+    """
+    Enum for where the loop prevention state of the transducer is kept.
+
+    The state is a multiset of integers: each propagation step pushes a
+    marker, and the complex functions only fire once the absolute value of
+    a marker equals the number of markers.
+
+    TABLE keeps the markers in the `_LOOP` heap table.
+    GUC keeps them in a transaction-local configuration parameter
+    (`set_config(..., true)`), so the protocol does no table I/O.
+    """
+
+    TABLE = "table"
+    GUC = "guc"
+
+    @staticmethod
+    def setting(schema: str) -> str:
+        """Name of the configuration parameter holding the GUC state."""
+        return f"{schema}.loop"
+
+    def create_sql(self, schema: str) -> str:
+        """SQL declaring the loop prevention state."""
+        if self == LoopPrevention.TABLE:
+            return f"CREATE TABLE {schema}._LOOP (loop_start INT NOT NULL );"
+
+        setting = self.setting(schema)
+        return f"""CREATE OR REPLACE FUNCTION {schema}._loop_values()
+RETURNS INT[] LANGUAGE SQL AS $$
+   SELECT COALESCE(NULLIF(current_setting('{setting}', true), ''), '{{}}')::INT[];
+$$;
+
+CREATE OR REPLACE FUNCTION {schema}._loop_push(loop_start INT)
+RETURNS VOID LANGUAGE SQL AS $$
+   SELECT set_config('{setting}', array_append({schema}._loop_values(), loop_start)::TEXT, true);
+$$;
+
+CREATE OR REPLACE FUNCTION {schema}._loop_pop(loop_start INT)
+RETURNS VOID LANGUAGE SQL AS $$
+   SELECT set_config('{setting}', (loop_values[:i - 1] || loop_values[i + 1:])::TEXT, true)
+   FROM (SELECT loop_values, COALESCE(array_position(loop_values, loop_start), 0) AS i
+   FROM {schema}._loop_values() AS loop_values) AS state;
+$$;
+
+CREATE OR REPLACE FUNCTION {schema}._loop_clear()
+RETURNS VOID LANGUAGE SQL AS $$
+   SELECT set_config('{setting}', '', true);
+$$;
+
+CREATE OR REPLACE FUNCTION {schema}._loop_ready()
+RETURNS BOOLEAN LANGUAGE SQL AS $$
+   SELECT EXISTS (SELECT * FROM unnest(loop_values) AS loop_start
+   WHERE ABS(loop_start) = cardinality(loop_values))
+   FROM {schema}._loop_values() AS loop_values;
+$$;"""
+
+    def push(self, schema: str, value: int) -> str:
+        """Statement adding a marker."""
+        if self == LoopPrevention.TABLE:
+            return f"INSERT INTO {schema}._loop VALUES ({value});"
+        return f"PERFORM {schema}._loop_push({value});"
+
+    def pop(self, schema: str, value: int) -> str:
+        """Statement removing one marker `value`, leaving the other markers."""
+        if self == LoopPrevention.TABLE:
+            return f"DELETE FROM {schema}._loop WHERE ctid = (SELECT ctid FROM {schema}._loop WHERE loop_start = {value} LIMIT 1);"
+        return f"PERFORM {schema}._loop_pop({value});"
+
+    def clear(self, schema: str) -> str:
+        """Statement removing every marker."""
+        if self == LoopPrevention.TABLE:
+            return f"DELETE FROM {schema}._loop;"
+        return f"PERFORM {schema}._loop_clear();"
+
+    def count(self, schema: str) -> str:
+        """Expression evaluating to the number of markers."""
+        if self == LoopPrevention.TABLE:
+            return f"(SELECT count(*) FROM {schema}._loop)"
+        return f"cardinality({schema}._loop_values())"
+
+    def is_active(self, schema: str) -> str:
+        """Condition holding while any marker is present."""
+        if self == LoopPrevention.TABLE:
+            return f"EXISTS (SELECT * FROM {schema}._loop)"
+        return f"cardinality({schema}._loop_values()) > 0"
+
+    def is_ready(self, schema: str) -> str:
+        """Condition holding once a marker's absolute value equals the marker count."""
+        if self == LoopPrevention.TABLE:
+            return f"""EXISTS (SELECT * FROM {schema}._loop, (SELECT COUNT(*) as rc_value FROM {schema}._loop) AS row_count
+WHERE ABS(loop_start) = row_count.rc_value)"""
+        return f"{schema}._loop_ready()"
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Literal, LiteralString
 from mo_sql_parsing import parse
 from string import Template
@@ -74,6 +74,59 @@ class FK:
         )
 
 
+class MappingRenderer:
+    """
+    A mapping template compiled once into its literal parts and the names
+    substituted between them, rendering like `Template.substitute`.
+
+    Rendered mappings are memoized by their substitutions. The memo keeps
+    at most `maxsize` entries, dropping the oldest first.
+    """
+
+    def __init__(self, template: Template, maxsize: int = 128) -> None:
+        self.template = template
+        self.maxsize = maxsize
+        self.parts: list[str] = []
+        self.names: list[str] = []
+        self.memo: dict[tuple[str, ...], str] = {}
+
+        text = template.template
+        literal = ""
+        position = 0
+        for match in template.pattern.finditer(text):
+            literal += text[position : match.start()]
+            position = match.end()
+            if match.group("escaped") is not None:
+                literal += template.delimiter
+                continue
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                raise ValueError(f"Invalid placeholder in mapping at index {match.start()}")
+            self.parts.append(literal)
+            self.names.append(name)
+            literal = ""
+        self.parts.append(literal + text[position:])
+
+    def __reduce__(self):
+        # The memo is rebuilt rather than pickled
+        return (MappingRenderer, (self.template, self.maxsize))
+
+    def render(self, **values: str) -> str:
+        key = tuple(values[name] for name in self.names)
+        result = self.memo.get(key)
+        if result is None:
+            pieces = [self.parts[0]]
+            for value, part in zip(key, self.parts[1:]):
+                pieces.append(value)
+                pieces.append(part)
+            result = "".join(pieces)
+            if self.memo and len(self.memo) >= self.maxsize:
+                del self.memo[next(iter(self.memo))]
+            if self.maxsize > 0:
+                self.memo[key] = result
+        return result
+
+
 @dataclass
 class Table:
     schema: str
@@ -82,6 +135,12 @@ class Table:
     pkey: list[PK]
     fkey: list[FK]
     mapping: Template
+    renderer: MappingRenderer = field(init=False, repr=False, compare=False)
+    attribute_list: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.renderer = MappingRenderer(self.mapping)
+        self.attribute_list = ", ".join(attr.name for attr in self.attributes)
 
     def create_stmt(self) -> str:
         attrs = ",\n".join(f"\t{attr.name} {attr._type}" for attr in self.attributes)
@@ -104,6 +163,32 @@ class Table:
 
         return sql.strip()
 
+    def create_index_sql(
+        self,
+        index_columns: list[list[str]],
+        tablename: str | None = None,
+        skip_primary_key: bool = False,
+    ) -> str:
+        """
+        Returns CREATE INDEX statements for the given column lists on this
+        table, or on a table sharing its columns if `tablename` is given.
+        """
+        if tablename is None:
+            tablename = self.name
+
+        pkeys = [pk.columns for pk in self.pkey]
+        statements = []
+        for i, columns in enumerate(index_columns):
+            if skip_primary_key and any(pk[: len(columns)] == columns for pk in pkeys):
+                continue
+            name = f"{tablename}_{'_'.join(columns)}_idx"
+            if len(name) > 63:  # PostgreSQL truncates longer identifiers
+                name = f"{tablename}_{i}_idx"
+            statements.append(
+                f"CREATE INDEX {name} ON {self.schema}.{tablename} ({', '.join(columns)});"
+            )
+        return "\n".join(statements)
+
     @classmethod
     def from_create_path(cls, create_path: str, mapping_path: str):
         with open(create_path, "r") as f:
@@ -162,16 +247,15 @@ class Table:
         secondary_suffix: str = "",
     ) -> str:
         """
-        Returns the SQL for the mapping of this table.
+        Returns the SQL for the mapping of this table, memoized by
+        `renderer`.
         """
         if custom_attributes is None:
-            custom_attributes = self.attributes
-
-        attr_str = ", ".join(
-            f"{attr.name}" for attr in custom_attributes
-        )
+            attr_str = self.attribute_list
+        else:
+            attr_str = ", ".join(attr.name for attr in custom_attributes)
 
-        return self.mapping.substitute(
+        return self.renderer.render(
             select_preamble=select_preamble, attributes=attr_str, primary_suffix=primary_suffix, secondary_suffix=secondary_suffix
         )
 
@@ -181,4 +265,4 @@ class Table:
         else:
             from_tablename = ""
         from_tablename += tablename
-        return f"SELECT {', '.join(attr.name for attr in self.attributes)} FROM {from_tablename}"
+        return f"SELECT {self.attribute_list} FROM {from_tablename}"
@@ -0,0 +1,355 @@
+from dataclasses import dataclass
+from typing import Self
+
+from .db_context import DbContext
+from .enums import TriggerLevel
+from .loop_prevention import LoopPrevention
+from .table import Table
+
+
+def _row(alias: str, columns: list[str]) -> str:
+    return "(" + ", ".join(f"{alias}.{col}" for col in columns) + ")"
+
+
+def _key(table: Table) -> list[str]:
+    return [col for pk in table.pkey for col in pk.columns]
+
+
+@dataclass
+class UpdateTable:
+    """
+    Propagation of updates on `source` to one `counterpart` table, in place.
+
+    Counterpart rows are identified by the counterpart's primary key if the
+    source holds all of it, or else by the source's primary key if the
+    counterpart holds all of that. `columns` are the attributes both tables
+    share outside of either key which no table of either side keys,
+    references or determines other attributes by (see `from_tables`): only
+    changes to them fire the trigger, and only they are set. Changes to the
+    other shared attributes are propagated by `UpdateJoinTable`, and key
+    changes are not propagated.
+
+    With `siblings`, several source rows share the counterpart's key, e.g.
+    the rows of one person in _empdep. They all get the new values, so they
+    keep agreeing with the one counterpart row.
+    """
+
+    source: Table
+    counterpart: Table
+    key: list[str]
+    columns: list[str]
+    siblings: bool
+
+    @classmethod
+    def from_tables(cls, source: Table, counterpart: Table, keyed: list[str]) -> Self | None:
+        """
+        Returns the propagation between both tables, or None if there is
+        nothing to propagate in place. `keyed` are the attributes in a key
+        or foreign key, or on the lhs of a dependency, of either side:
+        changing them changes which rows join, so they are never set in
+        place.
+        """
+        source_names = [attr.name for attr in source.attributes]
+        counterpart_names = [attr.name for attr in counterpart.attributes]
+        source_key = _key(source)
+        counterpart_key = _key(counterpart)
+
+        # Statement triggers pair old and new rows by the source key
+        if not source_key:
+            return None
+
+        if counterpart_key and all(col in source_names for col in counterpart_key):
+            key = counterpart_key
+        elif all(col in counterpart_names for col in source_key):
+            key = source_key
+        else:
+            return None
+
+        columns = [
+            name
+            for name in counterpart_names
+            if name in source_names and name not in source_key + counterpart_key and name not in keyed
+        ]
+        if not columns:
+            return None
+
+        siblings = key == counterpart_key and not set(source_key) <= set(key)
+        return cls(source=source, counterpart=counterpart, key=key, columns=columns, siblings=siblings)
+
+    @property
+    def name(self) -> str:
+        return f"{self.source.name}_{self.counterpart.name}_UPDATE"
+
+    def generate_function(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+    ) -> str:
+        schema = self.source.schema
+        counterpart = f"{schema}.{self.counterpart.name}"
+        source = f"{schema}.{self.source.name}"
+
+        if level == TriggerLevel.STATEMENT:
+            old_rows = TriggerLevel.transition_table("OLD")
+            new_rows = TriggerLevel.transition_table("NEW")
+            source_key = _key(self.source)
+            assignments = ", ".join(f"{col} = new_row.{col}" for col in self.columns)
+
+            def update(table: str, alias: str) -> str:
+                return f"""UPDATE {table} AS {alias} SET {assignments}
+   FROM {new_rows} AS new_row
+   JOIN {old_rows} AS old_row ON {" AND ".join(f"old_row.{col} = new_row.{col}" for col in source_key)}
+   WHERE {" AND ".join(f"{alias}.{col} = new_row.{col}" for col in self.key)}
+   AND {_row("old_row", self.key)} IS NOT DISTINCT FROM {_row("new_row", self.key)}
+   AND {_row("old_row", self.columns)} IS DISTINCT FROM {_row("new_row", self.columns)}
+   AND {_row(alias, self.columns)} IS DISTINCT FROM {_row("new_row", self.columns)};"""
+        else:
+            # The trigger's WHEN clause already filters unchanged rows
+            assignments = ", ".join(f"{col} = NEW.{col}" for col in self.columns)
+
+            def update(table: str, alias: str) -> str:
+                return f"""UPDATE {table} SET {assignments}
+   WHERE {" AND ".join(f"{col} = NEW.{col}" for col in self.key)}
+   AND ({", ".join(self.columns)}) IS DISTINCT FROM {_row("NEW", self.columns)};"""
+
+        updates = update(counterpart, "counterpart")
+        if self.siblings:
+            updates += "\n   " + update(source, "sibling")
+
+        sql = f"""CREATE OR REPLACE FUNCTION {schema}.{self.name}_fn()
+   RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+   BEGIN
+   IF {loop.is_active(schema)} THEN
+      RETURN NULL;
+   END IF;
+   {loop.push(schema, 0)}
+   {updates}
+   {loop.clear(schema)}
+   RETURN NULL;
+END;  $$;
+"""
+        return sql
+
+    def generate_trigger(self, level: TriggerLevel = TriggerLevel.ROW) -> str:
+        return _update_trigger(self.source, self.name, self.key, self.columns, level)
+
+
+@dataclass
+class UpdateJoinTable:
+    """
+    Propagation of updates on `source` to the attributes the tables of
+    either side key, reference or determine others by, e.g. a new dep_name
+    in _empdep. Those change which rows join, so setting them in place
+    would leave the counterpart rows they join with behind.
+
+    Instead, the counterpart rows are derived again from the join tuples
+    of the updated rows, like the bulk load does: changed rows are updated
+    through their key, missing ones inserted, referenced tables first.
+    Counterpart rows only the old values supported are then removed by
+    staging the old rows in the _DELETE table, as a delete would. Before
+    that, the new values are copied to the `siblings`: for each
+    counterpart key the source holds, the source rows sharing it, e.g. the
+    other rows of a department, so the source keeps mapping to one row per
+    counterpart key.
+
+    Only changes to `columns` fire the trigger; key changes are not
+    propagated.
+    """
+
+    source: Table
+    context: DbContext
+    counterpart: DbContext
+    columns: list[str]
+    # Counterpart keys the source holds, with the other counterpart columns it holds
+    siblings: list[tuple[list[str], list[str]]]
+
+    @classmethod
+    def from_tables(cls, source: Table, context: DbContext, counterpart: DbContext, keyed: list[str]) -> Self | None:
+        """
+        Returns the propagation of `source`, a table of `context`, or None if
+        none of its attributes shared with the `counterpart` side are in
+        `keyed` (see `UpdateTable.from_tables`).
+        """
+        source_key = _key(source)
+        if not source_key:
+            return None
+
+        columns = [
+            attr.name
+            for attr in source.attributes
+            if attr.name not in source_key and attr.name in keyed and attr.name in counterpart.catalog.owners
+        ]
+        if not columns:
+            return None
+
+        source_names = [attr.name for attr in source.attributes]
+        siblings = []
+        for tablename in counterpart.ordering:
+            table = counterpart.tables[tablename]
+            key = _key(table)
+            if not key or set(source_key) <= set(key) or not all(col in source_names for col in key):
+                continue
+            shared = [attr.name for attr in table.attributes if attr.name in source_names and attr.name not in key]
+            if shared:
+                siblings.append((key, shared))
+
+        return cls(source=source, context=context, counterpart=counterpart, columns=columns, siblings=siblings)
+
+    @property
+    def name(self) -> str:
+        return f"{self.source.name}_UPDATE_JOIN"
+
+    def derived_tables(self) -> list[Table]:
+        """Counterpart tables holding attributes of the source the update may change, referenced first."""
+        source_key = _key(self.source)
+        changing = {attr.name for attr in self.source.attributes if attr.name not in source_key}
+        return [
+            self.counterpart.tables[tablename]
+            for tablename in self.counterpart.ordering
+            if any(attr.name in changing for attr in self.counterpart.tables[tablename].attributes)
+        ]
+
+    def derive_sql(self, table: Table, updated: str | None, plan_joins: bool = False) -> str:
+        """
+        Returns the rows of the counterpart `table` the source rows sharing
+        a key or sibling key with the rows of `updated` map to. `updated`
+        is a query of the updated rows, or None for the NEW row.
+        """
+        keys = [_key(self.source)] + [key for key, _ in self.siblings]
+        # Rows sharing a key share any key it is part of
+        keys = [key for key in keys if not any(set(other) < set(key) for other in keys)]
+        names = [attr.name for attr in table.attributes]
+        filter_names = {col for key in keys for col in key}
+        custom_attributes = table.attributes + [
+            attr for attr in self.source.attributes if attr.name in filter_names and attr.name not in names
+        ]
+        mapping = self.context.mapping_sql(
+            self.source.name,
+            select_preamble="SELECT",
+            custom_attributes=custom_attributes,
+            plan_joins=plan_joins,
+        )
+        if updated is None:
+            filters = [f"({', '.join(key)}) = {_row('NEW', key)}" for key in keys]
+        else:
+            filters = [f"({', '.join(key)}) IN (SELECT {', '.join(key)} FROM ({updated}) AS updated)" for key in keys]
+        not_null = " AND ".join(f"{name} IS NOT NULL" for name in names)
+        return (
+            f"SELECT DISTINCT {', '.join(names)} FROM ({mapping}) AS tuple\n"
+            f"   WHERE ({' OR '.join(filters)}) AND {not_null}"
+        )
+
+    @staticmethod
+    def sibling_condition(key: list[str], columns: list[str]) -> str:
+        """
+        Returns the condition on the `sibling` source rows sharing `key` with
+        an `updated` row whose `columns` they still disagree on.
+        """
+        return (
+            f"{' AND '.join(f'sibling.{col} = updated.{col}' for col in key)}\n"
+            f"   AND {_row('sibling', columns)} IS DISTINCT FROM {_row('updated', columns)}"
+        )
+
+    def generate_function(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+        plan_joins: bool = False,
+    ) -> str:
+        schema = self.source.schema
+        source = f"{schema}.{self.source.name}"
+        source_key = _key(self.source)
+        names = [attr.name for attr in self.source.attributes]
+
+        if level == TriggerLevel.STATEMENT:
+            old_rows = TriggerLevel.transition_table("OLD")
+            new_rows = TriggerLevel.transition_table("NEW")
+            pairs = f"""{new_rows} AS new_row
+   JOIN {old_rows} AS old_row ON {" AND ".join(f"old_row.{col} = new_row.{col}" for col in source_key)}
+   WHERE {_row("old_row", self.columns)} IS DISTINCT FROM {_row("new_row", self.columns)}"""
+            updated = f"SELECT new_row.* FROM {pairs}"
+            # Transition tables rule out WHEN clauses, and statement triggers
+            # also fire for statements changing no rows
+            guard = f"""
+   IF NOT EXISTS ({updated}) THEN
+      RETURN NULL;
+   END IF;"""
+            siblings = [
+                f"""UPDATE {source} AS sibling SET {", ".join(f"{col} = updated.{col}" for col in columns)}
+   FROM ({updated}) AS updated
+   WHERE {self.sibling_condition(key, columns)};"""
+                for key, columns in self.siblings
+            ]
+            staged = f"SELECT {', '.join(f'old_row.{name}' for name in names)} FROM {pairs}"
+        else:
+            updated = None
+            guard = ""
+            siblings = [
+                f"""UPDATE {source} SET {", ".join(f"{col} = NEW.{col}" for col in columns)}
+   WHERE ({", ".join(key)}) = {_row("NEW", key)}
+   AND ({", ".join(columns)}) IS DISTINCT FROM {_row("NEW", columns)};"""
+                for key, columns in self.siblings
+            ]
+            staged = f"VALUES {_row('OLD', names)}"
+
+        derived = []
+        for table in self.derived_tables():
+            counterpart = f"{schema}.{table.name}"
+            key = _key(table) or [attr.name for attr in table.attributes]
+            other = [attr.name for attr in table.attributes if attr.name not in key]
+            derive = self.derive_sql(table, updated, plan_joins=plan_joins)
+            match = " AND ".join(f"counterpart.{col} = derived.{col}" for col in key)
+            if other:
+                derived.append(f"""UPDATE {counterpart} AS counterpart SET {", ".join(f"{col} = derived.{col}" for col in other)}
+   FROM ({derive}) AS derived
+   WHERE {match}
+   AND {_row("counterpart", other)} IS DISTINCT FROM {_row("derived", other)};""")
+            columns = ", ".join(attr.name for attr in table.attributes)
+            derived.append(f"""INSERT INTO {counterpart} ({columns})
+   SELECT {columns} FROM ({derive}) AS derived
+   WHERE NOT EXISTS (SELECT * FROM {counterpart} AS counterpart WHERE {match});""")
+
+        body = "\n   ".join(siblings + derived)
+        sql = f"""CREATE OR REPLACE FUNCTION {schema}.{self.name}_fn()
+   RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+   BEGIN{guard}
+   IF {loop.is_active(schema)} THEN
+      RETURN NULL;
+   END IF;
+   {loop.push(schema, 0)}
+   {body}
+   -- The delete propagation removes what only the old values supported
+   INSERT INTO {schema}.{self.source.name}_DELETE ({", ".join(names)}) {staged};
+   {loop.clear(schema)}
+   RETURN NULL;
+END;  $$;
+"""
+        return sql
+
+    def generate_trigger(self, level: TriggerLevel = TriggerLevel.ROW) -> str:
+        return _update_trigger(self.source, self.name, _key(self.source), self.columns, level)
+
+
+def _update_trigger(source: Table, name: str, key: list[str], columns: list[str], level: TriggerLevel) -> str:
+    schema = source.schema
+    if level == TriggerLevel.STATEMENT:
+        # Transition tables rule out column lists and WHEN clauses, the
+        # function filters instead
+        event = f"AFTER UPDATE ON {schema}.{source.name}\n{level.for_each('OLD NEW')}"
+    else:
+        old_key = ", ".join(f"OLD.{col}" for col in key)
+        new_key = ", ".join(f"NEW.{col}" for col in key)
+        old_columns = ", ".join(f"OLD.{col}" for col in columns)
+        new_columns = ", ".join(f"NEW.{col}" for col in columns)
+        event = (
+            f"AFTER UPDATE OF {', '.join(columns)} ON {schema}.{source.name}\n"
+            f"{level.for_each()}\n"
+            f"WHEN (({old_key}) IS NOT DISTINCT FROM ({new_key}) "
+            f"AND ({old_columns}) IS DISTINCT FROM ({new_columns}))"
+        )
+
+    sql = f"""CREATE TRIGGER {schema}_{name}_trigger
+{event}
+EXECUTE FUNCTION {schema}.{name}_fn();
+        """
+    return sql
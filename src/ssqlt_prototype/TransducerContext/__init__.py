@@ -1,9 +1,17 @@
 from .Dataclasses import (
     Constraint as Constraint,
+    ConstraintDispatch as ConstraintDispatch,
     CreateTable as CreateTable,
     DeleteTable as DeleteTable,
+    Dependency as Dependency,
+    FdIndex as FdIndex,
     Mapping as Mapping,
     InsertTable as InsertTable,
     JoinTable as JoinTable,
+    LoopPrevention as LoopPrevention,
+    TriggerLevel as TriggerLevel,
+    UpdateTable as UpdateTable,
+    UpdateJoinTable as UpdateJoinTable,
 )
 from .context import Context as Context
+from .context_cache import ContextCache as ContextCache
@@ -1,9 +1,18 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Self
+from typing import TYPE_CHECKING, Self
 
+from .context_cache import ContextCache
 from .context_dir import ContextDir
 from .context_file_paths import ContextFilePaths
 from .Dataclasses.db_context import DbContext
+from .Dataclasses.insert_table import InsertTable
+from .Dataclasses.enums import SourceTarget, TriggerLevel
+from .Dataclasses.loop_prevention import LoopPrevention
+from .Dataclasses.table import Attr, Table
+
+if TYPE_CHECKING:
+    from ..profiling import Profiler
 
 
 @dataclass
@@ -12,49 +21,167 @@ class Context:
     source: DbContext
     target: DbContext
 
-    def __init__(self, context_files: ContextFilePaths) -> None:
-
-        self.source = DbContext.from_files(
-            create_paths=context_files.source_creates,
-            constraint_paths=context_files.source_constraints,
-            mapping_paths=context_files.source_mappings,
-        )
+    target_insert_staging_tablename = "_TARGET_INSERT_TEMP"
+    source_bulk_staging_tablename = "_SOURCE_BULK_TEMP"
+    target_bulk_staging_tablename = "_TARGET_BULK_TEMP"
+    source_delete_staging_tablename = "_SOURCE_DELETE_TEMP"
+    target_delete_staging_tablename = "_TARGET_DELETE_TEMP"
+
+    def __init__(
+        self,
+        context_files: ContextFilePaths,
+        cache: ContextCache | None = None,
+        workers: int = 1,
+        profiler: "Profiler | None" = None,
+    ) -> None:
+        """
+        With `workers` > 1, input files are parsed in a pool of that many
+        processes and the source and target contexts are built concurrently.
+        `profiler` records the phases of building each side, see
+        `DbContext.from_files`.
+        """
 
-        self.target = DbContext.from_files(
-            create_paths=context_files.target_creates,
-            constraint_paths=context_files.target_constraints,
-            mapping_paths=context_files.target_mappings,
-        )
+        def build(executor: Executor | None, source_target: SourceTarget) -> DbContext:
+            if source_target == SourceTarget.SOURCE:
+                paths = (
+                    context_files.source_creates,
+                    context_files.source_constraints,
+                    context_files.source_mappings,
+                )
+            else:
+                paths = (
+                    context_files.target_creates,
+                    context_files.target_constraints,
+                    context_files.target_mappings,
+                )
+
+            def from_files() -> DbContext:
+                return DbContext.from_files(
+                    create_paths=paths[0],
+                    constraint_paths=paths[1],
+                    mapping_paths=paths[2],
+                    cache=cache,
+                    executor=executor,
+                    profiler=profiler,
+                )
+
+            if profiler is None:
+                return from_files()
+            with profiler.scope(source_target.value):
+                return from_files()
+
+        if workers <= 1:
+            self.source = build(None, SourceTarget.SOURCE)
+            self.target = build(None, SourceTarget.TARGET)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            with ThreadPoolExecutor(max_workers=2) as threads:
+                source = threads.submit(build, executor, SourceTarget.SOURCE)
+                target = threads.submit(build, executor, SourceTarget.TARGET)
+                self.source = source.result()
+                self.target = target.result()
 
     @classmethod
-    def from_dir(cls, file_dir: str) -> Self:
-        context_dirs = ContextDir.from_dir(file_dir)
-        return cls(ContextFilePaths(context_dirs))
-
-    def generate_target_insert_trigger(self, tablename: str) -> str:
+    def from_dir(
+        cls,
+        file_dir: str,
+        cache: ContextCache | None = None,
+        workers: int = 1,
+        profiler: "Profiler | None" = None,
+    ) -> Self:
+        if profiler is None:
+            context_files = ContextFilePaths(ContextDir.from_dir(file_dir))
+        else:
+            with profiler.phase("scan"):
+                context_files = ContextFilePaths(ContextDir.from_dir(file_dir))
+        return cls(context_files, cache=cache, workers=workers, profiler=profiler)
+
+    def generate_target_insert_trigger(
+        self, tablename: str, level: TriggerLevel = TriggerLevel.ROW
+    ) -> str:
         return f"""
 CREATE TRIGGER target_insert_{tablename}_trigger
 AFTER INSERT ON {self.target.schema}.{tablename}
-FOR EACH ROW
+{level.for_each()}
 EXECUTE FUNCTION {self.target.schema}.target_insert_fn();
 """
         
-    def generate_source_insert_trigger(self, tablename: str) -> str:
+    def generate_source_insert_trigger(
+        self, tablename: str, level: TriggerLevel = TriggerLevel.ROW
+    ) -> str:
         return f"""
 CREATE TRIGGER source_insert_{tablename}_trigger
 AFTER INSERT ON {self.source.schema}.{tablename}
-FOR EACH ROW
+{level.for_each()}
 EXECUTE FUNCTION {self.source.schema}.source_insert_fn();
 """
 
-    def generate_target_insert(self):
+    def target_insert_sql(self, semi_join: bool = False, plan_joins: bool = False) -> str:
+        """
+        Returns the query of the complete universal tuples of the target
+        rows staged in the _INSERT_JOIN tables, which target_insert_fn stages.
+        """
+        attributes = self.target.all_attributes()
+        full_mapping = self.target.mapping_sql(
+            self.target.ordering[0],
+            custom_attributes=attributes,
+            primary_suffix="_INSERT_JOIN",
+            secondary_suffix="_INSERT_JOIN",
+            select_preamble="SELECT DISTINCT",
+            semi_join=semi_join,
+            plan_joins=plan_joins,
+        )
+        result = full_mapping
+        result += "\n where "
+        result += "\n AND ".join(
+            map(lambda x: x.name + " IS NOT NULL", attributes)
+        )
+        result += "\n "
+        return result
+
+    def source_insert_sql(self, tablename: str, semi_join: bool = False, plan_joins: bool = False) -> str:
+        """
+        Returns the query of the rows of the target table `tablename` the
+        source rows staged in the _INSERT_JOIN tables map to, which
+        source_insert_fn inserts.
+
+        The staged tables are left joined, so tuples whose partners were not
+        inserted yet, e.g. a _position without employees, come with NULLs.
+        Rows missing a key or NOT NULL column of the target table are left
+        out: the target rows they map to are inserted with the partners.
+        """
+        table = self.target.tables[tablename]
+        mapping = self.source.mapping_sql(
+            self.source.ordering[0],
+            select_preamble="SELECT DISTINCT",
+            custom_attributes=table.attributes,
+            primary_suffix="_INSERT_JOIN",
+            secondary_suffix="_INSERT_JOIN",
+            semi_join=semi_join,
+            plan_joins=plan_joins,
+        )
+        key = {col for pk in table.pkey for col in pk.columns}
+        required = [attr.name for attr in table.attributes if not attr.nullable or attr.name in key]
+        if not required:
+            return mapping
+        return f"SELECT * FROM ({mapping}) AS tuple\n WHERE " + " AND ".join(f"{name} IS NOT NULL" for name in required)
+
+    def generate_target_insert(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+    ):
         result = ""
+        returned = "NULL" if level == TriggerLevel.STATEMENT else "NEW"
 
         source_orderings = self.source.ordering
         target_orderings = self.target.ordering
 
-        schema = "transducer"  # TODO Hardcoded
-        temp_tablename = "temp_table_join"
+        schema = self.target.schema
+        temp_tablename = DbContext.staging_table(self.target_insert_staging_tablename)
 
         # Start
         result += f"""
@@ -64,34 +191,21 @@ DECLARE
 v_loop INT;
 BEGIN
 
-SELECT count(*) INTO v_loop from transducer._loop;
+v_loop := {loop.count(schema)};
 
 
-IF NOT EXISTS (SELECT * FROM transducer._loop, (SELECT COUNT(*) as rc_value FROM transducer._loop) AS row_count
-WHERE ABS(loop_start) = row_count.rc_value) THEN
+IF NOT {loop.is_ready(schema)} THEN
    RAISE NOTICE 'Wait %', v_loop;
    RETURN NULL;
 ELSE
    RAISE NOTICE 'This should conclude with an INSERT on _EMPDEP';
         """
 
-        result += self.source.create_temp_table(temp_tablename)
-
-        full_mapping_tablename = target_orderings[0]
-        table = self.target.tables[full_mapping_tablename]
-        full_mapping = table.mapping_sql(
-            custom_attributes=self.target.all_attributes(),
-            primary_suffix="_INSERT_JOIN",
-            secondary_suffix="_INSERT_JOIN",
-            select_preamble="SELECT DISTINCT",
-        )
-        result += f"\n\nINSERT INTO {temp_tablename}("
-        result += full_mapping
-        result += "\n where "
-        result += "\n AND ".join(
-            map(lambda x: x.name + " IS NOT NULL", self.target.all_attributes())
-        )
-        result += "\n "
+        attributes = self.target.all_attributes()
+        columns = ", ".join(attr.name for attr in attributes)
+        result += f"\n\n{self.source.create_staging_table(self.target_insert_staging_tablename)}"
+        result += f"\n\nINSERT INTO {temp_tablename} ({columns}) ("
+        result += self.target_insert_sql(semi_join=semi_join, plan_joins=plan_joins)
         result += ");"
 
         # Other inserts
@@ -102,7 +216,6 @@ ELSE
         mapping_str = table.from_full_join(tablename=temp_tablename)
         result += f"""
 \nINSERT INTO {schema}.{tablename} ({mapping_str}) ON CONFLICT ({", ".join(table.pkey[0].columns)}) DO NOTHING;
-INSERT INTO {schema}._loop VALUES (-1);
 """
 
         for tablename in source_orderings[1:]:
@@ -125,38 +238,40 @@ INSERT INTO {schema}._loop VALUES (-1);
         result += "\n"
 
         result += f"""
-DELETE FROM {schema}._loop;
+{loop.clear(schema)}
 DELETE FROM {temp_tablename};
-DROP TABLE {temp_tablename};
 
-RETURN NEW;
+RETURN {returned};
 END IF;
 END;    $$;
 """
 
         return result
 
-    def generate_source_insert(self):
+    def generate_source_insert(
+        self,
+        level: TriggerLevel = TriggerLevel.ROW,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+    ):
 
-        schema = "transducer"  # TODO Hardcoded
+        schema = self.source.schema
 
         result = f"""
 CREATE OR REPLACE FUNCTION {schema}.source_insert_fn()
 RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
 BEGIN
 RAISE NOTICE 'Something got added in a JOIN table';
-IF NOT EXISTS (SELECT * FROM transducer._loop, (SELECT COUNT(*) as rc_value FROM transducer._loop) AS row_count
-WHERE ABS(loop_start) = row_count.rc_value) THEN
+IF NOT {loop.is_ready(schema)} THEN
    RAISE NOTICE 'But now is not the time to generate the query';
    RETURN NULL;
 ELSE
    RAISE NOTICE 'This should conclude with an INSERT on _EMPDEP';"""
 
-        full_join_table = list(self.source.tables.values())[0]
-
         def get_insert(target: str):
             table = self.target.tables[target]
-            mapping_str = "(" + full_join_table.mapping_sql(select_preamble="SELECT DISTINCT", custom_attributes=table.attributes, primary_suffix="_INSERT_JOIN", secondary_suffix="_INSERT_JOIN") + ")"
+            mapping_str = "(" + self.source_insert_sql(target, semi_join=semi_join, plan_joins=plan_joins) + ")"
 
             result = f"\n\tINSERT INTO {schema}.{target} "
             result += "" + mapping_str + ""
@@ -173,7 +288,9 @@ ELSE
         for tablename in self.source.ordering[::-1]:
             result += f"\n\tDELETE FROM {schema}.{tablename}_INSERT_JOIN;"
 
-        result += f"\n\tDELETE FROM {schema}._loop NEW;"
+        result += "\n\t" + loop.clear(schema)
+        # Fired after inserts on the _INSERT_JOIN tables, so the result is ignored
+        result += "\n\tRETURN NULL;"
 
         result += """
 END IF;
@@ -182,5 +299,270 @@ END;  $$;
 
         return result
 
-    def generate_target_delete(self):
-        return NotImplementedError("Target delete generation is not implemented yet.")
+    @staticmethod
+    def bulk_tablename(tablename: str) -> str:
+        return tablename + "_BULK"
+
+    def create_bulk_sql(self) -> str:
+        """
+        Returns the tables the bulk load procedures read from: one _BULK
+        table per source and target table, meant to be filled with COPY.
+        """
+        result = []
+        for context in (self.source, self.target):
+            for tablename in context.ordering:
+                table = context.tables[tablename]
+                result.append(
+                    f"CREATE UNLOGGED TABLE {table.schema}.{self.bulk_tablename(tablename)} AS\n"
+                    f"SELECT * FROM {table.schema}.{tablename}\n"
+                    "WHERE 1<>1;"
+                )
+        return "\n\n".join(result)
+
+    def generate_bulk_load_source(self) -> str:
+        return self._generate_bulk_load(
+            "bulk_load_source",
+            loaded=self.source,
+            counterpart=self.target,
+            staging_tablename=self.source_bulk_staging_tablename,
+        )
+
+    def generate_bulk_load_target(self) -> str:
+        return self._generate_bulk_load(
+            "bulk_load_target",
+            loaded=self.target,
+            counterpart=self.source,
+            staging_tablename=self.target_bulk_staging_tablename,
+            complete_tuples=True,
+        )
+
+    @staticmethod
+    def bulk_join_sql(loaded: DbContext, tablename: str, complete_tuples: bool = False) -> str:
+        """
+        Returns the query of the full join tuples of the rows of `tablename`
+        in its _BULK table, which the bulk load procedure of `loaded` stages.
+        """
+        attributes = loaded.all_attributes()
+        mapping = loaded.tables[tablename].mapping_sql(
+            select_preamble="SELECT",
+            custom_attributes=attributes,
+            primary_suffix="_BULK",
+        )
+        if complete_tuples:
+            mapping += "\nWHERE " + " AND ".join(
+                f"{attr.name} IS NOT NULL" for attr in attributes
+            )
+        return mapping
+
+    def _generate_bulk_load(
+        self,
+        procedure_name: str,
+        loaded: DbContext,
+        counterpart: DbContext,
+        staging_tablename: str,
+        complete_tuples: bool = False,
+    ) -> str:
+        """
+        Returns a procedure moving the rows of the _BULK tables of `loaded`
+        into their base tables and deriving the `counterpart` tables with a
+        handful of set-based statements.
+
+        The insert propagation triggers are disabled meanwhile; constraint
+        triggers, keys and the ON CONFLICT handling of the row path still
+        apply. As in `generate_target_insert`, `complete_tuples` only keeps
+        join tuples without missing attributes.
+        """
+        schema = loaded.schema
+        staging = DbContext.staging_table(staging_tablename)
+        attributes = loaded.all_attributes()
+        columns = ", ".join(attr.name for attr in attributes)
+
+        triggers = []
+        for context in (loaded, counterpart):
+            for tablename in context.ordering:
+                trigger_name = InsertTable(source=context.tables[tablename]).trigger_name()
+                triggers.append(f"{schema}.{tablename} %s TRIGGER {trigger_name}")
+
+        result = f"""
+CREATE OR REPLACE PROCEDURE {schema}.{procedure_name}()
+LANGUAGE PLPGSQL AS $$
+BEGIN
+"""
+        result += loaded.create_staging_table(staging_tablename) + "\n"
+        for trigger in triggers:
+            result += f"ALTER TABLE {trigger % 'DISABLE'};\n"
+
+        # Load the base tables, referenced tables first
+        result += "\n"
+        for tablename in loaded.ordering:
+            table = loaded.tables[tablename]
+            table_columns = ", ".join(attr.name for attr in table.attributes)
+            result += f"INSERT INTO {schema}.{tablename} ({table_columns}) SELECT {table_columns} FROM {schema}.{self.bulk_tablename(tablename)};\n"
+
+        # Full join tuples of the loaded rows
+        result += "\n"
+        for tablename in loaded.ordering:
+            mapping = self.bulk_join_sql(loaded, tablename, complete_tuples=complete_tuples)
+            result += f"INSERT INTO {staging} ({columns}) ({mapping});\n"
+
+        # Derive the counterpart tables, referenced tables first
+        result += "\n"
+        for tablename in counterpart.ordering:
+            table = counterpart.tables[tablename]
+            not_null = " AND ".join(f"{attr.name} IS NOT NULL" for attr in table.attributes)
+            result += f"INSERT INTO {schema}.{tablename} ({table.from_full_join(tablename=staging)} WHERE {not_null}) ON CONFLICT ({', '.join(table.pkey[0].columns)}) DO NOTHING;\n"
+
+        result += f"\nTRUNCATE {staging};\n"
+        for tablename in loaded.ordering[::-1]:
+            result += f"TRUNCATE {schema}.{self.bulk_tablename(tablename)};\n"
+
+        result += "\n"
+        for trigger in triggers:
+            result += f"ALTER TABLE {trigger % 'ENABLE'};\n"
+
+        result += """END;  $$;
+"""
+        return result
+
+    def generate_source_delete_trigger(self, tablename: str) -> str:
+        return self._generate_delete_trigger("source", self.source.schema, tablename)
+
+    def generate_target_delete_trigger(self, tablename: str) -> str:
+        return self._generate_delete_trigger("target", self.target.schema, tablename)
+
+    @staticmethod
+    def _generate_delete_trigger(side: str, schema: str, tablename: str) -> str:
+        # The function reads the whole _DELETE tables, so one call per
+        # staging statement is enough at either trigger level.
+        return f"""
+CREATE TRIGGER {side}_delete_{tablename}_trigger
+AFTER INSERT ON {schema}.{tablename}_DELETE
+FOR EACH STATEMENT
+EXECUTE FUNCTION {schema}.{side}_delete_fn();
+"""
+
+    def generate_source_delete(
+        self, loop: LoopPrevention = LoopPrevention.TABLE, semi_join: bool = False, plan_joins: bool = False
+    ) -> str:
+        return self._generate_delete(
+            "source_delete_fn",
+            deleted=self.source,
+            counterpart=self.target,
+            staging_tablename=self.source_delete_staging_tablename,
+            loop=loop,
+            semi_join=semi_join,
+            plan_joins=plan_joins,
+        )
+
+    def generate_target_delete(
+        self, loop: LoopPrevention = LoopPrevention.TABLE, semi_join: bool = False, plan_joins: bool = False
+    ) -> str:
+        return self._generate_delete(
+            "target_delete_fn",
+            deleted=self.target,
+            counterpart=self.source,
+            staging_tablename=self.target_delete_staging_tablename,
+            loop=loop,
+            semi_join=semi_join,
+            plan_joins=plan_joins,
+        )
+
+    @staticmethod
+    def delete_join_sql(deleted: DbContext, tablename: str, semi_join: bool = False, plan_joins: bool = False) -> str:
+        """
+        Returns the query of the full join tuples of the rows of `tablename`
+        staged in its _DELETE table, with their remaining partners.
+        """
+        return deleted.mapping_sql(
+            tablename,
+            select_preamble="SELECT",
+            custom_attributes=deleted.all_attributes(),
+            primary_suffix="_DELETE",
+            semi_join=semi_join,
+            plan_joins=plan_joins,
+        )
+
+    @staticmethod
+    def delete_condition_sql(deleted: DbContext, table: Table, staging: str, plan_joins: bool = False) -> str:
+        """
+        Returns the condition on the `counterpart` rows of `table` to delete:
+        rows of the candidates in `staging` which no tuple of the remaining
+        base tables of `deleted` maps to anymore.
+        """
+        result = f"EXISTS (SELECT * FROM {staging} AS candidate WHERE {_match('candidate', 'counterpart', table.attributes)})"
+        for support_tablename in deleted.ordering:
+            support = deleted.mapping_sql(
+                support_tablename,
+                select_preamble="SELECT",
+                custom_attributes=table.attributes,
+                plan_joins=plan_joins,
+            )
+            result += f"\nAND NOT EXISTS (SELECT * FROM ({support}) AS support WHERE {_match('support', 'counterpart', table.attributes)})"
+        return result
+
+    def _generate_delete(
+        self,
+        function_name: str,
+        deleted: DbContext,
+        counterpart: DbContext,
+        staging_tablename: str,
+        loop: LoopPrevention = LoopPrevention.TABLE,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+    ) -> str:
+        """
+        Returns the function propagating the rows staged in the _DELETE
+        tables of `deleted` to the `counterpart` tables, as one set-based
+        statement per counterpart table.
+
+        The candidates are the counterpart tuples the deleted rows mapped
+        to. A candidate is only deleted if no tuple of the remaining base
+        tables maps to it anymore, which is checked with an anti-join against
+        every mapping of `deleted`. Shared rows, e.g. a department still
+        referenced by other employees, are thereby kept.
+        """
+        schema = deleted.schema
+        staging = DbContext.staging_table(staging_tablename)
+        attributes = deleted.all_attributes()
+        columns = ", ".join(attr.name for attr in attributes)
+
+        result = f"""
+CREATE OR REPLACE FUNCTION {schema}.{function_name}()
+RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+BEGIN
+"""
+        result += deleted.create_staging_table(staging_tablename) + "\n\n"
+        # Full join tuples of the deleted rows, with their remaining partners
+        for tablename in deleted.ordering:
+            mapping = self.delete_join_sql(deleted, tablename, semi_join=semi_join, plan_joins=plan_joins)
+            result += f"INSERT INTO {staging} ({columns}) ({mapping});\n"
+
+        # Counterpart deletes don't propagate back
+        result += f"\n{loop.push(schema, 0)}\n"
+
+        # Referencing tables first
+        for tablename in counterpart.ordering[::-1]:
+            result += f"\nDELETE FROM {schema}.{tablename} AS counterpart\n"
+            result += f"WHERE {self.delete_condition_sql(deleted, counterpart.tables[tablename], staging, plan_joins=plan_joins)};\n"
+
+        # Only the marker set above, an insert propagation may hold others
+        result += f"\n{loop.pop(schema, 0)}\n"
+        result += f"DELETE FROM {staging};\n"
+        for tablename in deleted.ordering[::-1]:
+            result += f"DELETE FROM {schema}.{tablename}_DELETE;\n"
+
+        result += """
+RETURN NULL;
+END;  $$;
+"""
+        return result
+
+
+def _match(left: str, right: str, attributes: list[Attr]) -> str:
+    """Condition equating the given attributes of two row aliases, NULLs included."""
+    return " AND ".join(
+        f"{left}.{attr.name} IS NOT DISTINCT FROM {right}.{attr.name}"
+        if attr.nullable
+        else f"{left}.{attr.name} = {right}.{attr.name}"
+        for attr in attributes
+    )
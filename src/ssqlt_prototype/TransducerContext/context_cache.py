@@ -0,0 +1,126 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Callable
+
+from .Dataclasses.constraint import Constraint
+from .Dataclasses.table import Table
+
+
+class ContextCache:
+    """
+    Cache of parsed tables and constraints keyed by the content of their
+    input files, so unchanged files skip `mo_sql_parsing` on later runs.
+
+    Entries are kept in memory and, if `path` is given, pickled into that
+    directory, one file per entry. Editing a file only changes its own key;
+    entries of other files stay valid. Cached objects are shared by every
+    context built from the same cache and must not be mutated.
+
+    The keys of the entries returned are recorded in `used`, so `prune` can
+    drop the entries of files a build no longer reads.
+    """
+
+    # Bump whenever the pickled classes or their parsing change
+    version = 3
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path
+        self.entries: dict[str, Table | Constraint] = {}
+        self.used: set[str] = set()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def _read(file_path: str) -> str:
+        with open(file_path, "r") as f:
+            return f.read()
+
+    def _key(self, kind: str, *parts: str) -> str:
+        digest = hashlib.sha256(f"{kind}:{self.version}".encode())
+        for part in parts:
+            digest.update(b"\0" + part.encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, f"{key}.pickle")
+
+    def _load(self, key: str) -> Table | Constraint | None:
+        if key in self.entries:
+            return self.entries[key]
+        if self.path is None:
+            return None
+        try:
+            with open(self._entry_path(key), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        self.entries[key] = entry
+        return entry
+
+    def prune(self) -> None:
+        """
+        Drops the in-memory entries not returned since the last prune, e.g.
+        the ones of edited or removed files. Pickled entries are kept.
+        """
+        self.entries = {key: entry for key, entry in self.entries.items() if key in self.used}
+        self.used = set()
+
+    def _store(self, key: str, entry: Table | Constraint) -> None:
+        self.entries[key] = entry
+        if self.path is None:
+            return
+        # Write then rename, so concurrent runs never read a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._entry_path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def tables(self, paths: list[tuple[str, str]], map_fn: Callable = map) -> list[Table]:
+        """
+        Returns the tables of the given (create path, mapping path) pairs,
+        parsing the ones missing from the cache with `map_fn`, e.g. the map
+        of an executor.
+        """
+        sources = [(self._read(create), self._read(mapping)) for create, mapping in paths]
+        keys = [self._key("table", create_sql, mapping_sql) for create_sql, mapping_sql in sources]
+        self.used.update(keys)
+        result = [self._load(key) for key in keys]
+
+        missing = [i for i, table in enumerate(result) if not isinstance(table, Table)]
+        parsed = map_fn(
+            Table.from_create_stmt,
+            [sources[i][0].strip() for i in missing],
+            [sources[i][1].strip() for i in missing],
+        )
+        for i, table in zip(missing, parsed):
+            self._store(keys[i], table)
+            result[i] = table
+
+        return result
+
+    def table(self, create_path: str, mapping_path: str) -> Table:
+        return self.tables([(create_path, mapping_path)])[0]
+
+    def constraints(self, paths: list[str], map_fn: Callable = map) -> list[Constraint]:
+        # The file name carries the constraint metadata
+        keys = [self._key("constraint", os.path.basename(path), self._read(path)) for path in paths]
+        self.used.update(keys)
+        result = [self._load(key) for key in keys]
+
+        missing = [i for i, constraint in enumerate(result) if not isinstance(constraint, Constraint)]
+        parsed = map_fn(Constraint.from_file, [paths[i] for i in missing])
+        for i, constraint in zip(missing, parsed):
+            self._store(keys[i], constraint)
+            result[i] = constraint
+
+        return result
+
+    def constraint(self, file_path: str) -> Constraint:
+        return self.constraints([file_path])[0]
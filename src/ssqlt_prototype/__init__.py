@@ -1,8 +1,15 @@
 from .TransducerContext import (
     Constraint,
+    ConstraintDispatch,
     CreateTable,
     DeleteTable,
+    Dependency,
+    FdIndex,
     Mapping,
     InsertTable,
     Context,
+    ContextCache,
+    LoopPrevention,
+    TriggerLevel,
+    UpdateTable,
 )
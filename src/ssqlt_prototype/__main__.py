@@ -1,5 +1,194 @@
-def main():
-    print("Hello, World!")
+"""
+Command line interface of the transducer generator.
+
+    python -m ssqlt_prototype generate test/resources/input -o output.sql
+    python -m ssqlt_prototype watch test/resources/input -o output.sql
+    python -m ssqlt_prototype generate test/resources/input -o "out/{schema}.sql" --schemas a,b
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from .generator import Generator
+from .profiling import Profiler
+from .tenants import write_schemas
+from .TransducerContext import ContextCache, LoopPrevention, TriggerLevel
+
+
+def _generator(args: argparse.Namespace, cache: ContextCache | None, profiler: Profiler | None = None) -> Generator:
+    return Generator.from_dir(
+        args.input,
+        trigger_level=TriggerLevel[args.trigger_level.upper()],
+        loop_prevention=LoopPrevention(args.loop_prevention),
+        cache=cache,
+        workers=args.workers,
+        semi_join=args.semi_join,
+        plan_joins=args.plan_joins,
+        dispatch_constraints=args.dispatch_constraints,
+        statement_constraints=args.statement_constraints,
+        fd_index=args.fd_index,
+        instrument=args.instrument,
+        profiler=profiler,
+    )
+
+
+def _write(generator: Generator, output: str) -> None:
+    if output == "-":
+        generator.write_to(sys.stdout)
+        return
+    # Write then rename, so readers of the output never see a partial script
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            generator.write_to(f)
+        os.replace(temp_path, output)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def snapshot(path: str) -> dict[str, tuple[int, int]]:
+    """Returns the modification time and size of every file below `path`."""
+    result = {}
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            result[file_path] = (stat.st_mtime_ns, stat.st_size)
+    return result
+
+
+class Watcher:
+    """
+    Regenerates the output whenever a file of the input directory changes.
+
+    Parsed tables and constraints stay in an in-memory `ContextCache` keyed
+    by file contents, so a regeneration only parses the files that changed.
+    Changes are detected by polling file modification times. After each
+    successful regeneration, entries the build did not use are dropped, so
+    edits do not grow the cache.
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.cache = ContextCache(args.cache_dir)
+        self.files = snapshot(args.input)
+
+    def generate(self) -> float:
+        """Regenerates the output and returns the seconds it took."""
+        start = time.perf_counter()
+        # Only count the entries of this build, not of a failed one before it
+        self.cache.used.clear()
+        _write(_generator(self.args, self.cache), self.args.output)
+        self.cache.prune()
+        return time.perf_counter() - start
+
+    def poll(self) -> list[str] | None:
+        """
+        Regenerates the output if input files changed since the last poll,
+        returning the changed files, or None if there were none.
+        """
+        files = snapshot(self.args.input)
+        if files == self.files:
+            return None
+        changed = sorted(path for path in files.keys() | self.files.keys() if files.get(path) != self.files.get(path))
+        self.files = files
+        seconds = self.generate()
+        print(
+            f"{len(changed)} file(s) changed, wrote {self.args.output} in {seconds * 1000:.0f} ms",
+            file=sys.stderr,
+        )
+        return changed
+
+    def run(self) -> None:
+        try:
+            seconds = self.generate()
+            print(f"Wrote {self.args.output} in {seconds * 1000:.0f} ms, watching {self.args.input}", file=sys.stderr)
+        except Exception as e:
+            # The next change to the input is generated again
+            print(f"Generation failed: {e!r}, watching {self.args.input}", file=sys.stderr)
+        while True:
+            time.sleep(self.args.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                # Inputs are often invalid halfway through an edit, keep watching
+                print(f"Generation failed: {e!r}", file=sys.stderr)
+
+
+def generate(args: argparse.Namespace) -> None:
+    cache = ContextCache(args.cache_dir) if args.cache_dir is not None else None
+    profiler = Profiler() if args.profile is not None else None
+    try:
+        generator = _generator(args, cache, profiler)
+        if args.schemas:
+            write_schemas(generator, args.schemas.split(","), args.output, workers=args.workers)
+        else:
+            _write(generator, args.output)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    if profiler is not None:
+        with open(args.profile, "w") as f:
+            profiler.write_json(f)
+
+
+def watch(args: argparse.Namespace) -> None:
+    if args.output == "-":
+        raise SystemExit("watch needs an output file, see --output")
+    try:
+        Watcher(args).run()
+    except KeyboardInterrupt:
+        pass
+
+
+def parser() -> argparse.ArgumentParser:
+    result = argparse.ArgumentParser(prog="ssqlt_prototype", description="Generates Semantic SQL Transducer bindings.")
+    commands = result.add_subparsers(dest="command", required=True)
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("input", help="Input directory, see README.md")
+    options.add_argument("-o", "--output", default="output.sql", help="Output script, - for standard output")
+    options.add_argument("--trigger-level", choices=[level.name.lower() for level in TriggerLevel], default="row")
+    options.add_argument(
+        "--loop-prevention", choices=[loop.value for loop in LoopPrevention], default=LoopPrevention.TABLE.value
+    )
+    options.add_argument("--semi-join", action="store_true", help="Semi-join restricted propagation queries")
+    options.add_argument("--plan-joins", action="store_true", help="Plan propagation joins from the foreign keys")
+    options.add_argument("--dispatch-constraints", action="store_true", help="One constraint trigger per table and event")
+    options.add_argument("--statement-constraints", action="store_true", help="Check FDs and MVDs once per statement")
+    options.add_argument("--fd-index", action="store_true", help="Check FDs through indexed lookup tables")
+    options.add_argument("--instrument", action="store_true", help="Record function statistics into _stats")
+    options.add_argument("--workers", type=int, default=1, help="Processes parsing the input files")
+    options.add_argument("--cache-dir", help="Directory keeping parsed input files between runs")
+
+    generate_parser = commands.add_parser("generate", parents=[options], help="Generate the transducer script")
+    generate_parser.add_argument("--profile", help="File to write the JSON profile of the generation to")
+    generate_parser.add_argument(
+        "--schemas", help="Comma separated schemas to write one script each for, the output must contain {schema}"
+    )
+    generate_parser.set_defaults(run=generate)
+
+    watch_parser = commands.add_parser(
+        "watch", parents=[options], help="Regenerate the transducer script whenever an input file changes"
+    )
+    watch_parser.add_argument("--interval", type=float, default=0.2, help="Seconds between polls of the input")
+    watch_parser.set_defaults(run=watch)
+
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parser().parse_args(argv)
+    args.run(args)
 
 
 if __name__ == "__main__":
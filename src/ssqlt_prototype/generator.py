@@ -1,6 +1,23 @@
-from typing import Self
-
-from .TransducerContext import Context, DeleteTable, InsertTable, JoinTable
+from typing import Iterator, Self, TextIO
+
+from . import instrumentation
+from .profiling import Profiler
+
+from .TransducerContext import (
+    Constraint,
+    ConstraintDispatch,
+    Context,
+    ContextCache,
+    DeleteTable,
+    FdIndex,
+    InsertTable,
+    JoinTable,
+    LoopPrevention,
+    TriggerLevel,
+    UpdateTable,
+    UpdateJoinTable,
+)
+from .TransducerContext.Dataclasses.db_context import DbContext
 
 
 class Generator:
@@ -8,9 +25,71 @@ class Generator:
     insert_tables: dict[str, InsertTable]
     delete_tables: dict[str, DeleteTable]
     join_tables: dict[str, JoinTable]
-
-    def __init__(self, context: Context) -> None:
+    update_tables: list[UpdateTable]
+    update_join_tables: list[UpdateJoinTable]
+    trigger_level: TriggerLevel
+    loop_prevention: LoopPrevention
+    semi_join: bool
+    plan_joins: bool
+    dispatch_constraints: bool
+    statement_constraints: bool
+    fd_index: bool
+    instrument: bool
+    profiler: Profiler | None
+
+    def __init__(
+        self,
+        context: Context,
+        trigger_level: TriggerLevel = TriggerLevel.ROW,
+        loop_prevention: LoopPrevention = LoopPrevention.TABLE,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+        dispatch_constraints: bool = False,
+        statement_constraints: bool = False,
+        fd_index: bool = False,
+        instrument: bool = False,
+        profiler: Profiler | None = None,
+    ) -> None:
+        """
+        With `semi_join`, the propagation queries restrict the tables they
+        join with the changed rows to the rows sharing their join columns,
+        see `DbContext.mapping_sql`.
+
+        With `plan_joins`, the propagation queries join the tables of each
+        mapping in an order planned from the foreign keys, with inner joins
+        where a key guarantees a match and without the tables that add
+        neither projected attributes nor rows, see `JoinPlanner`.
+
+        With `dispatch_constraints`, the constraints of each table and event
+        are checked by a single trigger instead of one trigger each, see
+        `ConstraintDispatch`.
+
+        With `statement_constraints`, insert constraints enforcing a known
+        dependency are checked once per statement over the inserted rows,
+        see `Constraint.generate_statement_function`. The others, and the
+        checks a chase must follow, keep their row triggers.
+
+        With `fd_index`, insert constraints enforcing a functional
+        dependency are checked through an indexed lookup table instead, see
+        `FdIndex`. This takes precedence over `statement_constraints`.
+
+        With `instrument`, the trigger and constraint functions record their
+        calls, rows and durations while statistics are turned on, see
+        `instrumentation.instrument_sql`.
+
+        `profiler` records the time, allocations and output bytes of each
+        section of the script as it is generated.
+        """
         self.context = context
+        self.trigger_level = trigger_level
+        self.loop_prevention = loop_prevention
+        self.semi_join = semi_join
+        self.plan_joins = plan_joins
+        self.dispatch_constraints = dispatch_constraints
+        self.statement_constraints = statement_constraints
+        self.fd_index = fd_index
+        self.instrument = instrument
+        self.profiler = profiler
         self.insert_tables = {}
         self.delete_tables = {}
         self.join_tables = {}
@@ -26,14 +105,123 @@ class Generator:
             self.delete_tables[tablename] = DeleteTable(source=table)
             self.join_tables[tablename] = JoinTable(create_table=table, context=context.target)
 
+        # Attributes either side keys, references or determines others by,
+        # which updates never set in place
+        keyed: dict[str, None] = {}
+        for db_context in (context.source, context.target):
+            keyed.update(dict.fromkeys(db_context.catalog.keys))
+            for constraints in db_context.constraints.values():
+                for constraint in constraints:
+                    if constraint.dependency is not None:
+                        keyed.update(dict.fromkeys(constraint.dependency.lhs))
+
+        self.update_tables = []
+        self.update_join_tables = []
+        for updated, counterpart in (
+            (context.source, context.target),
+            (context.target, context.source),
+        ):
+            owners = counterpart.catalog.owners
+            for tablename in updated.ordering:
+                update_join_table = UpdateJoinTable.from_tables(
+                    updated.tables[tablename], updated, counterpart, list(keyed)
+                )
+                if update_join_table is not None:
+                    self.update_join_tables.append(update_join_table)
+                # Only tables sharing attributes have anything to propagate
+                sharing = {owner for attr in updated.tables[tablename].attributes for owner in owners.get(attr.name, [])}
+                for counterpart_tablename in counterpart.ordering:
+                    if counterpart_tablename not in sharing:
+                        continue
+                    update_table = UpdateTable.from_tables(
+                        updated.tables[tablename], counterpart.tables[counterpart_tablename], list(keyed)
+                    )
+                    if update_table is not None:
+                        self.update_tables.append(update_table)
+
     @classmethod
-    def from_dir(cls, path: str) -> Self:
-        context = Context.from_dir(path)
-        return cls(context)
+    def from_dir(
+        cls,
+        path: str,
+        trigger_level: TriggerLevel = TriggerLevel.ROW,
+        loop_prevention: LoopPrevention = LoopPrevention.TABLE,
+        cache: ContextCache | None = None,
+        workers: int = 1,
+        semi_join: bool = False,
+        plan_joins: bool = False,
+        dispatch_constraints: bool = False,
+        statement_constraints: bool = False,
+        fd_index: bool = False,
+        instrument: bool = False,
+        profiler: Profiler | None = None,
+    ) -> Self:
+        context = Context.from_dir(path, cache=cache, workers=workers, profiler=profiler)
+        return cls(
+            context,
+            trigger_level=trigger_level,
+            loop_prevention=loop_prevention,
+            semi_join=semi_join,
+            plan_joins=plan_joins,
+            dispatch_constraints=dispatch_constraints,
+            statement_constraints=statement_constraints,
+            fd_index=fd_index,
+            instrument=instrument,
+            profiler=profiler,
+        )
 
-    def generate(self) -> str:
-        transducer = """DROP SCHEMA IF EXISTS transducer CASCADE;
-CREATE SCHEMA transducer;
+    def _iter_constraint_sql(self, db: DbContext) -> Iterator[str]:
+        constraints: list[Constraint] = []
+        for table_constraints in db.constraints.values():
+            for constraint in table_constraints:
+                if self.fd_index and FdIndex.applies_to(constraint):
+                    fd_index = FdIndex(constraint)
+                    yield fd_index.create_sql() + "\n\n"
+                    yield fd_index.generate_function() + "\n\n"
+                    yield fd_index.generate_trigger() + "\n\n\n"
+                elif self.statement_constraints and constraint.checks_per_statement(table_constraints):
+                    attributes = [attr.name for attr in db.tables[constraint.table].attributes]
+                    yield constraint.generate_statement_function(attributes) + "\n\n"
+                    yield constraint.generate_statement_trigger() + "\n\n\n"
+                else:
+                    constraints.append(constraint)
+
+        if self.dispatch_constraints:
+            grouped = ConstraintDispatch.group(constraints)
+            for dispatch in grouped:
+                for constraint in dispatch.constraints:
+                    yield constraint.generate_check_function() + "\n\n"
+                yield dispatch.generate_function() + "\n\n"
+                yield dispatch.generate_trigger() + "\n\n\n"
+            return
+
+        for constraint in constraints:
+            yield constraint.generate_function() + "\n\n"
+            yield constraint.generate_trigger() + "\n\n\n"
+
+    def iter_sql(self) -> Iterator[str]:
+        """
+        Yields the transducer script in chunks, so it can be written out
+        without holding all of it in memory.
+        """
+        chunks = self._iter_script()
+        if self.instrument:
+            chunks = self._iter_instrumented(chunks)
+        if self.profiler is not None:
+            chunks = self.profiler.iter_sections(chunks)
+        yield from chunks
+
+    def _iter_instrumented(self, chunks: Iterator[str]) -> Iterator[str]:
+        schema = self.context.source.schema
+        yield next(chunks)
+        yield "/* INSTRUMENTATION */\n\n"
+        yield instrumentation.stats_sql(schema) + "\n"
+        for chunk in chunks:
+            yield instrumentation.instrument_sql(chunk, schema)
+
+    def _iter_script(self) -> Iterator[str]:
+        schema = self.context.source.schema
+        yield f"""DROP SCHEMA IF EXISTS {schema} CASCADE;
+CREATE SCHEMA {schema};
 """
         ##########
         # SOURCE #
@@ -41,106 +229,152 @@ CREATE SCHEMA transducer;
 
         # STEP 1: Write source table create
 
-        transducer += "/* SOURCE TABLES */\n\n"
+        yield "/* SOURCE TABLES */\n\n"
 
         for source_tablename in self.context.source.ordering:
             table = self.context.source.tables[source_tablename]
-            transducer += table.create_stmt() + "\n\n"
+            yield table.create_stmt() + "\n\n"
+            index_sql = table.create_index_sql(
+                self.context.source.index_columns(source_tablename),
+                skip_primary_key=True,
+            )
+            if index_sql:
+                yield index_sql + "\n\n"
 
         # STEP 2: Write source constraints
 
-        transducer += "/* SOURCE CONSTRAINTS */\n\n"
+        yield "/* SOURCE CONSTRAINTS */\n\n"
 
-        for constraints in self.context.source.constraints.values():
-            for constraint in constraints:
-                transducer += constraint.generate_function() + "\n\n"
-                transducer += constraint.generate_trigger() + "\n\n\n"
+        yield from self._iter_constraint_sql(self.context.source)
 
 
         # STEP 3: Write target table creates
 
-        transducer += "/* TARGET TABLES */\n\n"
+        yield "/* TARGET TABLES */\n\n"
 
         for target_tablename in self.context.target.ordering:
             table = self.context.target.tables[target_tablename]
-            transducer += table.create_stmt() + "\n\n"
+            yield table.create_stmt() + "\n\n"
+            index_sql = table.create_index_sql(
+                self.context.target.index_columns(target_tablename),
+                skip_primary_key=True,
+            )
+            if index_sql:
+                yield index_sql + "\n\n"
 
         # STEP 4: Write target table constraints
 
-        transducer += "/* TARGET CONSTRAINTS */\n\n"
+        yield "/* TARGET CONSTRAINTS */\n\n"
 
-        for constraints in self.context.target.constraints.values():
-            for constraint in constraints:
-                transducer += constraint.generate_function() + "\n\n"
-                transducer += constraint.generate_trigger() + "\n\n\n"
+        yield from self._iter_constraint_sql(self.context.target)
 
         # STEP 5: Write insert table
 
-        transducer += "/* INSERT TABLES */\n\n"
+        yield "/* INSERT TABLES */\n\n"
 
         for table in self.insert_tables:
-            transducer += self.insert_tables[table].create_sql() + "\n\n"
-            transducer += self.join_tables[table].create_insert_sql() + "\n\n"
-
+            join_table = self.join_tables[table]
+            index_columns = join_table.context.index_columns(table)
+            yield self.insert_tables[table].create_sql() + "\n"
+            yield self.insert_tables[table].create_index_sql(index_columns) + "\n\n"
+            yield join_table.create_insert_sql() + "\n"
+            yield join_table.create_insert_index_sql() + "\n\n"
 
         # STEP 6: Write delete table
 
-        # transducer += "/* DELETE TABLES */\n\n"
+        yield "/* DELETE TABLES */\n\n"
 
-        # for table in self.delete_tables:
-        #    transducer += self.delete_tables[table].create_sql() + "\n\n"
-        #    transducer += self.join_tables[table].create_delete_sql() + "\n\n"
+        for table in self.delete_tables:
+            index_columns = self.join_tables[table].context.index_columns(table)
+            yield self.delete_tables[table].create_sql() + "\n"
+            yield self.delete_tables[table].create_index_sql(index_columns) + "\n\n"
 
         # STEP 7: Loop Prevention Mechanism
 
-        transducer += "/* LOOP PREVENTION MECHANISM */\n\n"
+        yield "/* LOOP PREVENTION MECHANISM */\n\n"
 
-        transducer += (
-            f"CREATE TABLE {self.schema}._LOOP (loop_start INT NOT NULL );\n\n"
-        )
+        yield self.loop_prevention.create_sql(self.schema) + "\n\n"
 
         # STEP 8: Write insert functions
 
-        transducer += "/* INSERT FUNCTIONS & TRIGGERS */\n\n"
+        yield "/* INSERT FUNCTIONS & TRIGGERS */\n\n"
+
+        level = self.trigger_level
+        loop = self.loop_prevention
 
         for table in self.insert_tables:
             insert_table = self.insert_tables[table]
-            transducer += insert_table.generate_function() + "\n"
-            transducer += insert_table.generate_trigger() + "\n\n"
+            yield insert_table.generate_function(level=level, loop=loop) + "\n"
+            yield insert_table.generate_trigger(level=level) + "\n\n"
             join_table = self.join_tables[table]
-            transducer += join_table.generate_insert_function() + "\n"
-            transducer += join_table.generate_insert_trigger() + "\n\n"
+            yield join_table.generate_insert_function(level=level, loop=loop, semi_join=self.semi_join, plan_joins=self.plan_joins) + "\n"
+            yield join_table.generate_insert_trigger(level=level) + "\n\n"
 
         # STEP 9: Write delete functions
 
-        # transducer += "/* DELETE FUNCTIONS & TRIGGERS */\n\n"
+        yield "/* DELETE FUNCTIONS & TRIGGERS */\n\n"
+
+        for table in self.delete_tables:
+            delete_table = self.delete_tables[table]
+            yield delete_table.generate_function(level=level, loop=loop) + "\n"
+            yield delete_table.generate_trigger(level=level) + "\n\n"
+
+        # STEP 9b: Write update functions
+
+        yield "/* UPDATE FUNCTIONS & TRIGGERS */\n\n"
+
+        for update_table in self.update_tables:
+            yield update_table.generate_function(level=level, loop=loop) + "\n"
+            yield update_table.generate_trigger(level=level) + "\n\n"
 
-        # for table in self.insert_tables:
-        #    delete_table = self.delete_tables[table]
-        #    transducer += delete_table.generate_function() + "\n"
-        #    transducer += delete_table.generate_trigger() + "\n\n"
-        #    join_table = self.join_tables[table]
-        #    transducer += join_table.generate_delete_function() + "\n"
-        #    transducer += join_table.generate_delete_trigger() + "\n\n"
+        for update_join_table in self.update_join_tables:
+            yield update_join_table.generate_function(level=level, loop=loop, plan_joins=self.plan_joins) + "\n"
+            yield update_join_table.generate_trigger(level=level) + "\n\n"
 
         # STEP 10: Write complex source functions
 
-        transducer += "/* COMPLEX SOURCE */\n\n"
+        yield "/* COMPLEX SOURCE */\n\n"
 
-        transducer += "/* S->T INSERTS */\n"
-        transducer += self.context.generate_target_insert()
+        yield "/* S->T INSERTS */\n"
+        yield self.context.generate_target_insert(level=level, loop=loop, semi_join=self.semi_join, plan_joins=self.plan_joins)
 
         for table in self.context.target.tables.keys():
-            transducer += self.context.generate_target_insert_trigger(tablename=table + "_INSERT_JOIN") + "\n"
+            yield self.context.generate_target_insert_trigger(tablename=table + "_INSERT_JOIN", level=level) + "\n"
 
-        transducer += "/* T->S INSERTS */\n"
-        transducer += self.context.generate_source_insert()
+        yield "/* T->S INSERTS */\n"
+        yield self.context.generate_source_insert(level=level, loop=loop, semi_join=self.semi_join, plan_joins=self.plan_joins)
 
         for table in self.context.source.tables.keys():
-            transducer += self.context.generate_source_insert_trigger(tablename=table + "_INSERT_JOIN") + "\n"
+            yield self.context.generate_source_insert_trigger(tablename=table + "_INSERT_JOIN", level=level) + "\n"
+
+        yield "/* S->T DELETES */\n"
+        yield self.context.generate_source_delete(loop=loop, semi_join=self.semi_join, plan_joins=self.plan_joins)
+
+        for table in self.context.source.tables.keys():
+            yield self.context.generate_source_delete_trigger(tablename=table) + "\n"
+
+        yield "/* T->S DELETES */\n"
+        yield self.context.generate_target_delete(loop=loop, semi_join=self.semi_join, plan_joins=self.plan_joins)
+
+        for table in self.context.target.tables.keys():
+            yield self.context.generate_target_delete_trigger(tablename=table) + "\n"
+
+        # STEP 11: Write bulk load entry points
+
+        yield "/* BULK LOAD */\n\n"
+
+        yield self.context.create_bulk_sql() + "\n"
+        yield self.context.generate_bulk_load_source()
+        yield self.context.generate_bulk_load_target()
+
+
+    def generate(self) -> str:
+        return "".join(self.iter_sql())
 
-        return transducer
+    def write_to(self, stream: TextIO) -> None:
+        for chunk in self.iter_sql():
+            stream.write(chunk)
 
     def generate_to_path(self, path: str):
         with open(path, "w") as f:
-            f.write(self.generate())
+            self.write_to(f)
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from typing import Self
+
+from .generator import Generator
+
+
+@dataclass
+class SqlObject:
+    """A named object created by a top level statement of a generated script."""
+
+    kind: str
+    name: str
+    table: str | None
+    sql: str
+
+    @property
+    def key(self) -> str:
+        if self.kind == "trigger":
+            return f"{self.kind}:{self.table}.{self.name}"
+        return f"{self.kind}:{self.name}"
+
+
+def split_statements(sql: str) -> list[str]:
+    """
+    Splits a script into its top level statements, dropping comments between
+    them. Semicolons within quotes, dollar quotes and comments are kept.
+    """
+    statements = []
+    current = ""
+    i = 0
+    while i < len(sql):
+        c = sql[i]
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = len(sql) if end == -1 else end
+            continue
+        if sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = len(sql) if end == -1 else end + 2
+            continue
+        if c == "'":
+            end = i + 1
+            while end < len(sql):
+                if sql[end] == "'" and not sql.startswith("''", end):
+                    break
+                end += 2 if sql.startswith("''", end) else 1
+            current += sql[i : end + 1]
+            i = end + 1
+            continue
+        if c == "$":
+            tag = re.match(r"\$[A-Za-z_]*\$", sql[i:])
+            if tag is not None:
+                end = sql.find(tag.group(), i + len(tag.group()))
+                end = len(sql) if end == -1 else end + len(tag.group())
+                current += sql[i:end]
+                i = end
+                continue
+        if c == ";":
+            if current.strip():
+                statements.append(current.strip() + ";")
+            current = ""
+        else:
+            current += c
+        i += 1
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+_TABLE = re.compile(r"CREATE\s+(?:UNLOGGED\s+)?TABLE\s+([\w.]+)", re.IGNORECASE)
+_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(\w+)\s+ON\s+([\w.]+)", re.IGNORECASE)
+_ROUTINE = re.compile(
+    r"CREATE\s+OR\s+REPLACE\s+(FUNCTION|PROCEDURE)\s+([\w.]+)\s*\(([^)]*)\)",
+    re.IGNORECASE,
+)
+_TRIGGER = re.compile(
+    r"CREATE\s+TRIGGER\s+(\w+)\s+(?:BEFORE|AFTER|INSTEAD\s+OF)\s.*?\sON\s+([\w.]+)",
+    re.IGNORECASE | re.DOTALL,
+)
+_VIEW = re.compile(r"CREATE\s+OR\s+REPLACE\s+VIEW\s+([\w.]+)", re.IGNORECASE)
+_SCHEMA = re.compile(r"(?:CREATE|DROP)\s+SCHEMA\b", re.IGNORECASE)
+
+
+def script_objects(sql: str) -> dict[str, SqlObject]:
+    """Returns the objects created by a generated script, in script order."""
+    objects: dict[str, SqlObject] = {}
+    for statement in split_statements(sql):
+        if _SCHEMA.match(statement):
+            continue
+        if match := _TABLE.match(statement):
+            obj = SqlObject("table", match.group(1).lower(), None, statement)
+        elif match := _INDEX.match(statement):
+            obj = SqlObject("index", match.group(1).lower(), match.group(2).lower(), statement)
+        elif match := _ROUTINE.match(statement):
+            # Keep the argument list, DROP needs it to identify the routine
+            name = f"{match.group(2).lower()}({match.group(3)})"
+            obj = SqlObject(match.group(1).lower(), name, None, statement)
+        elif match := _VIEW.match(statement):
+            obj = SqlObject("view", match.group(1).lower(), None, statement)
+        elif match := _TRIGGER.match(statement):
+            obj = SqlObject("trigger", match.group(1).lower(), match.group(2).lower(), statement)
+        else:
+            raise ValueError(
+                f"Unsupported statement in generated script: {statement.splitlines()[0]}"
+            )
+        objects[obj.key] = obj
+    return objects
+
+
+def input_hashes(path: str) -> dict[str, str]:
+    """Returns the sha256 of every file below the input directory `path`."""
+    hashes = {}
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            with open(file_path, "rb") as f:
+                hashes[os.path.relpath(file_path, path)] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+@dataclass
+class Manifest:
+    """
+    What a deployed transducer was generated from: the hashes of its input
+    files, the names of its base tables and every object of the script.
+    """
+
+    version = 1
+
+    inputs: dict[str, str]
+    base_tables: list[str]
+    objects: dict[str, SqlObject]
+
+    @classmethod
+    def from_generator(cls, generator: Generator, input_dir: str, sql: str | None = None) -> Self:
+        if sql is None:
+            sql = generator.generate()
+        base_tables = []
+        for context in (generator.context.source, generator.context.target):
+            base_tables += [f"{context.schema}.{tablename}" for tablename in context.ordering]
+        return cls(
+            inputs=input_hashes(input_dir),
+            base_tables=base_tables,
+            objects=script_objects(sql),
+        )
+
+    @classmethod
+    def from_path(cls, path: str) -> Self:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != cls.version:
+            raise ValueError(
+                f"Manifest {path} has version {data.get('version')}, expected {cls.version}. "
+                "Regenerate the full script."
+            )
+        return cls(
+            inputs=data["inputs"],
+            base_tables=data["base_tables"],
+            objects={key: SqlObject(**obj) for key, obj in data["objects"].items()},
+        )
+
+    def to_path(self, path: str) -> None:
+        data = {
+            "version": self.version,
+            "inputs": self.inputs,
+            "base_tables": self.base_tables,
+            "objects": {key: asdict(obj) for key, obj in self.objects.items()},
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+            f.write("\n")
+
+
+def delta_sql(old: Manifest, new: Manifest) -> str:
+    """
+    Returns a script turning a database deployed from `old` into one
+    deployed from `new` in a single transaction, without touching the rows
+    of base tables.
+
+    Functions, procedures and views are replaced in place. Changed indexes and
+    triggers are dropped and created again. Changed staging tables only hold
+    rows for the duration of a propagation, so they are recreated along with
+    their indexes and triggers. Base tables hold the data, so any change to
+    them raises a ValueError asking for a full rebuild.
+    """
+    changed_inputs = [
+        path
+        for path in sorted(set(old.inputs) | set(new.inputs))
+        if old.inputs.get(path) != new.inputs.get(path)
+    ]
+
+    def changed(key: str) -> bool:
+        return key not in old.objects or old.objects[key].sql != new.objects[key].sql
+
+    def removed(kind: str) -> list[SqlObject]:
+        return [obj for key, obj in old.objects.items() if obj.kind == kind and key not in new.objects]
+
+    def added(kind: str) -> list[SqlObject]:
+        return [obj for key, obj in new.objects.items() if obj.kind == kind and changed(key)]
+
+    base_tables = set(old.base_tables) | set(new.base_tables)
+    for obj in removed("table") + added("table"):
+        if obj.name in base_tables and obj.key in old.objects:
+            raise ValueError(
+                f"Base table {obj.name} changed, which needs a full rebuild of the transducer."
+            )
+
+    recreated_tables = {obj.name for obj in added("table") if obj.key in old.objects}
+
+    def on_recreated(kind: str) -> list[SqlObject]:
+        # Dropping a table drops its indexes and triggers as well
+        return [
+            obj
+            for key, obj in new.objects.items()
+            if obj.kind == kind and obj.table in recreated_tables and not changed(key)
+        ]
+
+    statements = []
+
+    for obj in removed("trigger") + [obj for obj in added("trigger") if obj.key in old.objects]:
+        statements.append(f"DROP TRIGGER IF EXISTS {obj.name} ON {obj.table};")
+    for obj in removed("index") + [obj for obj in added("index") if obj.key in old.objects]:
+        schema = obj.table.split(".")[0] if obj.table else ""
+        statements.append(f"DROP INDEX IF EXISTS {schema}.{obj.name};")
+
+    for obj in removed("table"):
+        statements.append(f"DROP TABLE IF EXISTS {obj.name};")
+    for obj in added("table"):
+        if obj.name in recreated_tables:
+            statements.append(f"DROP TABLE IF EXISTS {obj.name};")
+        statements.append(obj.sql)
+
+    for kind in ("function", "procedure", "view"):
+        for obj in added(kind):
+            statements.append(obj.sql)
+        for obj in removed(kind):
+            statements.append(f"DROP {kind.upper()} IF EXISTS {obj.name};")
+
+    for kind in ("index", "trigger"):
+        for obj in added(kind) + on_recreated(kind):
+            statements.append(obj.sql)
+
+    result = "/* DELTA */\n\n"
+    if changed_inputs:
+        result += "/* Changed inputs:\n" + "\n".join(f"   {path}" for path in changed_inputs) + "\n*/\n\n"
+    if not statements:
+        return result
+
+    result += "BEGIN;\n\n"
+    result += "\n\n".join(statements)
+    result += "\n\nCOMMIT;\n"
+    return result
+
+
+def generate_incremental(
+    generator: Generator, input_dir: str, manifest_path: str
+) -> tuple[str, Manifest]:
+    """
+    Returns the script deploying the transducer of `input_dir` along with
+    its manifest. If a manifest of an earlier deployment exists at
+    `manifest_path`, the script is the delta from that deployment, otherwise
+    the full script.
+
+    The manifest is not written: store it with `Manifest.to_path` once the
+    script has been applied.
+    """
+    sql = generator.generate()
+    manifest = Manifest.from_generator(generator, input_dir, sql=sql)
+    if not os.path.exists(manifest_path):
+        return sql, manifest
+    return delta_sql(Manifest.from_path(manifest_path), manifest), manifest
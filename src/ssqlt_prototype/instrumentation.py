@@ -0,0 +1,141 @@
+import re
+
+# Statements of a PL/pgSQL body, up to the next semicolon outside of quotes and comments
+_TOKEN = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/|;", re.DOTALL)
+# The statement a body piece ends with, if it starts the piece or follows a block keyword
+_STATEMENT = re.compile(
+    r"(?:\A|\b(?:BEGIN|THEN|ELSE|LOOP)\b)(?:\s|--[^\n]*\n|/\*.*?\*/)*\b(RETURN|INSERT|UPDATE|DELETE)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+_FUNCTION = re.compile(
+    r"CREATE\s+OR\s+REPLACE\s+FUNCTION\s+([\w.]+)\s*\([^)]*\)\s*RETURNS\s+([\w.]+)"
+    r"\s+LANGUAGE\s+PLPGSQL\s+AS\s+\$\$(.*?)\$\$",
+    re.IGNORECASE | re.DOTALL,
+)
+_DECLARE = re.compile(r"\A\s*DECLARE\b", re.IGNORECASE)
+_TARGET = re.compile(r"(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+([\w.]+)([^;]*)", re.IGNORECASE | re.DOTALL)
+# Carries no information the statistics do not
+_CALL_NOTICE = re.compile(r"\s*RAISE\s+NOTICE\s+'Triggered function [\w.]+ called'\s*\Z", re.IGNORECASE)
+
+
+def setting(schema: str) -> str:
+    """Name of the configuration parameter turning the statistics on."""
+    return f"{schema}.stats"
+
+
+def stats_sql(schema: str) -> str:
+    """
+    Declares the `_stats` table instrumented functions record into, and the
+    `_stats_summary` view ranking them by total time. The table is unlogged,
+    statistics do not need to survive a crash.
+    """
+    return f"""CREATE UNLOGGED TABLE {schema}._stats (
+	function_name TEXT PRIMARY KEY,
+	calls BIGINT NOT NULL,
+	row_count BIGINT NOT NULL,
+	total_ms DOUBLE PRECISION NOT NULL,
+	max_ms DOUBLE PRECISION NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION {schema}._stats_record(called TEXT, started TIMESTAMPTZ, produced BIGINT)
+RETURNS VOID LANGUAGE SQL AS $$
+   INSERT INTO {schema}._stats AS stats
+   SELECT called, 1, produced, ms, ms
+   FROM (SELECT 1000 * EXTRACT(EPOCH FROM clock_timestamp() - started) AS ms) AS call
+   ON CONFLICT (function_name) DO UPDATE SET
+      calls = stats.calls + 1,
+      row_count = stats.row_count + EXCLUDED.row_count,
+      total_ms = stats.total_ms + EXCLUDED.total_ms,
+      max_ms = GREATEST(stats.max_ms, EXCLUDED.max_ms);
+$$;
+
+CREATE OR REPLACE VIEW {schema}._stats_summary AS
+SELECT function_name, calls, row_count, round(total_ms::NUMERIC, 3) AS total_ms,
+   round((total_ms / calls)::NUMERIC, 3) AS avg_ms, round(max_ms::NUMERIC, 3) AS max_ms,
+   round((100 * total_ms / NULLIF(sum(total_ms) OVER (), 0))::NUMERIC, 1) AS share_pct
+FROM {schema}._stats
+ORDER BY total_ms DESC;
+"""
+
+
+def _counts_rows(statement: str) -> bool:
+    """
+    Whether the rows a statement affects count as produced. Loop prevention
+    markers, join staging tables and emptying a staging table do not.
+    """
+    match = _TARGET.match(statement)
+    if match is None:
+        return False
+    target = match.group(1).lower()
+    if target.endswith("._loop") or target.endswith("_temp"):
+        return False
+    if statement[:6].upper() == "DELETE" and not re.search(r"\bWHERE\b", match.group(2), re.IGNORECASE):
+        return False
+    return True
+
+
+def _instrument_body(body: str, schema: str, function_name: str) -> str:
+    record = (
+        f"IF _stats_on THEN PERFORM {schema}._stats_record('{function_name}', _stats_started, _stats_rows); "
+        "END IF;\n   "
+    )
+    count = "\n   GET DIAGNOSTICS _stats_count = ROW_COUNT; _stats_rows := _stats_rows + _stats_count;"
+
+    result = ""
+    start = 0
+    for token in _TOKEN.finditer(body):
+        if token.group() != ";":
+            continue
+        piece = body[start : token.start()]
+        start = token.end()
+        if notice := _CALL_NOTICE.search(piece):
+            result += piece[: notice.start()]
+            continue
+        statements = list(_STATEMENT.finditer(piece))
+        if not statements:
+            result += piece + ";"
+            continue
+        statement = statements[-1]
+        if statement.group(1).upper() == "RETURN":
+            result += piece[: statement.start(1)] + record + piece[statement.start(1) :] + ";"
+        elif _counts_rows(piece[statement.start(1) :]):
+            result += piece + ";" + count
+        else:
+            result += piece + ";"
+    result += body[start:]
+
+    declarations = f"""
+   _stats_on BOOLEAN := current_setting('{setting(schema)}', true) = 'on';
+   _stats_started TIMESTAMPTZ := clock_timestamp();
+   _stats_rows BIGINT := 0;
+   _stats_count BIGINT;"""
+    if match := _DECLARE.match(result):
+        return result[: match.end()] + declarations + result[match.end() :]
+    return "\nDECLARE" + declarations + result
+
+
+def instrument_sql(sql: str, schema: str) -> str:
+    """
+    Instruments the trigger and constraint check functions in `sql`: while
+    the `{schema}.stats` parameter is 'on', every call records its duration
+    and the rows its INSERT, UPDATE and DELETE statements wrote into
+    `_stats`, see `_counts_rows`. Calls raising an exception are not
+    recorded. The 'Triggered function ... called' notices are dropped, the
+    statistics count calls.
+
+    Statistics are turned on without regenerating, e.g. with
+    `SET transducer.stats = 'on'` or `ALTER DATABASE ... SET transducer.stats = 'on'`.
+    """
+
+    def instrument(match: re.Match) -> str:
+        name, returns, body = match.group(1), match.group(2), match.group(3)
+        if returns.upper() != "TRIGGER" and not name.endswith("_check"):
+            return match.group(0)
+        function_name = name.split(".")[-1]
+        return (
+            match.group(0)[: match.start(3) - match.start(0)]
+            + _instrument_body(body, schema, function_name)
+            + "$$"
+        )
+
+    return _FUNCTION.sub(instrument, sql)
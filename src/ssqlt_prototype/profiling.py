@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, Iterator, TextIO, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class Phase:
+    """
+    One measured phase. `scope` is the side of the transducer it ran for, if
+    any, and `table` the table it ran for, if any. Memory is what
+    tracemalloc saw allocated by the phase, in this process only: the net
+    change and the peak above the phase's start.
+    """
+
+    name: str
+    scope: str | None
+    table: str | None
+    seconds: float
+    allocated_bytes: int | None
+    peak_bytes: int | None
+    output_bytes: int | None = None
+
+
+class Profiler:
+    """
+    Records the wall time, tracemalloc allocations and output bytes of the
+    phases of loading a context and generating its script, see
+    `Context.from_dir` and `Generator`.
+
+    Phases are recorded in the order they end. Phases running concurrently,
+    e.g. when building the source and target contexts with several
+    workers, overlap, and their memory figures mix.
+    """
+
+    def __init__(self, trace_memory: bool = True) -> None:
+        self.phases: list[Phase] = []
+        self.trace_memory = trace_memory
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self) -> None:
+        """Stops tracemalloc if this profiler started it."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def scope(self, name: str) -> Iterator[None]:
+        """Attributes the phases recorded by this thread within it to `name`."""
+        previous = getattr(self._local, "scope", None)
+        self._local.scope = name
+        try:
+            yield
+        finally:
+            self._local.scope = previous
+
+    def _measure(self, fn: Callable[[], T]) -> tuple[T, float, int | None, int | None]:
+        if not self.trace_memory:
+            start = time.perf_counter()
+            result = fn()
+            return result, time.perf_counter() - start, None, None
+
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        after, peak = tracemalloc.get_traced_memory()
+        return result, seconds, after - before, peak - before
+
+    def _record(self, phase: Phase) -> None:
+        with self._lock:
+            self.phases.append(phase)
+
+    @contextmanager
+    def phase(self, name: str, table: str | None = None) -> Iterator[Phase]:
+        """
+        Measures the block within it. The block may set `output_bytes` on
+        the phase it is given.
+        """
+        phase = Phase(name, getattr(self._local, "scope", None), table, 0.0, None, None)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        yield phase
+        phase.seconds = time.perf_counter() - start
+        if self.trace_memory:
+            after, peak = tracemalloc.get_traced_memory()
+            phase.allocated_bytes = after - before
+            phase.peak_bytes = peak - before
+        self._record(phase)
+
+    def iter_items(self, name: str, items: Iterable[T], table: Callable[[T], str]) -> Iterator[T]:
+        """
+        Yields the items of a lazy iterable, recording producing each one as
+        a phase of the table `table` returns for it.
+        """
+        iterator = iter(items)
+        scope = getattr(self._local, "scope", None)
+        while True:
+            try:
+                item, seconds, allocated, peak = self._measure(lambda: next(iterator))
+            except StopIteration:
+                return
+            self._record(Phase(name, scope, table(item), seconds, allocated, peak))
+            yield item
+
+    def iter_sections(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Yields the chunks of a generated script, recording each of its
+        sections as a phase with the bytes it output. Sections start at the
+        `/* NAME */` chunks of `Generator.iter_sql`; what comes before the
+        first one is the "HEADER" section. Only the time spent producing
+        the chunks is counted, not the time spent consuming them.
+        """
+        iterator = iter(chunks)
+        scope = getattr(self._local, "scope", None)
+        section = Phase("HEADER", scope, None, 0.0, None, None)
+
+        def close(section: Phase) -> None:
+            if section.output_bytes is not None:
+                self._record(section)
+
+        while True:
+            try:
+                chunk, seconds, allocated, peak = self._measure(lambda: next(iterator))
+            except StopIteration:
+                close(section)
+                return
+            if chunk.startswith("/* ") and chunk.rstrip().endswith(" */") and "\n" not in chunk.strip():
+                close(section)
+                name = chunk.strip()[3:-3]
+                section = Phase(name, scope, None, 0.0, None, None)
+            section.seconds += seconds
+            section.output_bytes = (section.output_bytes or 0) + len(chunk.encode())
+            if allocated is not None and peak is not None:
+                section.allocated_bytes = (section.allocated_bytes or 0) + allocated
+                section.peak_bytes = max(section.peak_bytes or 0, peak)
+            yield chunk
+
+    def to_dict(self) -> dict:
+        """
+        The recorded phases, and their totals per phase name and per table.
+        """
+        by_name: dict[str, dict] = {}
+        by_table: dict[str, dict] = {}
+        for phase in self.phases:
+            for key, totals in ((phase.name, by_name), (phase.table, by_table)):
+                if key is None:
+                    continue
+                total = totals.setdefault(key, {"count": 0, "seconds": 0.0, "allocated_bytes": 0, "output_bytes": 0})
+                total["count"] += 1
+                total["seconds"] += phase.seconds
+                total["allocated_bytes"] += phase.allocated_bytes or 0
+                total["output_bytes"] += phase.output_bytes or 0
+        return {
+            "phases": [asdict(phase) for phase in self.phases],
+            "by_phase": by_name,
+            "by_table": dict(sorted(by_table.items(), key=lambda item: -item[1]["seconds"])),
+        }
+
+    def write_json(self, stream: TextIO) -> None:
+        json.dump(self.to_dict(), stream, indent=2)
+        stream.write("\n")
@@ -0,0 +1,90 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Self
+
+from .generator import Generator
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class SchemaTemplate:
+    """
+    A generated script split at every occurrence of its schema name, so it
+    can be rendered for another schema by joining the parts, without
+    generating again.
+
+    The schema name is only replaced where it names the schema: qualifying
+    a name (tables, functions, settings such as `transducer.loop`) and in
+    the schema statements. A script spelling the schema name anywhere else,
+    e.g. as a column or in a string, cannot be split safely and is refused.
+    """
+
+    def __init__(self, sql: str, schema: str) -> None:
+        self.schema = schema
+        name = re.escape(schema)
+        word = rf"(?<![\w$]){name}(?![\w$])"
+        pattern = re.compile(rf"{word}(?=\.)|(?<=SCHEMA ){word}|(?<=SCHEMA IF EXISTS ){word}", re.IGNORECASE)
+        self.parts = pattern.split(sql)
+        for part in self.parts:
+            match = re.search(word, part, re.IGNORECASE)
+            if match is not None:
+                start = max(match.start() - 30, 0)
+                raise ValueError(
+                    f"Schema name {schema} is used other than as a schema, near {part[start : match.end() + 30]!r}."
+                )
+
+    @classmethod
+    def from_generator(cls, generator: Generator) -> Self:
+        source_schema = generator.context.source.schema
+        target_schema = generator.context.target.schema
+        if source_schema.lower() != target_schema.lower():
+            raise ValueError(
+                "Source and target tables must share a schema to generate per schema. "
+                f"Found {source_schema} and {target_schema}."
+            )
+        for db_context in (generator.context.source, generator.context.target):
+            names = [*db_context.tables, *(attr.name for attr in db_context.all_attributes())]
+            clashes = sorted({name for name in names if name.lower() == source_schema.lower()})
+            if clashes:
+                raise ValueError(f"Schema name {source_schema} is also the name of {', '.join(clashes)}.")
+        return cls(generator.generate(), source_schema)
+
+    def render(self, schema: str) -> str:
+        if not _IDENTIFIER.fullmatch(schema):
+            raise ValueError(f"Invalid schema name: {schema!r}")
+        return schema.join(self.parts)
+
+
+def write_schemas(
+    generator: Generator,
+    schemas: Iterable[str],
+    path_template: str,
+    workers: int = 4,
+) -> list[str]:
+    """
+    Writes the script of `generator` once per schema, to `path_template`
+    formatted with the schema name, e.g. "out/{schema}.sql". The script is
+    generated once; the per schema files are rendered and written by
+    `workers` threads. Returns the written paths.
+    """
+    if "{schema}" not in path_template:
+        raise ValueError(f"Path template {path_template} must contain {{schema}}.")
+    template = SchemaTemplate.from_generator(generator)
+    schemas = list(schemas)
+    for schema in schemas:
+        # Fail before writing anything
+        if not _IDENTIFIER.fullmatch(schema):
+            raise ValueError(f"Invalid schema name: {schema!r}")
+
+    def write(schema: str) -> str:
+        path = path_template.format(schema=schema)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(template.render(schema))
+        return path
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(write, schemas))
@@ -1,6 +1,10 @@
 import os
+import shutil
+
 import pytest
 
+from benchmarks.postgres import EphemeralPostgres
+
 
 @pytest.fixture
 def resource_dir():
@@ -16,3 +20,22 @@ def input_dir(resource_dir):
     if not os.path.exists(path):
         raise FileNotFoundError(f"Path {path} does not exist.")
     return path
+
+
+@pytest.fixture
+def copied_input_dir(input_dir, tmp_path):
+    path = tmp_path / "input"
+    shutil.copytree(input_dir, path)
+    (path / "target" / "constraints").mkdir(exist_ok=True)
+    return path
+
+
+@pytest.fixture
+def postgres():
+    """A throwaway PostgreSQL cluster, see `benchmarks/postgres.py`."""
+    cluster = EphemeralPostgres()
+    initdb = os.path.join(cluster.bindir, "initdb") if cluster.bindir is not None else shutil.which("initdb")
+    if initdb is None or not os.path.exists(initdb):
+        pytest.skip("PostgreSQL is not installed, set PG_BIN to its bin directory")
+    with cluster:
+        yield cluster
@@ -1,3 +1,4 @@
+-- mvd: ssn ->> phone, email
 CREATE OR REPLACE FUNCTION transducer.check_EMPDEP_mvd_FN_1()
 RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
 BEGIN
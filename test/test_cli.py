@@ -0,0 +1,48 @@
+import os
+
+from fixtures import (
+    resource_dir as resource_dir,
+    input_dir as input_dir,
+    copied_input_dir as copied_input_dir,
+)
+
+from ssqlt_prototype import TriggerLevel
+from ssqlt_prototype.__main__ import Watcher, main, parser
+from ssqlt_prototype.generator import Generator
+
+
+def test_generate(input_dir, tmp_path):
+    output = tmp_path / "out.sql"
+    main(["generate", input_dir, "-o", str(output), "--trigger-level", "statement"])
+    assert output.read_text() == Generator.from_dir(input_dir, trigger_level=TriggerLevel.STATEMENT).generate()
+
+
+def test_watch(copied_input_dir, tmp_path):
+    output = tmp_path / "out.sql"
+    args = parser().parse_args(["watch", str(copied_input_dir), "-o", str(output)])
+    watcher = Watcher(args)
+    watcher.generate()
+    assert watcher.poll() is None
+
+    constraint = copied_input_dir / "source" / "constraints" / "transducer._empdep.fd.1.insert.sql"
+    constraint.write_text(constraint.read_text().replace("FD CONSTRAINT IN EMPDEP", "FD CONSTRAINT ON DEP_NAME"))
+    os.utime(constraint, ns=(0, 0))
+    assert watcher.poll() == [str(constraint)]
+    assert "FD CONSTRAINT ON DEP_NAME" in output.read_text()
+    # One entry per table and constraint, the one of the edited constraint replaced
+    directories = [copied_input_dir / side / kind for side in ("source", "target") for kind in ("create", "constraints")]
+    assert len(watcher.cache.entries) == sum(len(os.listdir(directory)) for directory in directories)
+
+
+def test_watch_invalid_input(copied_input_dir, tmp_path, monkeypatch, capsys):
+    create = copied_input_dir / "source" / "create" / "_empdep.sql"
+    create.write_text("CREATE TABLE transducer._empdep (")
+
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr("ssqlt_prototype.__main__.time.sleep", interrupt)
+    # Starting on an invalid input keeps watching instead of exiting
+    main(["watch", str(copied_input_dir), "-o", str(tmp_path / "out.sql")])
+    assert "Generation failed" in capsys.readouterr().err
+    assert not (tmp_path / "out.sql").exists()
@@ -1,7 +1,8 @@
+import dataclasses
 import os
 from fixtures import resource_dir as resource_dir, input_dir as input_dir
 
-from ssqlt_prototype import Constraint
+from ssqlt_prototype import Constraint, ConstraintDispatch, Dependency
 
 
 def test_from_file(input_dir):
@@ -16,3 +17,47 @@ def test_from_file(input_dir):
     assert constraint.insert_delete == Constraint.InsertDelete.INSERT
     with open(file_path, "r") as f:
         assert constraint.generate_function() == f.read().strip()
+
+
+def test_dispatch(input_dir):
+    constraints_dir = os.path.join(input_dir, "source", "constraints")
+    constraints = [
+        Constraint.from_file(os.path.join(constraints_dir, filename))
+        for filename in sorted(os.listdir(constraints_dir), reverse=True)
+    ]
+    dispatches = ConstraintDispatch.group(constraints)
+    assert [dispatch.table for dispatch in dispatches] == ["_position", "_empdep"]
+    empdep = dispatches[1]
+    assert [(c.type_, c.index) for c in empdep.constraints] == [("fd", 1), ("mvd", 1), ("mvd", 2)]
+    # Checks keep the order of the per-constraint triggers, by name in C
+    # collation, where "fd_10_" sorts before "fd_1_"
+    fd = empdep.constraints[0]
+    more = [dataclasses.replace(fd, index=index) for index in (2, 10)]
+    [reordered] = [dispatch for dispatch in ConstraintDispatch.group(constraints + more) if dispatch.table == "_empdep"]
+    assert [(c.type_, c.index) for c in reordered.constraints] == [
+        ("fd", 10), ("fd", 1), ("fd", 2), ("mvd", 1), ("mvd", 2)
+    ]
+
+    function = empdep.generate_function()
+    assert function.index("_empdep_fd_1_insert_check(NEW)") < function.index("_empdep_mvd_1_insert_check(NEW)")
+    assert "BEFORE INSERT ON transducer._empdep" in empdep.generate_trigger()
+    assert empdep.constraints[0].generate_check_function().startswith(
+        "CREATE OR REPLACE FUNCTION transducer._empdep_fd_1_insert_check(NEW transducer._empdep)\n"
+        "RETURNS transducer._empdep LANGUAGE PLPGSQL AS $$"
+    )
+
+
+def test_dependency(input_dir):
+    constraints_dir = os.path.join(input_dir, "source", "constraints")
+    fd = Constraint.from_file(os.path.join(constraints_dir, "transducer._empdep.fd.1.insert.sql"))
+    assert fd.dependency == Dependency(Dependency.Kind.FD, ["dep_name"], ["dep_address"])
+    mvd = Constraint.from_file(os.path.join(constraints_dir, "transducer._empdep.mvd.1.insert.sql"))
+    assert mvd.dependency == Dependency(Dependency.Kind.MVD, ["ssn"], ["phone", "email"])
+    assert not mvd.sql.startswith("--")
+    chase = Constraint.from_file(os.path.join(constraints_dir, "transducer._empdep.mvd.2.insert.sql"))
+    assert chase.dependency is None
+    assert not chase.checks_per_statement()
+
+    sql = fd.generate_statement_function(["ssn", "name", "phone", "email", "dep_name", "dep_address"])
+    assert "GROUP BY dep_name\n      HAVING count(DISTINCT (dep_address)) > 1" in sql
+    assert "WHERE (dep_name) IN (SELECT dep_name FROM new_rows)" in sql
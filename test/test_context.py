@@ -1,7 +1,162 @@
+import dataclasses
+import shutil
+from string import Template
+
 from fixtures import resource_dir as resource_dir, input_dir as input_dir
 
-from ssqlt_prototype import Context
+from ssqlt_prototype import Context, ContextCache, Constraint
+from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.TransducerContext.context_file_paths import ContextFilePaths
+from ssqlt_prototype.TransducerContext.Dataclasses import JoinPlanner
+from ssqlt_prototype.TransducerContext.Dataclasses.db_context import DbContext
+from ssqlt_prototype.TransducerContext.Dataclasses.table import Table
 
 
 def test_from_dir(input_dir):  # noqa: F811
     _ = Context.from_dir(input_dir)
+
+
+def test_index_columns(input_dir):  # noqa: F811
+    context = Context.from_dir(input_dir)
+    assert context.source.index_columns("_empdep") == [
+        ["ssn", "phone", "email"],
+        ["dep_address"],
+    ]
+    assert context.source.index_columns("_position") == [["dep_address"]]
+    assert context.target.index_columns("_person") == [["ssn"], ["dep_name"]]
+
+
+def test_catalog(input_dir):  # noqa: F811
+    context = Context.from_dir(input_dir)
+    catalog = context.target.catalog
+    assert [attr.name for attr in context.target.all_attributes()] == [
+        "city", "country", "dep_name", "dep_address", "ssn", "name", "email", "phone"
+    ]
+    assert catalog.owners["ssn"] == ["_person", "_person_email", "_person_phone"]
+    assert catalog.neighbours["_person"] == ["_department", "_person_email", "_person_phone"]
+    assert catalog.neighbours["_city_country"] == ["_department_city"]
+    assert catalog.shared_columns(context.target.tables["_department"]) == {
+        "_person": ["dep_name"],
+        "_department_city": ["dep_address"],
+    }
+
+
+def test_cache(input_dir, tmp_path, monkeypatch):  # noqa: F811
+    cache_dir = str(tmp_path / "cache")
+    expected = Generator(Context.from_dir(input_dir)).generate()
+
+    cold = Context.from_dir(input_dir, cache=ContextCache(cache_dir))
+    assert Generator(cold).generate() == expected
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Warm runs must not parse")
+
+    with monkeypatch.context() as m:
+        m.setattr(Table, "from_create_stmt", fail)
+        m.setattr(Constraint, "from_file", fail)
+        warm = Context.from_dir(input_dir, cache=ContextCache(cache_dir))
+    assert Generator(warm).generate() == expected
+
+    # Only the edited file is parsed again
+    changed_dir = tmp_path / "input"
+    shutil.copytree(input_dir, changed_dir)
+    (changed_dir / "target" / "constraints").mkdir(exist_ok=True)
+    mapping_path = changed_dir / "source" / "mappings" / "_position.sql"
+    mapping_path.write_text(mapping_path.read_text() + "\n")
+
+    parsed = []
+    from_create_stmt = Table.from_create_stmt
+
+    def record(sql, mapping_sql):
+        table = from_create_stmt(sql, mapping_sql)
+        parsed.append(table.name)
+        return table
+
+    monkeypatch.setattr(Table, "from_create_stmt", record)
+    Context.from_dir(str(changed_dir), cache=ContextCache(cache_dir))
+    assert parsed == ["_position"]
+
+
+def test_parallel_load(input_dir):  # noqa: F811
+    expected = Generator(Context.from_dir(input_dir)).generate()
+    assert Generator(Context.from_dir(input_dir, workers=2)).generate() == expected
+
+
+def test_load_ignores_file_order(input_dir):  # noqa: F811
+    paths = ContextFilePaths.from_dir(input_dir)
+    context = DbContext.from_files(
+        paths.source_creates, paths.source_constraints, paths.source_mappings
+    )
+    reversed_context = DbContext.from_files(
+        paths.source_creates[::-1],
+        paths.source_constraints[::-1],
+        paths.source_mappings[::-1],
+    )
+    assert list(reversed_context.tables) == list(context.tables)
+    assert reversed_context.ordering == context.ordering
+    assert reversed_context.constraints == context.constraints
+
+
+def test_semi_join_mapping(input_dir):  # noqa: F811
+    context = Context.from_dir(input_dir)
+    assert context.target.mapping_sql("_person", primary_suffix="_INSERT") == (
+        context.target.tables["_person"].mapping_sql(primary_suffix="_INSERT")
+    )
+
+    sql = context.target.mapping_sql(
+        "_person", select_preamble="SELECT", primary_suffix="_INSERT", semi_join=True
+    )
+    assert (
+        "NATURAL LEFT OUTER JOIN (SELECT * FROM transducer._DEPARTMENT "
+        "WHERE (dep_name) IN (SELECT dep_name FROM transducer._person_INSERT)) AS _DEPARTMENT"
+    ) in sql
+    # Tables sharing no column with the primary table stay as they are
+    assert "NATURAL LEFT OUTER JOIN transducer._CITY_COUNTRY\n" in sql + "\n"
+
+
+def test_join_planner(input_dir):  # noqa: F811
+    context = Context.from_dir(input_dir)
+    planner = context.target.join_planner
+    attributes = [attr.name for attr in context.target.all_attributes()]
+
+    # The key of _PERSON to _DEPARTMENT only holds between base tables
+    plan = planner.plan("_person_phone", attributes, base_primary=False, base_secondary=True, distinct=False)
+    assert plan.groups == [
+        ["_person_phone"],
+        ["_person", "_department", "_department_city", "_city_country"],
+        ["_person_email"],
+    ]
+    assert plan.using["_department"] == ["dep_name"]
+    plan = planner.plan("_person_phone", attributes, base_primary=False, base_secondary=False, distinct=False)
+    assert all(len(group) == 1 for group in plan.groups)
+
+    # _CITY_COUNTRY adds no projected attribute and matches one row by its key
+    plan = planner.plan("_person", ["ssn", "dep_address"], base_primary=True, base_secondary=True, distinct=False)
+    assert plan.pruned == ["_city_country"]
+    # _PERSON_PHONE adds rows, unless they are deduplicated
+    plan = planner.plan("_person", ["ssn", "dep_address"], base_primary=False, base_secondary=False, distinct=False)
+    assert "_person_phone" not in plan.pruned
+    plan = planner.plan("_person", ["ssn", "dep_address"], base_primary=False, base_secondary=False, distinct=True)
+    assert plan.pruned == ["_person_phone", "_person_email", "_department_city", "_city_country"]
+
+    sql = context.target.mapping_sql(
+        "_person", select_preamble="SELECT", primary_suffix="_DELETE", plan_joins=True
+    )
+    assert sql.startswith("SELECT ssn, name, dep_name\nFROM transducer._PERSON_DELETE\n")
+    assert (
+        "LEFT JOIN (transducer._DEPARTMENT JOIN transducer._DEPARTMENT_CITY USING (dep_address)) USING (dep_name)"
+    ) in sql
+    assert "NATURAL" not in sql and "_CITY_COUNTRY" not in sql
+
+    # Written first, _DEPARTMENT_CITY is cross joined, the plan would join it on dep_address
+    tables = dict(context.target.tables)
+    tables["_person"] = dataclasses.replace(
+        tables["_person"],
+        mapping=Template(
+            "${select_preamble} ${attributes} FROM transducer._PERSON${primary_suffix}\n"
+            "   NATURAL LEFT OUTER JOIN transducer._DEPARTMENT_CITY${secondary_suffix}\n"
+            "   NATURAL LEFT OUTER JOIN transducer._DEPARTMENT${secondary_suffix}\n"
+        ),
+    )
+    planner = JoinPlanner(tables, context.target.catalog)
+    assert planner.plan("_person", ["ssn", "city"], base_primary=False, base_secondary=False, distinct=False) is None
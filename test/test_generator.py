@@ -1,8 +1,246 @@
+import io
+
 from fixtures import resource_dir as resource_dir, input_dir as input_dir
 
+from ssqlt_prototype import LoopPrevention, TriggerLevel
 from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.profiling import Profiler
 
 
 def test_from_dir(input_dir):
     generator = Generator.from_dir(input_dir)
     generator.generate_to_path("output.sql")
+
+
+def test_statement_level(input_dir):
+    generator = Generator.from_dir(input_dir, trigger_level=TriggerLevel.STATEMENT)
+    sql = generator.generate()
+    assert (
+        "AFTER INSERT ON transducer._empdep\n"
+        "REFERENCING NEW TABLE AS new_rows\n"
+        "FOR EACH STATEMENT" in sql
+    )
+    assert "SELECT ssn, name, phone, email, dep_name, dep_address FROM new_rows" in sql
+    assert "AFTER INSERT ON transducer._empdep_INSERT\nFOR EACH STATEMENT" in sql
+
+
+def test_staging_tables(input_dir):
+    sql = Generator.from_dir(input_dir).generate()
+    # Each session stages into its own table, created on first use
+    function = sql[sql.index("FUNCTION transducer._empdep_INSERT_JOIN_FN()"):]
+    assert function.index("CREATE TEMP TABLE IF NOT EXISTS _empdep_INSERT_JOIN_TEMP (") < function.index(
+        "INSERT INTO pg_temp._empdep_INSERT_JOIN_TEMP"
+    )
+    assert ") ON COMMIT DELETE ROWS;" in sql
+    assert "transducer._empdep_INSERT_JOIN_TEMP" not in sql
+    assert "DROP TABLE" not in sql
+
+
+def test_guc_loop_prevention(input_dir):
+    generator = Generator.from_dir(input_dir, loop_prevention=LoopPrevention.GUC)
+    sql = generator.generate()
+    assert "set_config('transducer.loop'" in sql
+    assert "IF NOT transducer._loop_ready() THEN" in sql
+    assert "_LOOP" not in sql
+    assert "transducer._loop " not in sql
+    assert "transducer._loop;" not in sql
+
+
+def test_bulk_load(input_dir):
+    sql = Generator.from_dir(input_dir).generate()
+    assert "CREATE OR REPLACE PROCEDURE transducer.bulk_load_source()" in sql
+    assert "CREATE OR REPLACE PROCEDURE transducer.bulk_load_target()" in sql
+    assert (
+        "ALTER TABLE transducer._empdep DISABLE TRIGGER transducer__empdep_INSERT_trigger;"
+        in sql
+    )
+    assert "FROM transducer._EMPDEP_BULK\nNATURAL LEFT OUTER JOIN transducer._POSITION)" in sql
+
+
+def test_write_to(input_dir):
+    generator = Generator.from_dir(input_dir)
+    stream = io.StringIO()
+    generator.write_to(stream)
+    assert stream.getvalue() == generator.generate()
+    assert len(list(generator.iter_sql())) > 1
+
+
+def test_delete(input_dir):
+    sql = Generator.from_dir(input_dir).generate()
+    assert "VALUES(SELECT * FROM OLD)" not in sql
+    assert "AFTER DELETE ON transducer._empdep\nFOR EACH ROW" in sql
+    assert "INSERT INTO transducer._empdep_DELETE (ssn, name, phone, email, dep_name, dep_address) VALUES(old.ssn" in sql
+    assert "CREATE OR REPLACE FUNCTION transducer.source_delete_fn()" in sql
+    assert "CREATE OR REPLACE FUNCTION transducer.target_delete_fn()" in sql
+    assert "AFTER INSERT ON transducer._position_DELETE\nFOR EACH STATEMENT" in sql
+
+    # Departments are only deleted once no remaining employee maps to them
+    assert (
+        "DELETE FROM transducer._department AS counterpart\n"
+        "WHERE EXISTS (SELECT * FROM pg_temp._SOURCE_DELETE_TEMP AS candidate "
+        "WHERE candidate.dep_name = counterpart.dep_name AND candidate.dep_address = counterpart.dep_address)\n"
+        "AND NOT EXISTS (SELECT * FROM (SELECT dep_name, dep_address\n"
+        "FROM transducer._POSITION\n"
+        "NATURAL LEFT OUTER JOIN transducer._EMPDEP) AS support" in sql
+    )
+    # The delete releases its own marker only
+    function = sql[sql.index("FUNCTION transducer.source_delete_fn()"):]
+    function = function[: function.index("END;")]
+    assert "DELETE FROM transducer._loop WHERE ctid = (SELECT ctid FROM transducer._loop WHERE loop_start = 0 LIMIT 1);" in function
+    assert "DELETE FROM transducer._loop;" not in function
+    # Referencing tables are deleted from first
+    assert sql.index("DELETE FROM transducer._person AS counterpart") < sql.index(
+        "DELETE FROM transducer._department AS counterpart"
+    )
+
+
+def test_statement_level_delete(input_dir):
+    sql = Generator.from_dir(input_dir, trigger_level=TriggerLevel.STATEMENT).generate()
+    assert (
+        "AFTER DELETE ON transducer._empdep\n"
+        "REFERENCING OLD TABLE AS old_rows\n"
+        "FOR EACH STATEMENT" in sql
+    )
+    assert "SELECT ssn, name, phone, email, dep_name, dep_address FROM old_rows" in sql
+
+
+def test_update(input_dir):
+    generator = Generator.from_dir(input_dir)
+    pairs = {
+        (update.source.name, update.counterpart.name): (update.key, update.columns, update.siblings)
+        for update in generator.update_tables
+    }
+    # Person rows are identified by their key, which _empdep holds. The other
+    # _empdep rows of the person get the new name too
+    assert pairs["_empdep", "_person"] == (["ssn"], ["name"], True)
+    # _empdep rows are identified by the key of the updated person
+    assert pairs["_person", "_empdep"] == (["ssn"], ["name"], False)
+    # Tables made of key columns only never change in place
+    assert ("_empdep", "_person_phone") not in pairs
+
+    # dep_name references _department and determines dep_address, so the
+    # rows it joins with are derived again instead
+    join_updates = {update.source.name: update for update in generator.update_join_tables}
+    assert join_updates["_empdep"].columns == ["dep_name", "dep_address"]
+    assert join_updates["_empdep"].siblings == [(["dep_name"], ["dep_address"]), (["ssn"], ["name", "dep_name"])]
+    assert [table.name for table in join_updates["_empdep"].derived_tables()] == [
+        "_department_city",
+        "_department",
+        "_person",
+    ]
+    assert join_updates["_person"].columns == ["dep_name"]
+    assert "_person_phone" not in join_updates
+
+    sql = generator.generate()
+    assert (
+        "AFTER UPDATE OF name ON transducer._empdep\n"
+        "FOR EACH ROW\n"
+        "WHEN ((OLD.ssn) IS NOT DISTINCT FROM (NEW.ssn) "
+        "AND (OLD.name) IS DISTINCT FROM (NEW.name))" in sql
+    )
+    assert "UPDATE transducer._person SET name = NEW.name\n   WHERE ssn = NEW.ssn" in sql
+    assert "UPDATE transducer._empdep SET name = NEW.name\n   WHERE ssn = NEW.ssn" in sql
+    assert (
+        "AFTER UPDATE OF dep_name, dep_address ON transducer._empdep\n"
+        "FOR EACH ROW\n"
+        "WHEN ((OLD.ssn, OLD.phone, OLD.email) IS NOT DISTINCT FROM (NEW.ssn, NEW.phone, NEW.email) "
+        "AND (OLD.dep_name, OLD.dep_address) IS DISTINCT FROM (NEW.dep_name, NEW.dep_address))" in sql
+    )
+    assert (
+        "WHERE NOT EXISTS (SELECT * FROM transducer._department AS counterpart "
+        "WHERE counterpart.dep_name = derived.dep_name);" in sql
+    )
+    assert (
+        "INSERT INTO transducer._empdep_DELETE (ssn, name, phone, email, dep_name, dep_address) "
+        "VALUES (OLD.ssn, OLD.name, OLD.phone, OLD.email, OLD.dep_name, OLD.dep_address);" in sql
+    )
+
+
+def test_statement_level_update(input_dir):
+    sql = Generator.from_dir(input_dir, trigger_level=TriggerLevel.STATEMENT).generate()
+    assert (
+        "AFTER UPDATE ON transducer._empdep\n"
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows\n"
+        "FOR EACH STATEMENT" in sql
+    )
+    assert "JOIN old_rows AS old_row ON old_row.ssn = new_row.ssn AND old_row.phone = new_row.phone" in sql
+    assert "(dep_name) IN (SELECT dep_name FROM (SELECT new_row.* FROM new_rows AS new_row" in sql
+
+
+def test_semi_join(input_dir):
+    sql = Generator.from_dir(input_dir, semi_join=True).generate()
+    assert (
+        "NATURAL LEFT OUTER JOIN (SELECT * FROM transducer._POSITION "
+        "WHERE (dep_address) IN (SELECT dep_address FROM transducer._empdep_INSERT)) AS _POSITION"
+    ) in sql
+    assert "(SELECT dep_address FROM transducer._position_DELETE)) AS _EMPDEP" in sql
+
+
+def test_plan_joins(input_dir):
+    sql = Generator.from_dir(input_dir, plan_joins=True).generate()
+    # Propagation queries join through the foreign keys, bulk loads keep their mappings
+    assert (
+        "FROM transducer._PERSON_PHONE_INSERT\n"
+        "   LEFT JOIN (transducer._PERSON JOIN transducer._DEPARTMENT USING (dep_name) "
+        "JOIN transducer._DEPARTMENT_CITY USING (dep_address) JOIN transducer._CITY_COUNTRY USING (city)) USING (ssn)\n"
+        "   LEFT JOIN transducer._PERSON_EMAIL USING (ssn)"
+    ) in sql
+    # _EMPDEP adds nothing to the deduplicated _CITY_COUNTRY tuples
+    assert (
+        "INSERT INTO transducer._city_country (SELECT * FROM (SELECT DISTINCT city, country\n"
+        "FROM transducer._POSITION_INSERT_JOIN) AS tuple\n WHERE city IS NOT NULL AND country IS NOT NULL)"
+    ) in sql
+    bulk_load = sql[sql.index("PROCEDURE transducer.bulk_load_source"):]
+    assert "NATURAL LEFT OUTER JOIN" in bulk_load[: bulk_load.index("END;")]
+
+
+def test_dispatch_constraints(input_dir):
+    sql = Generator.from_dir(input_dir, dispatch_constraints=True).generate()
+    assert sql.count("BEFORE INSERT ON transducer._empdep\n") == 1
+    assert "EXECUTE FUNCTION transducer._empdep_insert_constraints_fn();" in sql
+    assert "_empdep_fd_1_insert_trigger" not in sql
+
+
+def test_statement_constraints(input_dir):
+    sql = Generator.from_dir(input_dir, statement_constraints=True).generate()
+    assert (
+        "AFTER INSERT ON transducer._empdep\n"
+        "REFERENCING NEW TABLE AS new_rows\n"
+        "FOR EACH STATEMENT\n"
+        "EXECUTE FUNCTION transducer._empdep_fd_1_insert_statement_fn();"
+    ) in sql
+    assert "transducer._empdep_fd_1_insert_trigger" not in sql
+    # The chase has no dependency to check and keeps its row trigger, and
+    # the MVD check stays ahead of it
+    assert "transducer__empdep_mvd_2_insert_trigger" in sql
+    assert "transducer__empdep_mvd_1_insert_trigger" in sql
+    assert "_empdep_mvd_1_insert_statement_fn" not in sql
+
+
+def test_fd_index(input_dir):
+    sql = Generator.from_dir(input_dir, fd_index=True, statement_constraints=True).generate()
+    assert "CREATE UNIQUE INDEX _empdep_fd_1_LOOKUP_idx ON transducer._empdep_fd_1_LOOKUP (dep_name);" in sql
+    assert "ON CONFLICT (dep_name) DO UPDATE SET row_count = lookup.row_count + 1" in sql
+    assert "AFTER INSERT OR DELETE OR UPDATE OF dep_name, dep_address ON transducer._empdep" in sql
+    assert "_empdep_fd_1_insert_trigger" not in sql
+    assert "_empdep_fd_1_insert_statement_trigger" not in sql
+    assert "transducer__empdep_mvd_1_insert_trigger" in sql
+
+
+def test_profiler(input_dir):
+    profiler = Profiler()
+    try:
+        generator = Generator.from_dir(input_dir, profiler=profiler)
+        sql = generator.generate()
+    finally:
+        profiler.stop()
+    report = profiler.to_dict()
+    assert report["by_phase"]["scan"]["count"] == 1
+    assert report["by_phase"]["ordering"]["count"] == 2
+    assert report["by_phase"]["parse_table"]["count"] == len(generator.context.source.tables) + len(
+        generator.context.target.tables
+    )
+    assert "_empdep" in report["by_table"]
+    assert report["by_phase"]["SOURCE TABLES"]["output_bytes"] > 0
+    assert sum(phase["output_bytes"] or 0 for phase in report["phases"]) == len(sql.encode())
+    assert {phase["scope"] for phase in report["phases"] if phase["name"] == "parse_table"} == {"source", "target"}
@@ -0,0 +1,101 @@
+import pytest
+from fixtures import (
+    resource_dir as resource_dir,
+    input_dir as input_dir,
+    copied_input_dir as copied_input_dir,
+)
+
+from ssqlt_prototype import LoopPrevention, TriggerLevel
+from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.incremental import generate_incremental, split_statements
+
+
+def test_split_statements():
+    sql = """/* HEADER */
+CREATE OR REPLACE FUNCTION s.f()
+RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+BEGIN
+   RAISE NOTICE 'a;b';
+   RETURN NULL;
+END;  $$;
+
+-- comment;
+CREATE TRIGGER t AFTER INSERT ON s.x FOR EACH ROW EXECUTE FUNCTION s.f();"""
+    statements = split_statements(sql)
+    assert len(statements) == 2
+    assert statements[0].startswith("CREATE OR REPLACE FUNCTION s.f()")
+    assert statements[0].endswith("END;  $$;")
+    assert statements[1].startswith("CREATE TRIGGER t")
+
+
+def test_first_run_is_full(copied_input_dir, tmp_path):
+    generator = Generator.from_dir(str(copied_input_dir))
+    sql, _ = generate_incremental(generator, str(copied_input_dir), str(tmp_path / "manifest.json"))
+    assert sql == generator.generate()
+
+
+def test_delta(copied_input_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    _, manifest = generate_incremental(
+        Generator.from_dir(str(copied_input_dir)), str(copied_input_dir), manifest_path
+    )
+    manifest.to_path(manifest_path)
+
+    sql, _ = generate_incremental(
+        Generator.from_dir(str(copied_input_dir)), str(copied_input_dir), manifest_path
+    )
+    assert "BEGIN;" not in sql
+
+    constraint_path = copied_input_dir / "source" / "constraints" / "transducer._position.fd.1.insert.sql"
+    constraint_path.write_text(
+        constraint_path.read_text().replace("VIOLATE THE FD CONSTRAINT", "VIOLATE THE CITY FD")
+    )
+    sql, _ = generate_incremental(
+        Generator.from_dir(str(copied_input_dir)), str(copied_input_dir), manifest_path
+    )
+    assert "source/constraints/transducer._position.fd.1.insert.sql" in sql
+    assert "CREATE OR REPLACE FUNCTION transducer._position_fd_1_insert_fn()" in sql
+    assert "VIOLATE THE CITY FD" in sql
+    assert "DROP SCHEMA" not in sql
+    assert "CREATE TABLE" not in sql
+    assert "CREATE TRIGGER" not in sql
+
+
+def test_delta_swaps_triggers(copied_input_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    _, manifest = generate_incremental(
+        Generator.from_dir(str(copied_input_dir)), str(copied_input_dir), manifest_path
+    )
+    manifest.to_path(manifest_path)
+
+    generator = Generator.from_dir(
+        str(copied_input_dir),
+        trigger_level=TriggerLevel.STATEMENT,
+        loop_prevention=LoopPrevention.GUC,
+    )
+    sql, _ = generate_incremental(generator, str(copied_input_dir), manifest_path)
+    drop = "DROP TRIGGER IF EXISTS transducer__empdep_insert_trigger ON transducer._empdep;"
+    create = "CREATE TRIGGER transducer__empdep_INSERT_trigger"
+    assert drop in sql
+    assert sql.index(drop) < sql.index(create)
+    assert "DROP TABLE IF EXISTS transducer._loop;" in sql
+    assert "CREATE OR REPLACE FUNCTION transducer._loop_push(loop_start INT)" in sql
+    assert "CREATE OR REPLACE FUNCTION transducer.source_insert_fn()" in sql
+    assert "DROP SCHEMA" not in sql
+
+
+def test_delta_rejects_base_table_change(copied_input_dir, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    _, manifest = generate_incremental(
+        Generator.from_dir(str(copied_input_dir)), str(copied_input_dir), manifest_path
+    )
+    manifest.to_path(manifest_path)
+
+    create_path = copied_input_dir / "source" / "create" / "_position.sql"
+    create_path.write_text(
+        create_path.read_text().replace("country VARCHAR(100) NOT NULL", "country VARCHAR(200) NOT NULL")
+    )
+    with pytest.raises(ValueError, match="_position"):
+        generate_incremental(
+            Generator.from_dir(str(copied_input_dir)), str(copied_input_dir), manifest_path
+        )
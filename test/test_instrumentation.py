@@ -0,0 +1,41 @@
+from fixtures import resource_dir as resource_dir, input_dir as input_dir
+
+from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.incremental import script_objects
+from ssqlt_prototype.instrumentation import instrument_sql
+
+
+def test_instrument_sql():
+    sql = """CREATE OR REPLACE FUNCTION transducer._a_fn()
+RETURNS TRIGGER LANGUAGE PLPGSQL AS $$
+BEGIN
+   RAISE NOTICE 'Triggered function transducer._a_fn called';
+   IF EXISTS (SELECT * FROM transducer._loop) THEN
+      DELETE FROM transducer._loop;
+      RETURN NULL;
+   END IF;
+   INSERT INTO transducer._b SELECT * FROM new_rows;
+   DELETE FROM transducer._a_INSERT;
+   RETURN NULL;
+END;  $$;
+
+CREATE OR REPLACE FUNCTION transducer._loop_values()
+RETURNS INT[] LANGUAGE SQL AS $$ SELECT '{}'::INT[]; $$;
+"""
+    instrumented = instrument_sql(sql, "transducer")
+    assert "DECLARE\n   _stats_on BOOLEAN := current_setting('transducer.stats', true) = 'on';" in instrumented
+    assert "Triggered function" not in instrumented
+    assert instrumented.count("PERFORM transducer._stats_record('_a_fn', _stats_started, _stats_rows)") == 2
+    # Only the insert into _b produces rows
+    assert instrumented.count("GET DIAGNOSTICS") == 1
+    assert instrumented.index("INSERT INTO transducer._b") < instrumented.index("GET DIAGNOSTICS")
+    assert instrumented.endswith("RETURNS INT[] LANGUAGE SQL AS $$ SELECT '{}'::INT[]; $$;\n")
+
+
+def test_instrumented_generator(input_dir):
+    sql = Generator.from_dir(input_dir, instrument=True).generate()
+    assert "CREATE UNLOGGED TABLE transducer._stats (" in sql
+    assert "CREATE OR REPLACE VIEW transducer._stats_summary AS" in sql
+    assert "PERFORM transducer._stats_record('source_insert_fn'" in sql
+    assert "PERFORM transducer._stats_record('_empdep_fd_1_insert_fn'" in sql
+    assert "view:transducer._stats_summary" in script_objects(sql)
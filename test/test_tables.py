@@ -1,7 +1,10 @@
 import os
+from string import Template
+
+import pytest
 from fixtures import resource_dir as resource_dir
 
-from ssqlt_prototype.TransducerContext.Dataclasses.table import Table
+from ssqlt_prototype.TransducerContext.Dataclasses.table import MappingRenderer, Table
 
 
 def test_table(resource_dir):  # noqa: F811
@@ -11,3 +14,18 @@ def test_table(resource_dir):  # noqa: F811
     assert tbl.name == "_empdep"
     assert tbl.schema == "transducer"
     assert tbl.pkey[0].columns == ["ssn", "phone", "email"]
+
+
+def test_mapping_renderer():
+    template = Template("${select_preamble} ${attributes} FROM t${primary_suffix} NATURAL JOIN u${secondary_suffix} -- $$")
+    renderer = MappingRenderer(template, maxsize=2)
+    values = dict(select_preamble="SELECT", attributes="a, b", primary_suffix="_NEW", secondary_suffix="")
+    assert renderer.render(**values) == template.substitute(**values)
+    assert renderer.render(**values) is renderer.render(**values)
+
+    for suffix in ["_1", "_2", "_3"]:
+        renderer.render(**{**values, "primary_suffix": suffix})
+    assert len(renderer.memo) == 2
+
+    with pytest.raises(KeyError):
+        renderer.render(select_preamble="SELECT")
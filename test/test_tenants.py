@@ -0,0 +1,49 @@
+import pytest
+
+from fixtures import (
+    resource_dir as resource_dir,
+    input_dir as input_dir,
+    copied_input_dir as copied_input_dir,
+)
+
+from ssqlt_prototype.__main__ import main
+from ssqlt_prototype.generator import Generator
+from ssqlt_prototype.tenants import SchemaTemplate, write_schemas
+
+
+def test_render(input_dir):
+    generator = Generator.from_dir(input_dir)
+    template = SchemaTemplate.from_generator(generator)
+    assert template.render("transducer") == generator.generate()
+
+    sql = template.render("tenant_1")
+    assert "transducer." not in sql
+    assert "CREATE SCHEMA tenant_1;" in sql
+    assert "tenant_1._empdep" in sql
+
+    with pytest.raises(ValueError):
+        template.render("tenant; DROP SCHEMA public")
+
+
+def test_schema_clash(copied_input_dir):
+    # A schema spelled like an attribute cannot be told apart from it
+    for path in copied_input_dir.rglob("*.sql"):
+        path.write_text(path.read_text().replace("transducer", "city"))
+    with pytest.raises(ValueError):
+        SchemaTemplate.from_generator(Generator.from_dir(str(copied_input_dir)))
+
+    with pytest.raises(ValueError):
+        SchemaTemplate("SELECT * FROM transducer._person WHERE note = 'transducer';", "transducer")
+
+
+def test_write_schemas(input_dir, tmp_path):
+    generator = Generator.from_dir(input_dir)
+    paths = write_schemas(generator, ["a", "b"], str(tmp_path / "out" / "{schema}.sql"), workers=2)
+    assert paths == [str(tmp_path / "out" / "a.sql"), str(tmp_path / "out" / "b.sql")]
+    assert (tmp_path / "out" / "b.sql").read_text() == SchemaTemplate.from_generator(generator).render("b")
+
+    with pytest.raises(ValueError):
+        write_schemas(generator, ["a"], str(tmp_path / "out.sql"))
+
+    main(["generate", input_dir, "-o", str(tmp_path / "cli" / "{schema}.sql"), "--schemas", "c,d"])
+    assert sorted(path.name for path in (tmp_path / "cli").iterdir()) == ["c.sql", "d.sql"]